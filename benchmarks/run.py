@@ -0,0 +1,216 @@
+"""
+Benchmark of the analysis pipeline on synthetic campaigns (see `synthetic.py`).
+
+Every case generates its raw input once, then runs the parse, aggregate and render stages of one analysis module
+twice: `cold` with an empty measurement cache and `warm` with the cache filled by the cold pass.
+The stages are timed by the profiling hooks of the analysis code (`common/profiling.py`): parsers record `parse`
+(through `measurement_cache.load`), fits and run aggregation `aggregate`, figures are wrapped in `render` here.
+
+Results go to `results/<host>_<preset>_<time>.json`: metadata, all stage records and a summary per case, pass and stage
+(`self_s` is the wall time without nested stages). `--compare <result.json>` reports stages that got slower.
+
+Usage: `python benchmarks/run.py [--preset small|large] [--cases c2c osu cxi iperf] [--compare results/<baseline>.json]`
+"""
+import argparse
+import importlib.util
+import json
+import os
+import platform
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable
+
+import matplotlib
+matplotlib.use("Agg")
+import pandas as pd
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.append(str(ROOT / "common"))
+import profiling
+import synthetic
+
+SCRIPTS = {
+	"c2c": ROOT / "compute-characterization" / "visualisation" / "analyse-c2c.py",
+	"osu": ROOT / "network-characterization" / "mpi" / "visualisation" / "analyse_osu.py",
+	"cxi": ROOT / "network-characterization" / "raw-slingshot" / "visualisation" / "analyse_raw_cxi.py",
+	"iperf": ROOT / "network-characterization" / "point-to-point" / "visualisation" / "main_iperf.py",
+}
+PRESETS = {
+	"small": {"c2c": {"cores": [256], "runs": 3}, "osu": {"campaigns": 20}, "cxi": {"campaigns": 20},
+	          "iperf": {"nodes": [100], "partners": 2, "streams": 4, "duration": 10, "omit": 2}},
+	"large": {"c2c": {"cores": [256, 512], "runs": 5}, "osu": {"campaigns": 400}, "cxi": {"campaigns": 400},
+	          "iperf": {"nodes": [100, 1000], "partners": 4, "streams": 8, "duration": 20, "omit": 2}},
+}
+PASSES = ["cold", "warm"]
+
+
+def load_script(path: Path):
+	"""Import a visualisation script as module, its folder on the search path for its local imports"""
+	sys.path.append(str(path.parent))
+	spec = importlib.util.spec_from_file_location(path.stem.replace("-", "_"), path)
+	module = importlib.util.module_from_spec(spec)
+	spec.loader.exec_module(module)
+	return module
+
+def workspace(directory: Path) -> Path:
+	"""`<directory>/visualisation` with a `figures` folder, the data next to it like in the repository"""
+	(directory / "visualisation" / "figures").mkdir(parents=True, exist_ok=True)
+	(directory / "data").mkdir(parents=True, exist_ok=True)
+	return directory / "visualisation"
+
+
+@dataclass
+class Case:
+	"""`prepare(directory)` generates the raw input and returns `run`, which analyses it once"""
+	name: str
+	labels: dict
+	prepare: Callable[[Path], Callable[[], None]]
+
+def c2c_cases(params: dict) -> list[Case]:
+	def prepare(directory: Path, cores: int) -> Callable[[], None]:
+		module = load_script(SCRIPTS["c2c"])
+		module.basepath = workspace(directory)
+		files = [synthetic.c2c_csv(module.basepath.parent / "data" / f"synthetic{cores}_run{i}.csv", cores, seed=i)
+		         for i in range(params["runs"])]
+		def run():
+			for f in files:
+				module.load_run(f)
+			run = module.aggregate_runs(files, f"synthetic{cores}")
+			module.bootstrap_runs(files, f"synthetic{cores}_ci")
+			with profiling.stage("aggregate", function="topology.discover"):
+				renders = module.topology_figures(run)
+			for name, render in renders.items():
+				with profiling.stage("render", figure=name):
+					render()
+		return run
+	return [Case(f"c2c_{cores}", {"cores": cores, "runs": params["runs"]}, lambda d, cores=cores: prepare(d, cores))
+	        for cores in params["cores"]]
+
+def osu_cases(params: dict) -> list[Case]:
+	def prepare(directory: Path) -> Callable[[], None]:
+		module = load_script(SCRIPTS["osu"])
+		basepath = workspace(directory)
+		data = basepath.parent / "data"
+		campaigns = [synthetic.osu_campaign(data, host_set=f"set{i}", ts=f"23-11-22T{i:04d}", seed=i).name
+		             for i in range(params["campaigns"])]
+		def run():
+			measurements = [module.load_measurements(data, ts) for ts in campaigns]
+			module.models(data)
+			merged = module.merge_repeats([m["osu_latency"] for m in measurements])
+			with profiling.stage("render", figure="omb_latency_synthetic"):
+				module.visualise_multiple([merged, *[m["osu_latency"] for m in measurements[:8]]],
+					save=True, basepath=basepath, name="omb_latency_synthetic")
+		return run
+	return [Case("osu", {"campaigns": params["campaigns"], "files": params["campaigns"] * len(synthetic.OSU_BENCHMARKS)}, prepare)]
+
+def cxi_cases(params: dict) -> list[Case]:
+	def prepare(directory: Path) -> Callable[[], None]:
+		module = load_script(SCRIPTS["cxi"])
+		module.basepath = workspace(directory)
+		data = module.basepath.parent / "data"
+		campaigns = [synthetic.cxi_campaign(data, ts=f"23-11-30T{i:04d}", seed=i).name for i in range(params["campaigns"])]
+		def run():
+			measurements = [module.load_measurements(data, ts) for ts in campaigns]
+			module.models(data)
+			merged = module.merge_repeats([m["cxi_read_lat"] for m in measurements])
+			with profiling.stage("render", figure="cxi_latency_synthetic"):
+				module.plot_multiple([merged, *[m["cxi_write_lat"] for m in measurements[:8]]],
+					ylabel="Mean Latency [us]", name="cxi_latency_synthetic", save=True)
+		return run
+	return [Case("cxi", {"campaigns": params["campaigns"], "files": params["campaigns"] * len(synthetic.CXI_BENCHMARKS)}, prepare)]
+
+def iperf_cases(params: dict) -> list[Case]:
+	def prepare(directory: Path, nodes: int) -> Callable[[], None]:
+		module = load_script(SCRIPTS["iperf"])
+		module.file_path = workspace(directory)
+		campaign = synthetic.iperf_campaign(module.file_path.parent / "data", nodes, params["partners"],
+			params["streams"], params["duration"], params["omit"]).name
+		def run():
+			ct, ct_std = module.load_heatmap(campaign)
+			with profiling.stage("render", figure="iperf3_synthetic"):
+				module.plot_heatmap(ct, ct_std, name="iperf3_synthetic", save=True)
+			with profiling.stage("render", figure="iperf3_synthetic_timeseries"):
+				module.plot_timeseries(campaign, name="iperf3_synthetic_timeseries", save=True)
+		return run
+	return [Case(f"iperf_{nodes}", {**params, "nodes": nodes, "pairs": nodes * params["partners"]},
+	             lambda d, nodes=nodes: prepare(d, nodes)) for nodes in params["nodes"]]
+
+CASES = {"c2c": c2c_cases, "osu": osu_cases, "cxi": cxi_cases, "iperf": iperf_cases}
+
+
+def summary(df: pd.DataFrame) -> pd.DataFrame:
+	"""Total wall, self and CPU time and peak memory per case, pass and stage"""
+	return df.groupby(["case", "pass", "stage"], sort=False).agg(
+		count=("wall_s", "size"), wall_s=("wall_s", "sum"), self_s=("self_s", "sum"),
+		cpu_s=("cpu_s", "sum"), max_rss_mb=("max_rss_mb", "max")).reset_index()
+
+def compare(current: pd.DataFrame, baseline: pd.DataFrame, threshold: float, min_seconds: float) -> pd.DataFrame:
+	"""Stages whose self time grew by more than `threshold` (relative) and `min_seconds`"""
+	df = current.merge(baseline, on=["case", "pass", "stage"], suffixes=("", "_baseline"))
+	df["ratio"] = df["self_s"] / df["self_s_baseline"]
+	slower = (df["ratio"] > 1 + threshold) & (df["self_s"] - df["self_s_baseline"] > min_seconds)
+	return df.assign(slower=slower)[["case", "pass", "stage", "self_s_baseline", "self_s", "ratio", "slower"]]
+
+def git_commit() -> str:
+	result = subprocess.run(["git", "-C", str(ROOT), "rev-parse", "--short", "HEAD"], capture_output=True, text=True)
+	return result.stdout.strip()
+
+
+def main():
+	parser = argparse.ArgumentParser(description="Time parse, aggregate and render of all analysis modules on synthetic data")
+	parser.add_argument("--preset", choices=PRESETS, default="small")
+	parser.add_argument("--cases", nargs="+", choices=CASES, default=list(CASES))
+	parser.add_argument("--out", type=Path, default=None, help="result JSON (default: results/<host>_<preset>_<time>.json)")
+	parser.add_argument("--compare", type=Path, default=None, help="earlier result JSON to compare with")
+	parser.add_argument("--threshold", type=float, default=.2, help="relative slowdown reported by --compare")
+	parser.add_argument("--min-seconds", type=float, default=.05, help="ignore slowdowns of fewer seconds")
+	parser.add_argument("--keep", type=Path, default=None, help="generate data and figures here and keep them")
+	args = parser.parse_args()
+
+	scratch = args.keep or Path(tempfile.mkdtemp(prefix="characterization_bench_"))
+	# before any analysis module imports measurement_cache
+	os.environ["CHARACTERIZATION_CACHE"] = str(scratch / "cache")
+	os.environ.pop("CHARACTERIZATION_CACHE_DISABLE", None)
+
+	cases = [case for name in args.cases for case in CASES[name](PRESETS[args.preset][name])]
+	meta = {"preset": args.preset, "host": socket.gethostname(), "platform": platform.platform(),
+	        "python": platform.python_version(), "cpus": os.cpu_count(), "commit": git_commit(),
+	        "time": time.strftime("%Y-%m-%dT%H:%M:%S"), "cases": {case.name: case.labels for case in cases}}
+
+	for case in cases:
+		start = time.perf_counter()
+		run = case.prepare(scratch / case.name)
+		print(f"{case.name}: input generated in {time.perf_counter() - start:.1f}s", file=sys.stderr)
+		for name in PASSES:
+			profiling.enable(case=case.name, **{"pass": name})
+			start = time.perf_counter()
+			run()
+			profiling.disable()
+			print(f"{case.name}: {name} pass {time.perf_counter() - start:.1f}s", file=sys.stderr)
+
+	df = profiling.frame()
+	total = summary(df)
+	with pd.option_context("display.width", 200, "display.max_rows", 999, "display.precision", 3):
+		print(total.to_string(index=False))
+
+	out = args.out or Path(__file__).resolve().parent / "results" / f"{meta['host']}_{args.preset}_{time.strftime('%y-%m-%dT%H%M')}.json"
+	out.parent.mkdir(parents=True, exist_ok=True)
+	out.write_text(json.dumps({"meta": meta, "summary": total.to_dict(orient="records"),
+	                           "records": df.to_dict(orient="records")}, indent=1, default=str))
+	print(f"written to {out}", file=sys.stderr)
+
+	if args.compare:
+		baseline = pd.DataFrame(json.loads(args.compare.read_text())["summary"])
+		result = compare(total, baseline, args.threshold, args.min_seconds)
+		with pd.option_context("display.width", 200, "display.max_rows", 999, "display.precision", 3):
+			print(result.to_string(index=False))
+		if result["slower"].any():
+			print(f"{result['slower'].sum()} stages slower than {args.compare.name}", file=sys.stderr)
+			sys.exit(1)
+
+if __name__ == "__main__": main()
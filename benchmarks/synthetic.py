@@ -0,0 +1,171 @@
+"""
+Synthetic measurement campaigns in the raw formats of the measurement tools, for benchmarking the analysis.
+
+- `c2c_csv`: core-to-core-latency CSV, lower triangle of an N-core matrix (SMT siblings, core clusters, sockets)
+- `osu_campaign`: OSU micro-benchmark `.dat` files with tail latency/bandwidth columns, one folder per campaign
+- `cxi_campaign`: CXI RDMA `.dat` files with their `---` delimited parameter and result blocks
+- `iperf_campaign`: iperf3 JSON files (`--json`, per-interval and per-stream results) of N nodes × k partners
+
+Values follow simple latency/bandwidth models with noise, so fits and topology discovery behave like on real data.
+All generators are deterministic for a given `seed`.
+"""
+import json
+from pathlib import Path
+
+import numpy as np
+
+SIZES = [2**i for i in range(23)] # 1 B to 4 MiB, like the OSU and CXI defaults
+
+OSU_BENCHMARKS = {
+	"latency": "Latency", "bw": "Bandwidth", "bibw": "Bi-Directional Bandwidth",
+	"allgather": "Allgather Latency", "allreduce": "Allreduce Latency", "alltoall": "All-to-All Personalized Exchange Latency",
+	"bcast": "Broadcast Latency", "gather": "Gather Latency", "reduce": "Reduce Latency",
+}
+CXI_BENCHMARKS = [(op, kind) for op in ("read", "write", "send") for kind in ("lat", "bw")]
+CXI_SEPARATOR = "-" * 72
+
+
+def c2c_matrix(cores: int, cluster: int = 8, sockets: int = 2, noise: float = .05, seed: int = 0) -> np.ndarray:
+	"""Symmetric latency [ns] of `cores` logical cores: SMT siblings `i` and `i + cores/2`, clusters of `cluster` cores"""
+	rng = np.random.default_rng(seed)
+	physical = np.arange(cores) % (cores // 2)
+	socket = physical * sockets // (cores // 2)
+	latency = np.select(
+		[physical[:, None] == physical[None], physical[:, None] // cluster == physical[None] // cluster, socket[:, None] == socket[None]],
+		[8., 25., 80.], 160.)
+	latency *= 1 + noise * np.abs(rng.standard_normal(latency.shape))
+	latency = np.tril(latency, -1)
+	return latency + latency.T
+
+def c2c_csv(path: Path, cores: int, seed: int = 0) -> Path:
+	"""`./core-to-core-latency --csv` output: row i holds the latencies to cores 0..i-1, all other cells empty"""
+	latency = c2c_matrix(cores, seed=seed)
+	with open(path, "w") as outfile:
+		for i in range(cores):
+			outfile.write(",".join([*map(str, latency[i, :i]), *[""] * (cores - i)]) + "\n")
+	return path
+
+
+def _curve(rng: np.random.Generator, latency: float, bandwidth: float) -> np.ndarray:
+	"""Latency [us] of all `SIZES` with an eager/rendezvous protocol switch, α + n/β"""
+	sizes = np.array(SIZES, dtype=float)
+	time = latency + sizes / bandwidth + np.where(sizes > 16384, 2 * latency, 0)
+	return time * (1 + .02 * np.abs(rng.standard_normal(len(sizes))))
+
+def osu_file(path: Path, benchmark: str, rng: np.random.Generator, latency: float = 2., bandwidth: float = 12000.):
+	"""One OSU `.dat` file, latency benchmarks in us, bandwidth benchmarks in MB/s, with P50/P95/P99 tail columns"""
+	title = OSU_BENCHMARKS[benchmark]
+	time = _curve(rng, latency * (4 if benchmark not in ("latency", "bw", "bibw") else 1), bandwidth)
+	if "Bandwidth" in title:
+		values = np.array(SIZES) / time * (2 if benchmark == "bibw" else 1)
+		header = "# Size      Bandwidth (MB/s) P50 Tail BW(MB/s) P95 Tail BW(MB/s) P99 Tail BW(MB/s)"
+		tails = values * np.array([[.99], [.9], [.8]])
+	else:
+		values = time
+		avg = "Latency (us) " if benchmark == "latency" else "Avg Latency(us)"
+		header = f"# Size       {avg}  P50 Tail Lat(us)  P95 Tail Lat(us)  P99 Tail Lat(us)"
+		tails = values * np.array([[.99], [1.1], [1.3]])
+	lines = [f"# OSU MPI {title} Test v7.3", header, "# Datatype: MPI_CHAR."]
+	if benchmark not in ("latency", "bw", "bibw"): # collectives print a blank line and the datatype first
+		lines = ["", lines[0], lines[2], lines[1]]
+	for size, value, (p50, p95, p99) in zip(SIZES, values, tails.T):
+		lines.append(f"{size:<16d}{value:>11.2f}{p50:>18.2f}{p95:>18.2f}{p99:>18.2f}")
+	path.write_text("\n".join(lines) + "\n")
+
+def osu_campaign(directory: Path, mpi_type: str = "openmpi", host_set: str = "cn", ts: str = "23-11-22T1111",
+                 benchmarks: list[str] = tuple(OSU_BENCHMARKS), seed: int = 0) -> Path:
+	"""`measurements_osu_<mpi>_<hosts>_<ts>/` with one `.dat` per benchmark, as written by `run_omb.sh`"""
+	rng = np.random.default_rng(seed)
+	campaign = directory / f"measurements_osu_{mpi_type}_{host_set}_{ts}"
+	campaign.mkdir(parents=True, exist_ok=True)
+	latency, bandwidth = rng.uniform(1.5, 15), rng.uniform(1000, 24000)
+	for benchmark in benchmarks:
+		osu_file(campaign / f"{campaign.name}_osu_{benchmark}.dat", benchmark, rng, latency, bandwidth)
+	return campaign
+
+
+def cxi_file(path: Path, op: str, kind: str, rng: np.random.Generator, latency: float = 2.7, bandwidth: float = 24000.,
+             config: dict[str, str] = None):
+	"""
+	One `cxi_<op>_<lat|bw>` output: parameter block (with the `config` parameters, e.g. `{"Hugepages": "2M"}`),
+	result header and rows, each delimited by `---` lines
+	"""
+	name = {"read": "Read", "write": "Write", "send": "Send"}[op]
+	lines = [CXI_SEPARATOR, f"    CXI RDMA {name} {'Latency' if kind == 'lat' else 'Bandwidth'} Test",
+	         "Device           : cxi0", "Service ID       : 1", "Client TX Mem    : System", "Server RX Mem    : System",
+	         "Test Type        : Iteration", f"Iterations       : {100 if kind == 'lat' else 1000}",
+	         f"Min {name} Size    : 1", f"Max {name} Size    : {SIZES[-1]}",
+	         *(f"{key:<17}: {value}" for key, value in (config or {}).items()),
+	         "Local (client)   : NIC 0x1 PID 0 VNI 1", "Remote (server)  : NIC 0x0 PID 0", CXI_SEPARATOR]
+	time = _curve(rng, latency, bandwidth)
+	label = "Send Size[B]" if op == "send" else "RDMA Size[B]"
+	if kind == "lat":
+		lines.append(f"{label:<12}       {name}s     Min[us]     Max[us]    Mean[us]  StdDev[us]")
+		for size, mean in zip(SIZES, time):
+			lines.append(f"{size:>12d}{100:>12d}{mean * .97:>12.2f}{mean * 1.5:>12.2f}{mean:>12.2f}{mean * .03:>12.2f}")
+	else:
+		lines.append(f"{label:<12}       {name}s  BW[MB/s]  PktRate[Mpkt/s]")
+		for size, t in zip(SIZES, time):
+			bw = size / t
+			lines.append(f"{size:>12d}{256000:>12d}{bw:>10.2f}{bw / max(size, 2048) :>17.6f}")
+	lines.append(CXI_SEPARATOR)
+	path.write_text("\n".join(lines) + "\n")
+
+def cxi_campaign(directory: Path, ts: str = "23-11-30T1546", seed: int = 0) -> Path:
+	"""`measurements_<ts>/` with the latency and bandwidth tests of RDMA read, write and send"""
+	rng = np.random.default_rng(seed)
+	campaign = directory / f"measurements_{ts}"
+	campaign.mkdir(parents=True, exist_ok=True)
+	latency, bandwidth = rng.uniform(2, 4), rng.uniform(20000, 25000)
+	for op, kind in CXI_BENCHMARKS:
+		cxi_file(campaign / f"{campaign.name}_cxi_{op}_{kind}.dat", op, kind, rng, latency, bandwidth)
+	return campaign
+
+
+def iperf_json(server: str, client: str, rng: np.random.Generator, streams: int = 8, duration: int = 60,
+               omit: int = 10, gbps: float = 9.4) -> dict:
+	"""iperf3 `--json` document of one client → server run, one entry per interval and stream"""
+	stream_gbps = gbps / streams * (1 + .03 * rng.standard_normal((omit + duration, streams)))
+	stream_gbps[rng.random(omit + duration) < .02] *= .5 # occasional dips
+	intervals = []
+	for t, row in enumerate(stream_gbps):
+		entries = [{"socket": 5 + 2 * s, "start": 0 if t < omit else t - omit, "end": 1. + (0 if t < omit else t - omit),
+		            "seconds": 1., "bytes": int(bps * 1e9 / 8), "bits_per_second": bps * 1e9,
+		            "retransmits": int(rng.poisson(.5)), "snd_cwnd": int(rng.integers(800000, 2400000)),
+		            "snd_wnd": 2697984, "rtt": int(rng.integers(2600, 5200)), "rttvar": int(rng.integers(100, 700)),
+		            "pmtu": 1500, "omitted": t < omit, "sender": True} for s, bps in enumerate(row)]
+		intervals.append({"streams": entries, "sum": {
+			"start": entries[0]["start"], "end": entries[0]["end"], "seconds": 1.,
+			"bytes": sum(e["bytes"] for e in entries), "bits_per_second": float(row.sum() * 1e9),
+			"retransmits": sum(e["retransmits"] for e in entries), "omitted": t < omit, "sender": True}})
+	total = float(stream_gbps[omit:].sum() * 1e9)
+	return {
+		"start": {
+			"connected": [{"socket": 5 + 2 * s, "local_host": client, "local_port": 57768 + s,
+			               "remote_host": server, "remote_port": 5201} for s in range(streams)],
+			"version": "iperf 3.15", "timestamp": {"time": "Fri, 03 Nov 2023 12:52:03 GMT", "timesecs": 1699015923},
+			"connecting_to": {"host": server, "port": 5201},
+			"test_start": {"protocol": "TCP", "num_streams": streams, "blksize": 131072, "omit": omit,
+			               "duration": duration, "bytes": 0, "blocks": 0, "reverse": 0, "tos": 0},
+		},
+		"intervals": intervals,
+		"end": {"sum_sent": {"start": 0, "end": duration, "seconds": duration, "bytes": int(total / 8),
+		                     "bits_per_second": total / duration, "retransmits": 0, "sender": True},
+		        "sum_received": {"start": 0, "end": duration, "seconds": duration, "bytes": int(total / 8),
+		                         "bits_per_second": total / duration, "sender": True}},
+	}
+
+def iperf_campaign(directory: Path, nodes: int, partners: int = 4, streams: int = 8, duration: int = 60,
+                   omit: int = 10, ts: str = "23-11-03T1352", seed: int = 0) -> Path:
+	"""`measurements_iperf_<ts>/` with `<campaign>_<server>_<client>.json` for every node and `partners` clients each"""
+	rng = np.random.default_rng(seed)
+	campaign = directory / f"measurements_iperf_{ts}"
+	campaign.mkdir(parents=True, exist_ok=True)
+	hosts = [f"cn{i:04d}" for i in range(nodes)]
+	for i, server in enumerate(hosts):
+		for offset in range(1, partners + 1):
+			client = hosts[(i + offset * max(1, nodes // (partners + 1))) % nodes]
+			document = iperf_json(server, client, rng, streams, duration, omit, gbps=rng.uniform(8, 9.5))
+			with open(campaign / f"{campaign.name}_{server}_{client}.json", "w") as outfile:
+				json.dump(document, outfile, indent="\t") # iperf3 indents with tabs as well
+	return campaign
@@ -0,0 +1,188 @@
+"""
+Piecewise Hockney (α–β) models of point-to-point message times.
+
+Every segment of a curve models the time of one message of n bytes as T(n) = α + n/β, with the
+startup latency α [μs], the asymptotic bandwidth β [MB/s = B/μs] and the half-performance message
+size n½ = α·β [B]. Protocol switches (e.g. eager → rendezvous, IDC → DMA) show up as breakpoints
+between segments, placed by segmented least squares with relative residuals. The number of
+segments (up to `max_segments`) is chosen by the Bayesian information criterion.
+
+Segments are fitted with bounds, α ≥ 0 and 0 < β ≤ `max_beta`: a segment whose unconstrained fit has a
+negative startup latency is fitted through the origin instead. Flat segments (e.g. small messages sent
+inline, the time does not depend on the size) get β = `max_beta`, by default twice the highest bandwidth
+of the curve, rather than an infinite or negative bandwidth.
+
+Bandwidth curves of windowed benchmarks (e.g. `osu_bw`) are converted to the time per message,
+so their α is the gap between pipelined messages rather than the startup latency.
+
+All curves are fitted together: the curves are columns of one size × curve array, the least squares
+fits of all size ranges of all curves come from prefix sums, and the breakpoints from a dynamic
+program over that array.
+
+Example:
+	times = pd.DataFrame({"osu_latency": latency_us, "osu_bw": alpha_beta.bandwidth_to_time(bw_mbs)})
+	fits = alpha_beta.fit(times)
+	print(alpha_beta.to_frame(fits))
+"""
+import argparse
+from dataclasses import dataclass, field
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+import profiling
+
+@dataclass
+class Segment:
+	start: int     # smallest message size of the segment [B]
+	end: int       # largest message size of the segment [B]
+	alpha: float   # startup latency [μs], ≥ 0
+	beta: float    # asymptotic bandwidth [MB/s], > 0 and finite (`max_beta` of `fit` for flat segments)
+	n_half: float  # half-performance message size α·β [B]
+	rms_relative: float = np.nan # relative root mean square error of the segment
+
+	def time(self, size: np.ndarray) -> np.ndarray:
+		"""Modelled time of one message [μs]"""
+		return self.alpha + size / self.beta
+
+@dataclass
+class Fit:
+	name: str
+	segments: list[Segment] = field(default_factory=list)
+	rms_relative: float = np.nan # relative root mean square error of the whole curve
+
+	@property
+	def breakpoints(self) -> list[int]:
+		"""First message size of every segment after the first [B]"""
+		return [segment.start for segment in self.segments[1:]]
+
+	def time(self, size: np.ndarray) -> np.ndarray:
+		"""Modelled time of one message [μs], sizes between segments use the segment above"""
+		size = np.asarray(size, dtype=float)
+		starts = np.array([segment.start for segment in self.segments[1:]])
+		index = np.searchsorted(starts, size, side="right")
+		return np.choose(index, [segment.time(size) for segment in self.segments])
+
+	def bandwidth(self, size: np.ndarray) -> np.ndarray:
+		"""Modelled bandwidth [MB/s]"""
+		return np.asarray(size, dtype=float) / self.time(size)
+
+
+def bandwidth_to_time(bandwidth: pd.Series) -> pd.Series:
+	"""Time of one message [μs] from a bandwidth curve [MB/s] indexed by message size [B]"""
+	return bandwidth.index.to_series(index=bandwidth.index).astype(float) / bandwidth
+
+def _segment_fits(sizes: np.ndarray, times: np.ndarray, b_min: np.ndarray) -> tuple[np.ndarray, ...]:
+	"""
+	Weighted least squares fits of T = a + b·n with a ≥ 0 and b ≥ `b_min` (per curve) for all size ranges
+	[i, j) of all curves. `times` is size × curve (NaN: not measured). Returns a, b, the weighted sum of
+	squared residuals and the number of measured sizes, each curve × i × j.
+	"""
+	valid = np.isfinite(times) & (times > 0)
+	w = np.where(valid, 1 / np.where(valid, times, 1) ** 2, 0.) # relative residuals
+	x = np.broadcast_to(sizes[:, None], times.shape)
+	y = np.where(valid, times, 0.)
+
+	def prefix(v: np.ndarray) -> np.ndarray:
+		s = np.concatenate([np.zeros((1, v.shape[1])), np.cumsum(v, axis=0)]).T # curve × (size + 1)
+		return s[:, None, :] - s[:, :, None] # curve × i × j: sum over [i, j)
+
+	sw, sx, sy = prefix(w), prefix(w * x), prefix(w * y)
+	sxx, sxy, syy = prefix(w * x * x), prefix(w * x * y), prefix(w * y * y)
+	count = prefix(valid.astype(float))
+	b_min = b_min[:, None, None]
+	sse = lambda a, b: syy - 2 * a * sy - 2 * b * sxy + a * a * sw + 2 * a * b * sx + b * b * sxx
+	with np.errstate(divide="ignore", invalid="ignore"):
+		det = sw * sxx - sx ** 2
+		b = np.where(det > 0, (sw * sxy - sx * sy) / det, 0.)
+		a = np.where(sw > 0, (sy - b * sx) / sw, np.nan)
+		# outside the bounds the optimum lies on one of them: the better of a = 0 and b = b_min
+		b_origin = np.maximum(np.where(sxx > 0, sxy / sxx, 0.), b_min)
+		a_flat = np.maximum(np.where(sw > 0, (sy - b_min * sx) / sw, np.nan), 0.)
+		sse_free, sse_origin, sse_flat = sse(a, b), sse(0., b_origin), sse(a_flat, b_min)
+	bound = (a < 0) | (b < b_min)
+	origin = bound & (sse_origin <= sse_flat)
+	flat = bound & ~origin
+	a = np.where(origin, 0., np.where(flat, a_flat, a))
+	b = np.where(origin, b_origin, np.where(flat, b_min, b))
+	return a, b, np.maximum(np.where(origin, sse_origin, np.where(flat, sse_flat, sse_free)), 0.), count
+
+@profiling.timed("aggregate")
+def fit(times: pd.DataFrame, max_segments: int = 3, min_points: int = 3, max_beta: float = None) -> dict[str, Fit]:
+	"""
+	Fit piecewise α–β models to all columns of `times`: the time of one message [μs] by message size [B].
+	Every segment covers at least `min_points` measured sizes. β is at most `max_beta` [MB/s], by default
+	twice the highest bandwidth (size / time) of the curve.
+	"""
+	times = times.sort_index()
+	sizes = times.index.to_numpy(dtype=float)
+	values = times.to_numpy(dtype=float)
+	if max_beta is None:
+		with np.errstate(divide="ignore", invalid="ignore"):
+			peak = np.nanmax(np.where(values > 0, sizes[:, None] / values, np.nan), axis=0, initial=0.)
+		b_min = 1 / (2 * np.where(peak > 0, peak, np.inf))
+	else:
+		b_min = np.full(values.shape[1], 1 / max_beta)
+	a, b, sse, count = _segment_fits(sizes, values, b_min)
+	curves, n = values.shape[1], len(sizes)
+
+	# cost[c, i, j]: segment [i, j), inf if too short; best[k][c, j]: k + 1 segments covering [0, j)
+	cost = np.where(count >= min_points, sse, np.inf)
+	best, split = [cost[:, 0, :]], [np.zeros((curves, n + 1), dtype=int)]
+	for k in range(1, max_segments):
+		total = best[-1][:, :, None] + cost # curve × i × j
+		split.append(np.argmin(total, axis=1))
+		best.append(np.min(total, axis=1))
+
+	# Bayesian information criterion: 2 parameters per segment plus the breakpoints
+	points = count[:, 0, n]
+	with np.errstate(divide="ignore", invalid="ignore"):
+		bic = np.stack([points * np.log(np.maximum(best[k][:, n], 1e-300) / points) + (3 * k + 2) * np.log(points)
+		                for k in range(max_segments)])
+	bic[~np.isfinite(np.stack([best[k][:, n] for k in range(max_segments)]))] = np.inf
+	segments = np.argmin(bic, axis=0)
+
+	fits = {}
+	for c, name in enumerate(times.columns):
+		result = Fit(name=name)
+		if not np.isfinite(bic[segments[c], c]):
+			fits[name] = result
+			continue
+		bounds, j = [], n
+		for k in range(segments[c], -1, -1):
+			i = split[k][c, j] if k > 0 else 0
+			bounds.append((i, j))
+			j = i
+		for i, j in reversed(bounds):
+			measured = np.flatnonzero(np.isfinite(values[i:j, c])) + i
+			beta = 1 / b[c, i, j]
+			result.segments.append(Segment(start=int(sizes[measured[0]]), end=int(sizes[measured[-1]]),
+			                               alpha=a[c, i, j], beta=beta, n_half=a[c, i, j] * beta,
+			                               rms_relative=np.sqrt(sse[c, i, j] / count[c, i, j])))
+		result.rms_relative = np.sqrt(best[segments[c]][c, n] / points[c])
+		fits[name] = result
+	return fits
+
+def to_frame(fits: dict[str, Fit]) -> pd.DataFrame:
+	"""One row per segment of every fit, `rms_relative` of the segment"""
+	return pd.DataFrame([{"curve": name, "segment": i, "start_b": s.start, "end_b": s.end,
+	                      "alpha_us": s.alpha, "beta_mbs": s.beta, "n_half_b": s.n_half,
+	                      "rms_relative": s.rms_relative}
+	                     for name, fit in fits.items() for i, s in enumerate(fit.segments)])
+
+
+def main():
+	parser = argparse.ArgumentParser(description="Fit piecewise α–β models to message time curves")
+	parser.add_argument("csv", type=Path, help="CSV with the message size [B] as first column and one time [μs] column per curve")
+	parser.add_argument("--bandwidth", action="store_true", help="the columns are bandwidths [MB/s] instead of times")
+	parser.add_argument("--max-segments", type=int, default=3)
+	args = parser.parse_args()
+
+	df = pd.read_csv(args.csv, index_col=0)
+	if args.bandwidth:
+		df = df.apply(bandwidth_to_time)
+	with pd.option_context("display.max_rows", None, "display.width", 200):
+		print(to_frame(fit(df, max_segments=args.max_segments)).to_string(index=False))
+
+if __name__ == "__main__": main()
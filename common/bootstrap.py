@@ -0,0 +1,198 @@
+"""
+Bootstrap confidence intervals of repeated measurements.
+
+A measurement repeated N times (curves: one value per message size, matrices: one value per core pair, ...)
+is resampled with replacement across the runs. Percentiles of the resampled statistic are the confidence
+interval of every point. All points and resamples are computed at once: the resampled means are a
+matrix product of multinomial run weights with the runs, other statistics gather resampled runs in chunks.
+Missing values (NaN) of single runs are ignored. With few runs, where there are fewer distinct resamples
+(multisets of runs) than resamples, the statistic is computed once per multiset; the interval ends are
+selected with `np.partition` instead of sorting all resamples of every point.
+
+The percentile interval is too narrow for few runs: a nominal 95% interval of the mean of normal data covers
+the true mean in about 74% of the cases with 3 runs, 84% with 5, 90% with 10 and 93% with 20 to 30 runs.
+Intervals of fewer than 10 runs describe the spread of the runs rather than a reliable confidence interval.
+
+`repeat_until` repeats a measurement until the interval is tight enough, `band` draws an interval into a plot.
+"""
+import math
+import warnings
+from dataclasses import dataclass
+from typing import Callable, Union
+
+import numpy as np
+import pandas as pd
+
+Samples = Union[np.ndarray, list[np.ndarray], list[pd.Series], list[pd.DataFrame]]
+
+CHUNK = 1 << 22 # values per resampling chunk, bounds the memory of large matrices
+
+@dataclass
+class Interval:
+	estimate: Union[np.ndarray, pd.Series, pd.DataFrame] # statistic of all runs
+	low: Union[np.ndarray, pd.Series, pd.DataFrame]
+	high: Union[np.ndarray, pd.Series, pd.DataFrame]
+	level: float
+	repeats: int
+
+	@property
+	def half_width(self):
+		return (self.high - self.low) / 2
+
+	@property
+	def relative_width(self):
+		"""Half width relative to the estimate"""
+		return self.half_width / abs(self.estimate)
+
+	def column(self, name) -> "Interval":
+		"""Interval of one column of DataFrame runs, e.g. one metric of a curve"""
+		return Interval(estimate=self.estimate[name], low=self.low[name], high=self.high[name], level=self.level, repeats=self.repeats)
+
+	def tight(self, tolerance: float, coverage: float = 1.) -> bool:
+		"""Relative half width at most `tolerance` for `coverage` of the points"""
+		relative = np.asarray(self.relative_width, dtype=float).ravel()
+		relative = relative[np.isfinite(relative)]
+		return len(relative) > 0 and np.quantile(relative, coverage) <= tolerance
+
+
+def _stack(samples: Samples) -> tuple[np.ndarray, Callable[[np.ndarray], object]]:
+	"""Runs × points array, and the function that shapes a flat result like one run"""
+	if isinstance(samples, np.ndarray):
+		shape = samples.shape[1:]
+		return samples.reshape(len(samples), -1).astype(float), lambda flat: flat.reshape(shape)
+	if isinstance(samples[0], pd.Series):
+		index = samples[0].index
+		for s in samples[1:]:
+			index = index.union(s.index)
+		stacked = np.stack([s.reindex(index).to_numpy(dtype=float) for s in samples])
+		return stacked, lambda flat: pd.Series(flat, index=index, name=samples[0].name)
+	if isinstance(samples[0], pd.DataFrame):
+		index, columns = samples[0].index, samples[0].columns
+		for s in samples[1:]:
+			index, columns = index.union(s.index), columns.union(s.columns)
+		stacked = np.stack([s.reindex(index=index, columns=columns).to_numpy(dtype=float).ravel() for s in samples])
+		return stacked, lambda flat: pd.DataFrame(flat.reshape(len(index), len(columns)), index=index, columns=columns)
+	return _stack(np.stack([np.asarray(s, dtype=float) for s in samples]))
+
+def _counts(n: int, statistic: str, resamples: int, seed: int, block: int = 1) -> np.ndarray:
+	"""Resamples × runs: how often every run is drawn into each resample, in blocks of `block` consecutive runs"""
+	rng = np.random.default_rng(seed)
+	if block > 1:
+		starts = rng.integers(0, n - block + 1, size=(resamples, math.ceil(n / block)))
+		indices = (starts[:, :, None] + np.arange(block)).reshape(resamples, -1)[:, :n]
+	elif statistic == "mean":
+		return rng.multinomial(n, np.full(n, 1 / n), size=resamples)
+	else:
+		indices = rng.integers(0, n, size=(resamples, n))
+	counts = np.zeros((resamples, n), dtype=np.int64)
+	np.add.at(counts, (np.arange(resamples)[:, None], indices), 1)
+	return counts
+
+def _statistic(runs: np.ndarray, counts: np.ndarray, statistic: str) -> np.ndarray:
+	"""Resamples × points statistic of the resamples given by their run `counts`"""
+	n, points = runs.shape
+	if statistic == "mean":
+		weights, valid = counts.astype(float), ~np.isnan(runs)
+		with np.errstate(invalid="ignore", divide="ignore"):
+			return (weights @ np.where(valid, runs, 0)) / (weights @ valid)
+	reduce = {"median": np.nanmedian, "min": np.nanmin, "max": np.nanmax}[statistic]
+	missing = np.isnan(runs)
+	if statistic == "median" and np.array_equal(missing.any(axis=0), missing.all(axis=0)):
+		reduce = np.median # nanmedian is much slower, NaN only in points without any run (e.g. a diagonal) stay NaN
+	indices = np.repeat(np.tile(np.arange(n), len(counts)), counts.ravel()).reshape(len(counts), n)
+	result = np.empty((len(counts), points))
+	step = max(1, CHUNK // (n * points))
+	for start in range(0, len(counts), step):
+		with warnings.catch_warnings():
+			warnings.simplefilter("ignore", RuntimeWarning)
+			result[start:start + step] = reduce(runs[indices[start:start + step]], axis=1)
+	return result
+
+def resample(runs: np.ndarray, statistic: str = "mean", resamples: int = 2000, seed: int = 0) -> np.ndarray:
+	"""Resamples × points statistic of `runs` (runs × points) resampled with replacement"""
+	return _statistic(runs, _counts(len(runs), statistic, resamples, seed), statistic)
+
+def _quantiles(stats: np.ndarray, levels: list[float], weights: np.ndarray = None) -> np.ndarray:
+	"""
+	`np.nanquantile(stats, levels, axis=1)` (linear interpolation) of points × resamples, from the two order
+	statistics around every level instead of sorting all resamples of every point. With `weights`, the
+	columns of `stats` are distinct resamples drawn `weights` times each.
+	"""
+	result = np.full((len(levels), len(stats)), np.nan)
+
+	def interpolate(i, h, a, b, rows=slice(None)):
+		t = h - np.floor(h)
+		# the interpolation of `np.quantile`, so both give the same floats
+		result[i, rows] = np.where(t >= .5, b - (b - a) * (1 - t), a + (b - a) * t)
+
+	if weights is not None:
+		order = np.argsort(stats, axis=1) # NaN last
+		ordered = np.take_along_axis(stats, order, axis=1)
+		cumulative = np.cumsum(np.where(np.isnan(ordered), 0, weights[order]), axis=1)
+		m = cumulative[:, -1]
+		rows = np.flatnonzero(m > 0)
+		for i, q in enumerate(levels):
+			h = q * (m[rows] - 1)
+			below = np.floor(h)
+			above = np.minimum(below + 1, m[rows] - 1)
+			# value of the k-th resample: the first distinct resample whose cumulative count exceeds k
+			a = ordered[rows, (cumulative[rows] <= below[:, None]).sum(axis=1)]
+			b = ordered[rows, (cumulative[rows] <= above[:, None]).sum(axis=1)]
+			interpolate(i, h, a, b, rows)
+		return result
+
+	missing = np.isnan(stats)
+	count = stats.shape[1] - missing.sum(axis=1)
+	stats = np.where(missing, np.inf, stats) if missing.any() else stats # NaN last
+	for m in np.unique(count[count > 0]): # points with the same number of valid resamples
+		rows = np.flatnonzero(count == m)
+		positions = [q * (m - 1) for q in levels]
+		below = [int(np.floor(h)) for h in positions]
+		above = [min(k + 1, m - 1) for k in below]
+		part = np.partition(stats[rows], sorted(set(below + above)), axis=1)
+		for i, (h, lo, hi) in enumerate(zip(positions, below, above)):
+			interpolate(i, h, part[:, lo], part[:, hi], rows)
+	return result
+
+def interval(samples: Samples, level: float = .95, statistic: str = "mean", resamples: int = 2000, seed: int = 0,
+			 block: int = 1) -> Interval:
+	"""
+	Percentile bootstrap interval of `statistic` (mean, median, min, max) of every point over the runs in `samples`:
+	an array with runs along the first axis, or a list of runs (arrays, Series or DataFrames, aligned by label).
+	`block` > 1 is a moving block bootstrap for runs that are a time series, e.g. the intervals of one iperf3 run:
+	blocks of `block` consecutive runs are resampled, which keeps their autocorrelation.
+	"""
+	runs, shape = _stack(samples)
+	block = min(block, len(runs))
+	estimate = {"mean": np.nanmean, "median": np.nanmedian, "min": np.nanmin, "max": np.nanmax}[statistic]
+	low, high = np.full(runs.shape[1], np.nan), np.full(runs.shape[1], np.nan)
+	counts, weights = _counts(len(runs), statistic, resamples, seed, block), None
+	if block == 1 and math.comb(2 * len(runs) - 1, len(runs)) < resamples:
+		# few runs: fewer distinct resamples (multisets of runs) than resamples, compute each once
+		counts, weights = np.unique(counts, axis=0, return_counts=True)
+	step = max(1, CHUNK // len(counts))
+	for start in range(0, runs.shape[1], step): # quantiles of all resamples of one chunk of points
+		stats = np.ascontiguousarray(_statistic(runs[:, start:start + step], counts, statistic).T)
+		low[start:start + step], high[start:start + step] = _quantiles(stats, [(1 - level) / 2, (1 + level) / 2], weights)
+	with warnings.catch_warnings():
+		warnings.simplefilter("ignore", RuntimeWarning)
+		return Interval(estimate=shape(estimate(runs, axis=0)), low=shape(low), high=shape(high), level=level, repeats=len(runs))
+
+def repeat_until(measure: Callable[[], object], tolerance: float = .05, coverage: float = 1., min_repeats: int = 10,
+                 max_repeats: int = 30, level: float = .95, statistic: str = "mean", seed: int = 0) -> tuple[list, Interval]:
+	"""
+	Calls `measure()` until the interval of all runs has a relative half width of at most `tolerance`
+	for `coverage` of the points, or `max_repeats` is reached. Returns all runs and their interval.
+	At least `min_repeats` runs, fewer give too narrow intervals (see above) and would stop too early.
+	"""
+	runs = [measure() for _ in range(min(min_repeats, max_repeats))]
+	result = interval(runs, level, statistic, seed=seed)
+	while not result.tight(tolerance, coverage) and len(runs) < max_repeats:
+		runs.append(measure())
+		result = interval(runs, level, statistic, seed=seed)
+	return runs, result
+
+def band(ax, x, interval: Interval, color=None, alpha: float = .25, **kwargs):
+	"""Shaded interval of a curve, e.g. around the `ax.plot` of `interval.estimate`"""
+	return ax.fill_between(np.asarray(x), np.asarray(interval.low, dtype=float), np.asarray(interval.high, dtype=float),
+	                       color=color, alpha=alpha, linewidth=0, **kwargs)
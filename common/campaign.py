@@ -0,0 +1,144 @@
+"""
+Resumable measurement campaigns.
+
+A campaign manifest (`<stem>_manifest.json` in the campaign folder) lists every planned unit
+(one benchmark run of one host set or server/client pair) with its status, attempts and the SHA-256
+of its output file. Outputs are written to a `.partial` file first and renamed when the unit
+succeeded, so a result file is either complete or absent. Rerunning a campaign with the same
+folder executes only the units that are missing, failed, or whose output file changed or vanished.
+Output files are hashed once when a manifest is loaded, not on every status check.
+
+`run` runs the asyncio main function of a driver: SIGTERM cancels it like Ctrl-C, the running units
+of all manifests are recorded as interrupted and the driver exits without a traceback.
+"""
+import asyncio
+import hashlib
+import json
+import os
+import signal
+import sys
+import time
+import weakref
+from dataclasses import dataclass, field, asdict
+from pathlib import Path
+from typing import Awaitable, Callable
+
+PENDING, RUNNING, DONE, FAILED = "pending", "running", "done", "failed"
+
+@dataclass
+class Unit:
+	id: str
+	benchmark: str
+	host_set: str
+	output: str          # file name, relative to the campaign folder
+	pair: list[str] = field(default_factory=list) # [server, client] for point-to-point units
+	status: str = PENDING
+	sha256: str = ""
+	attempts: int = 0
+	error: str = ""
+	finished: float = None # UNIX timestamp
+
+def sha256(path: Path) -> str:
+	h = hashlib.sha256()
+	with open(path, "rb") as infile:
+		for chunk in iter(lambda: infile.read(1 << 20), b""):
+			h.update(chunk)
+	return h.hexdigest()
+
+_manifests = weakref.WeakSet() # of this process, see `run`
+
+class Manifest:
+	"""Units of one campaign folder, saved atomically after every change"""
+
+	def __init__(self, path: Path):
+		self.path = path
+		self.units: dict[str, Unit] = {}
+		if path.is_file():
+			self.units = {u["id"]: Unit(**u) for u in json.loads(path.read_text())["units"]}
+		for unit in self.units.values():
+			output = self.outdir / unit.output
+			if unit.status == DONE and not (output.is_file() and sha256(output) == unit.sha256):
+				unit.status, unit.error = PENDING, "output changed or missing"
+		_manifests.add(self)
+
+	@property
+	def outdir(self) -> Path:
+		return self.path.parent
+
+	def save(self):
+		tmp = self.path.with_suffix(f".{os.getpid()}.tmp")
+		tmp.write_text(json.dumps({"units": [asdict(u) for u in self.units.values()]}, indent=1))
+		os.replace(tmp, self.path)
+
+	def plan(self, units: list[Unit]):
+		"""Add units not planned yet, keeps the state of known units"""
+		for unit in units:
+			self.units.setdefault(unit.id, unit)
+		self.save()
+
+	def is_done(self, unit: Unit) -> bool:
+		"""Done and the output file still exists, its checksum was verified when the manifest was loaded"""
+		return unit.status == DONE and (self.outdir / unit.output).is_file()
+
+	def todo(self) -> list[Unit]:
+		"""Units still to run, in planning order"""
+		return [unit for unit in self.units.values() if not self.is_done(unit)]
+
+	def partial(self, unit: Unit) -> Path:
+		"""Temporary output file of a running unit"""
+		return self.outdir / f"{unit.output}.partial"
+
+	def start(self, unit: Unit) -> Path:
+		unit.status, unit.error = RUNNING, ""
+		unit.attempts += 1
+		self.save()
+		return self.partial(unit)
+
+	def complete(self, unit: Unit):
+		"""Move the partial output into place and record its checksum"""
+		os.replace(self.partial(unit), self.outdir / unit.output)
+		unit.status, unit.sha256, unit.finished = DONE, sha256(self.outdir / unit.output), time.time()
+		self.save()
+
+	def fail(self, unit: Unit, error: str):
+		unit.status, unit.error, unit.finished = FAILED, error, time.time()
+		self.partial(unit).unlink(missing_ok=True)
+		self.save()
+
+	def interrupt(self):
+		"""Record running units as failed, e.g. when the campaign is cancelled"""
+		running = [unit for unit in self.units.values() if unit.status == RUNNING]
+		for unit in running:
+			unit.status, unit.error, unit.finished = FAILED, "interrupted", time.time()
+			self.partial(unit).unlink(missing_ok=True)
+		if running:
+			self.save()
+
+	def summary(self) -> str:
+		counts = {}
+		for unit in self.units.values():
+			status = DONE if self.is_done(unit) else unit.status if unit.status != DONE else PENDING
+			counts[status] = counts.get(status, 0) + 1
+		return ", ".join(f"{count} {status}" for status, count in sorted(counts.items()))
+
+
+def run(main: Callable[[], Awaitable]):
+	"""
+	`asyncio.run(main())` of a measurement driver. SIGTERM (e.g. `timeout`, job schedulers) cancels it like Ctrl-C,
+	which kills all running commands. The running units of all manifests are then recorded as interrupted,
+	and the process exits with 128 + the signal number.
+	"""
+	received = []
+
+	async def cancellable():
+		task = asyncio.current_task()
+		asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, lambda: (received.append(signal.SIGTERM), task.cancel()))
+		await main()
+
+	try:
+		asyncio.run(cancellable())
+	except (asyncio.CancelledError, KeyboardInterrupt):
+		for manifest in list(_manifests):
+			manifest.interrupt()
+			print(f"interrupted, {manifest.path.name}: {manifest.summary()}", file=sys.stderr)
+		sys.exit(128 + (received[0] if received else signal.SIGINT))
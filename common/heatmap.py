@@ -0,0 +1,140 @@
+"""
+Matrix heatmaps that scale from a few hosts to thousands of nodes or cores.
+
+- `plot` draws the matrix as one image layer (rasterized in vector outputs above `raster_cells`
+  cells) and labels cells only if the label fits into the cell, so the number of text artists is
+  bounded by the axes size instead of growing with N².
+- `rollup` aggregates a matrix over groups of rows/columns (racks, chassis, core clusters, or
+  uniform `blocks`), e.g. to show a 1024 × 1024 pair matrix as 32 × 32 rack blocks;
+  `drill_down` cuts out the tile of one block pair for a detailed figure.
+- `plot` rolls up automatically if a matrix has more than `max_cells` rows or columns,
+  into the given groups or into uniform blocks.
+
+Groups are lists of row/column positions, like the levels of `compute-characterization/visualisation/topology.py`,
+or from `groups_by`, e.g. `groups_by(ct.index, lambda host: host.rstrip("0123456789"))` for host name prefixes.
+"""
+import math
+from typing import Callable, Sequence
+
+import numpy as np
+import pandas as pd
+import matplotlib.pyplot as plt
+
+def format_value(value: float) -> str:
+	if np.isnan(value): return ""
+	return str(round(value, 2))
+
+def blocks(n: int, size: int) -> list[list[int]]:
+	"""Uniform groups of `size` consecutive positions"""
+	return [list(range(start, min(start + size, n))) for start in range(0, n, size)]
+
+def groups_by(labels: Sequence, key: Callable) -> list[list[int]]:
+	"""Groups of the positions whose labels map to the same `key`, e.g. the rack of a host name"""
+	groups = {}
+	for position, label in enumerate(labels):
+		groups.setdefault(key(label), []).append(position)
+	return list(groups.values())
+
+def _labels(groups: Sequence[Sequence[int]], index: pd.Index) -> list[str]:
+	return [str(index[g[0]]) if len(g) == 1 else f"{index[g[0]]}…{index[g[-1]]}" for g in groups]
+
+def rollup(matrix: pd.DataFrame, row_groups: Sequence[Sequence[int]], col_groups: Sequence[Sequence[int]] = None,
+		   agg: str = "mean") -> pd.DataFrame:
+	"""
+	Group × group aggregate (`mean`, `max`, `min` or `median`, NaN ignored) of `matrix`.
+	Groups must not be empty, rows and columns not in any group are dropped.
+	Labels are `first…last` of every group.
+	"""
+	col_groups = row_groups if col_groups is None else col_groups
+	values = matrix.to_numpy(dtype=float)
+	row_id = np.full(values.shape[0], -1)
+	col_id = np.full(values.shape[1], -1)
+	for i, g in enumerate(row_groups): row_id[list(g)] = i
+	for j, g in enumerate(col_groups): col_id[list(g)] = j
+
+	# sort rows/columns by group once, then reduce the blocks of the permuted matrix
+	rows = np.argsort(row_id, kind="stable")[np.sum(row_id < 0):]
+	cols = np.argsort(col_id, kind="stable")[np.sum(col_id < 0):]
+	permuted = values[np.ix_(rows, cols)]
+	row_starts = np.r_[0, np.cumsum(np.bincount(row_id[rows], minlength=len(row_groups)))[:-1]]
+	col_starts = np.r_[0, np.cumsum(np.bincount(col_id[cols], minlength=len(col_groups)))[:-1]]
+	missing = np.isnan(permuted)
+
+	def blockwise(ufunc: np.ufunc, values: np.ndarray) -> np.ndarray:
+		return ufunc.reduceat(ufunc.reduceat(values, row_starts, axis=0), col_starts, axis=1)
+
+	with np.errstate(invalid="ignore", divide="ignore"):
+		if agg == "mean":
+			result = blockwise(np.add, np.where(missing, 0., permuted)) / blockwise(np.add, (~missing).astype(float))
+		elif agg in ("max", "min"):
+			fill = -np.inf if agg == "max" else np.inf
+			result = blockwise(np.maximum if agg == "max" else np.minimum, np.where(missing, fill, permuted))
+			result[np.isinf(result)] = np.nan
+		else:
+			row_ends, col_ends = np.r_[row_starts[1:], len(rows)], np.r_[col_starts[1:], len(cols)]
+			result = np.array([[np.median(block[~np.isnan(block)]) if np.any(~np.isnan(block := permuted[r0:r1, c0:c1])) else np.nan
+			                    for c0, c1 in zip(col_starts, col_ends)] for r0, r1 in zip(row_starts, row_ends)])
+	return pd.DataFrame(result, index=_labels(row_groups, matrix.index), columns=_labels(col_groups, matrix.columns))
+
+def drill_down(matrix: pd.DataFrame, row_groups: Sequence[Sequence[int]], tile: tuple[int, int],
+			   col_groups: Sequence[Sequence[int]] = None) -> pd.DataFrame:
+	"""Sub-matrix of the block `tile` = (row group, column group)"""
+	col_groups = row_groups if col_groups is None else col_groups
+	return matrix.iloc[list(row_groups[tile[0]]), list(col_groups[tile[1]])]
+
+def cell_size(ax: plt.Axes, shape: tuple[int, int]) -> tuple[float, float]:
+	"""Width and height of a cell [pt] at the current axes position"""
+	bbox = ax.get_position()
+	width, height = ax.figure.get_size_inches()
+	return bbox.width * width * 72 / shape[1], bbox.height * height * 72 / shape[0]
+
+def label_fits(ax: plt.Axes, shape: tuple[int, int], lines: int, chars: int, fontsize: float = None) -> bool:
+	"""Whether `lines` lines of `chars` characters fit into a cell"""
+	fontsize = fontsize or plt.rcParams["font.size"]
+	width, height = cell_size(ax, shape)
+	return chars * .6 * fontsize <= width and lines * 1.2 * fontsize <= height
+
+def plot(ax: plt.Axes, matrix: pd.DataFrame, std: pd.DataFrame = None, annotate: bool = True,
+		 fmt: Callable[[float], str] = format_value, textcolors: tuple[str, str] = ("white", "black"),
+		 threshold: float = .5, ticks: bool = False, max_cells: int = 512, raster_cells: int = 128, agg: str = "mean",
+		 groups: Sequence[Sequence[int]] = None, **imshow_kwargs):
+	"""
+	Draw `matrix` into `ax` and label the cells with their value (and ±`std`) where the labels fit.
+	`ticks` labels the rows/columns with the matrix index/columns, thinned out if they do not fit.
+	Matrices with more than `max_cells` rows or columns are rolled up first: into `groups` (e.g. racks)
+	if given and few enough, else into uniform blocks.
+	Returns the image, e.g. for a colorbar.
+	"""
+	if max(matrix.shape) > max_cells:
+		if groups is not None and len(groups) <= max_cells:
+			matrix = rollup(matrix, groups, agg=agg)
+		else:
+			size = math.ceil(max(matrix.shape) / max_cells)
+			matrix = rollup(matrix, blocks(matrix.shape[0], size), blocks(matrix.shape[1], size), agg=agg)
+		std = None
+	im = ax.imshow(matrix, **imshow_kwargs)
+	if max(matrix.shape) > raster_cells:
+		im.set_rasterized(True)
+
+	if ticks:
+		width, height = cell_size(ax, matrix.shape)
+		fontsize = plt.rcParams["xtick.labelsize"]
+		fontsize = fontsize if isinstance(fontsize, (int, float)) else plt.rcParams["font.size"]
+		step = max(1, math.ceil(1.2 * fontsize / min(width, height)))
+		ax.set_xticks(np.arange(0, matrix.shape[1], step), labels=matrix.columns[::step])
+		ax.set_yticks(np.arange(0, matrix.shape[0], step), labels=matrix.index[::step])
+
+	lines = 1 if std is None else 2
+	if annotate and label_fits(ax, matrix.shape, lines=lines, chars=1):
+		values = matrix.to_numpy(dtype=float)
+		deviations = None if std is None else std.to_numpy(dtype=float)
+		texts = [[fmt(v) if deviations is None else f"{fmt(v)}\n±{fmt(deviations[i, j])}" for j, v in enumerate(row)]
+		         for i, row in enumerate(values)]
+		chars = max(len(line) for row in texts for text in row for line in text.split("\n"))
+		if label_fits(ax, values.shape, lines=lines, chars=chars):
+			with np.errstate(invalid="ignore"):
+				colors = np.ma.getdata(im.norm(values)) > threshold # NaN: False
+			for i in range(values.shape[0]):
+				for j in range(values.shape[1]):
+					ax.text(j, i, texts[i][j], ha="center", va="center", color=textcolors[int(colors[i, j])])
+	return im
@@ -0,0 +1,154 @@
+"""
+Content-addressed columnar cache for parsed measurement files.
+
+Raw measurement files (`.dat`, `.json`, `.csv`) are parsed once and stored as
+uncompressed Arrow IPC files, keyed by the SHA-256 of the raw file content and
+the parser name/version. Later loads memory-map the Arrow file instead of
+re-parsing the text. Bump the parser version whenever a parser changes its output.
+
+All cache entries are listed in an append-only index (`index.jsonl`) together with
+their tags (campaign, host set, MPI type, benchmark), see `query`.
+"""
+import hashlib
+import json
+import os
+from pathlib import Path
+from typing import Callable
+
+import numpy as np
+import pandas as pd
+
+import profiling
+
+try:
+	import pyarrow as pa
+	import pyarrow.feather
+except ImportError: # cache is optional, parse directly without pyarrow
+	pa = None
+
+CACHE_DIR = Path(os.environ.get("CHARACTERIZATION_CACHE",
+                                Path(__file__).resolve().parent.parent / ".cache" / "measurements"))
+TAGS = ("campaign", "host_set", "mpi_type", "benchmark")
+
+_index: dict[tuple[str,str], dict] = None
+
+
+def enabled() -> bool:
+	return pa is not None and os.environ.get("CHARACTERIZATION_CACHE_DISABLE", "") == ""
+
+def content_hash(path: Path) -> str:
+	h = hashlib.sha256()
+	with open(path, "rb") as infile:
+		for chunk in iter(lambda: infile.read(1 << 20), b""):
+			h.update(chunk)
+	return h.hexdigest()
+
+def _entry_path(key: str) -> Path:
+	return CACHE_DIR / key[:2] / f"{key}.arrow"
+
+def _load_index() -> dict[tuple[str,str], dict]:
+	global _index
+	if _index is None:
+		_index = {}
+		if (CACHE_DIR / "index.jsonl").is_file():
+			with open(CACHE_DIR / "index.jsonl", "r") as infile:
+				for line in infile:
+					try: entry = json.loads(line)
+					except json.JSONDecodeError: continue # partially written line of a killed process
+					_index[(entry["source"], entry["parser"])] = entry
+	return _index
+
+def _append_index(entry: dict):
+	_load_index()[(entry["source"], entry["parser"])] = entry
+	CACHE_DIR.mkdir(parents=True, exist_ok=True)
+	# single short O_APPEND writes, so concurrent loaders do not clobber each other
+	with open(CACHE_DIR / "index.jsonl", "a") as outfile:
+		outfile.write(json.dumps(entry) + "\n")
+
+def _write(df: pd.DataFrame, path: Path):
+	path.parent.mkdir(parents=True, exist_ok=True)
+	tmp = path.with_suffix(f".{os.getpid()}.tmp")
+	table = pa.Table.from_pandas(df)
+	# not stored by Arrow itself, kept as JSON in the schema metadata: `attrs` and non-string column labels
+	# (Arrow field names are strings, integer labels such as core ids would come back as text)
+	metadata = {}
+	if df.attrs:
+		metadata[b"attrs"] = json.dumps(df.attrs)
+	if not isinstance(df.columns, pd.MultiIndex) and any(not isinstance(c, str) for c in df.columns):
+		metadata[b"columns"] = json.dumps([c.item() if isinstance(c, np.generic) else c for c in df.columns])
+	if metadata:
+		table = table.replace_schema_metadata({**table.schema.metadata, **metadata})
+	pyarrow.feather.write_feather(table, tmp, compression="uncompressed")
+	os.replace(tmp, path)
+
+def _read(path: Path) -> pd.DataFrame:
+	table = pyarrow.feather.read_table(path, memory_map=True)
+	index = (table.schema.pandas_metadata or {}).get("index_columns", [])
+	if all(isinstance(i, dict) and i["kind"] == "range" and i["start"] == 0 and i["step"] == 1 for i in index) \
+			and all(pa.types.is_integer(t) or pa.types.is_floating(t) for t in table.schema.types):
+		# numeric columns with the default index: numpy columns directly, `to_pandas` costs ~1 ms per table
+		df = pd.DataFrame({name: column.to_numpy() for name, column in zip(table.column_names, table.columns)})
+		df.columns.name = (table.schema.pandas_metadata or {}).get("column_indexes", [{}])[0].get("name")
+	else:
+		df = table.to_pandas()
+	metadata = table.schema.metadata or {}
+	if b"columns" in metadata:
+		df.columns = pd.Index(json.loads(metadata[b"columns"]), name=df.columns.name)
+	if b"attrs" in metadata:
+		df.attrs = json.loads(metadata[b"attrs"])
+	return df
+
+def load(source: Path, parse: Callable[[Path], pd.DataFrame],
+		 parser: str, version: int, **tags) -> pd.DataFrame:
+	"""
+	Return `parse(source)`, served from the cache if the file content and parser version are known.
+	`tags` (see `TAGS`) are stored in the index for `query`.
+	"""
+	with profiling.stage("parse", parser=parser, source=Path(source).name) as record:
+		df, cached = _load(source, parse, parser, version, **tags)
+		if record: record.labels["cached"] = cached
+		return df
+
+def _load(source: Path, parse: Callable[[Path], pd.DataFrame], parser: str, version: int, **tags) -> tuple[pd.DataFrame, bool]:
+	if not enabled():
+		return parse(source), False
+
+	source = Path(source).resolve()
+	stat = source.stat()
+	entry = _load_index().get((str(source), parser))
+
+	# fast path: unchanged file (size & mtime) with a known content hash, do not touch the file at all
+	if entry and entry["version"] == version and entry["size"] == stat.st_size \
+	   and entry["mtime_ns"] == stat.st_mtime_ns and _entry_path(entry["key"]).is_file():
+		return _read(_entry_path(entry["key"])), True
+
+	sha256 = content_hash(source)
+	key = hashlib.sha256(f"{parser}:{version}:{sha256}".encode()).hexdigest()
+	path = _entry_path(key)
+	cached = path.is_file()
+	if cached:
+		df = _read(path)
+	else:
+		df = parse(source)
+		_write(df, path)
+
+	_append_index({"key": key, "source": str(source), "parser": parser, "version": version,
+	               "size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "sha256": sha256,
+	               **{tag: tags.get(tag, "") for tag in TAGS}})
+	return df, cached
+
+def query(**tags) -> pd.DataFrame:
+	"""Index entries (one per source file and parser) matching all given tags, e.g. `query(benchmark="osu_bw")`"""
+	df = pd.DataFrame(list(_load_index().values()), columns=["key", "source", "parser", "version",
+	                  "size", "mtime_ns", "sha256", *TAGS])
+	for tag, value in tags.items():
+		df = df[df[tag] == value]
+	return df.reset_index(drop=True)
+
+def clear():
+	"""Remove all cache entries and the index"""
+	global _index
+	for path in CACHE_DIR.glob("*/*.arrow"):
+		path.unlink()
+	(CACHE_DIR / "index.jsonl").unlink(missing_ok=True)
+	_index = None
@@ -0,0 +1,106 @@
+"""
+Stage timing of the analysis pipeline.
+
+The analysis code marks its stages with `with profiling.stage("parse", parser="osu"):`, e.g. parsing a raw file,
+aggregating runs or rendering a figure. Recording is off by default and then costs one function call per stage.
+`enable()` (or `CHARACTERIZATION_PROFILE=1`) records the wall and CPU time of every stage, its labels, its nesting
+depth (a `parse` inside an `aggregate` has depth 1) and the peak resident memory of the process after the stage.
+`frame()` returns all records, `write(path)` stores them as JSON lines. See `benchmarks/run.py`.
+"""
+import json
+import os
+import resource
+import sys
+import time
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass, field
+from functools import wraps
+from pathlib import Path
+
+import pandas as pd
+
+
+@dataclass
+class Record:
+	stage: str
+	labels: dict = field(default_factory=dict)
+	depth: int = 0
+	wall_s: float = 0.
+	cpu_s: float = 0.
+	max_rss_mb: float = 0.
+
+_enabled = os.environ.get("CHARACTERIZATION_PROFILE", "") != ""
+_records: list[Record] = []
+_depth = 0
+_labels: dict = {} # added to all records, e.g. the benchmarked module
+
+def enable(**labels):
+	"""Record all stages from now on, with `labels` added to every record"""
+	global _enabled, _labels
+	_enabled, _labels = True, labels
+
+def disable():
+	global _enabled
+	_enabled = False
+
+def enabled() -> bool:
+	return _enabled
+
+def _max_rss_mb() -> float:
+	rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+	return rss / (1 << 20) if sys.platform == "darwin" else rss / 1024 # bytes on macOS, kB on Linux
+
+@contextmanager
+def stage(name: str, **labels):
+	"""Time the enclosed code as stage `name` if recording is enabled"""
+	global _depth
+	if not _enabled:
+		yield
+		return
+	record = Record(stage=name, labels={**_labels, **labels}, depth=_depth)
+	_depth += 1
+	wall, cpu = time.perf_counter(), time.process_time()
+	try:
+		yield record
+	finally:
+		record.wall_s = time.perf_counter() - wall
+		record.cpu_s = time.process_time() - cpu
+		record.max_rss_mb = _max_rss_mb()
+		_depth -= 1
+		_records.append(record)
+
+def timed(name: str, **labels):
+	"""Decorator form of `stage`, the function name is added as label `function`"""
+	def decorate(function):
+		@wraps(function)
+		def wrapper(*args, **kwargs):
+			with stage(name, function=function.__name__, **labels):
+				return function(*args, **kwargs)
+		return wrapper
+	return decorate
+
+def records() -> list[Record]:
+	return list(_records)
+
+def reset():
+	_records.clear()
+
+def _self_times() -> list[float]:
+	"""Wall time of every record without its nested stages, which complete (and are recorded) before it"""
+	nested = {} # depth -> wall time of the completed stages at that depth since their parent started
+	result = []
+	for r in _records:
+		result.append(r.wall_s - nested.pop(r.depth + 1, 0.))
+		nested[r.depth] = nested.get(r.depth, 0.) + r.wall_s
+	return result
+
+def frame() -> pd.DataFrame:
+	"""One row per recorded stage (in order of completion), labels as columns, `self_s` without nested stages"""
+	return pd.DataFrame([{"stage": r.stage, "depth": r.depth, **r.labels, "wall_s": r.wall_s, "self_s": self_s,
+	                      "cpu_s": r.cpu_s, "max_rss_mb": r.max_rss_mb} for r, self_s in zip(_records, _self_times())])
+
+def write(path: Path, records: list[Record] = None):
+	"""Append all (or the given) records as JSON lines"""
+	with open(path, "a") as outfile:
+		for record in _records if records is None else records:
+			outfile.write(json.dumps(asdict(record), default=str) + "\n")
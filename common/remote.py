@@ -0,0 +1,202 @@
+"""
+Asyncio remote execution for the measurement drivers.
+
+Commands run through a backend: `SSHBackend` keeps one persistent, multiplexed ssh session
+(ControlMaster) per host, so the connection setup is paid once per host instead of once per
+command. `LocalBackend` runs the commands as local subprocesses, e.g. to test drivers without hosts.
+
+`Runner` bounds the number of concurrent commands (in total and per host), applies per-command
+timeouts, kills timed out or cancelled commands (including the remote process) and streams stdout
+into result files while the command runs.
+
+Example:
+	async with Runner(SSHBackend(), max_concurrency=8) as runner:
+		result = await runner.run("cn01", "iperf3 --version")
+		await runner.run("cn02", "iperf3 -c cn01 -J", timeout=90, stdout=Path("cn01_cn02.json"))
+"""
+import asyncio
+import os
+import shlex
+import shutil
+import signal
+import tempfile
+import time
+from dataclasses import dataclass
+from pathlib import Path
+
+CHUNK_SIZE = 1 << 16
+
+@dataclass
+class Result:
+	host: str
+	command: str
+	returncode: int # None if killed after a timeout
+	stdout: str     # "" if streamed into a file
+	stderr: str
+	elapsed: float  # [s]
+	timed_out: bool = False
+
+	@property
+	def ok(self) -> bool:
+		return self.returncode == 0
+
+
+class LocalBackend:
+	"""Runs commands on this machine, the host is ignored"""
+
+	async def connect(self, host: str):
+		pass
+
+	async def spawn(self, host: str, command: str) -> tuple[asyncio.subprocess.Process, int]:
+		# own process group, so the shell and its children are killed together
+		process = await asyncio.create_subprocess_exec("sh", "-c", command, start_new_session=True,
+			stdin=asyncio.subprocess.DEVNULL, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE)
+		return process, process.pid
+
+	async def kill(self, host: str, process: asyncio.subprocess.Process, pid: int):
+		try:
+			os.killpg(pid, signal.SIGKILL)
+		except ProcessLookupError:
+			pass
+
+	async def close(self, host: str):
+		pass
+
+	def shutdown(self):
+		pass
+
+class SSHBackend:
+	"""Runs commands via one persistent ssh ControlMaster session per host"""
+
+	def __init__(self, options: list[str] = (), control_dir: Path = None):
+		self.options = list(options)
+		self._own_control_dir = control_dir is None
+		self.control_dir = control_dir or Path(tempfile.mkdtemp(prefix="ssh-mux-"))
+
+	def _ssh(self, *args: str) -> list[str]:
+		return ["ssh", "-o", "BatchMode=yes", "-o", f"ControlPath={self.control_dir}/%C", *self.options, *args]
+
+	async def connect(self, host: str):
+		self.control_dir.mkdir(exist_ok=True) # removed by `shutdown` of an earlier runner
+		process = await asyncio.create_subprocess_exec(
+			*self._ssh("-o", "ControlMaster=yes", "-o", "ControlPersist=yes", "-N", "-f", host),
+			stdin=asyncio.subprocess.DEVNULL, stdout=asyncio.subprocess.DEVNULL, stderr=asyncio.subprocess.PIPE)
+		_, stderr = await process.communicate()
+		if process.returncode != 0:
+			raise ConnectionError(f"{host}: {stderr.decode().strip()}")
+
+	async def spawn(self, host: str, command: str) -> tuple[asyncio.subprocess.Process, int]:
+		# the first line of stdout is the remote PID, used to kill the remote command
+		process = await asyncio.create_subprocess_exec(
+			*self._ssh("-o", "ControlMaster=no", host, f"echo $$; exec sh -c {shlex.quote(command)}"),
+			stdin=asyncio.subprocess.DEVNULL, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE)
+		line = await process.stdout.readline()
+		return process, int(line) if line.strip().isdigit() else None
+
+	async def kill(self, host: str, process: asyncio.subprocess.Process, pid: int):
+		if pid is not None:
+			killer = await asyncio.create_subprocess_exec(
+				*self._ssh("-o", "ControlMaster=no", host, f"pkill -KILL -P {pid}; kill -KILL {pid}"),
+				stdin=asyncio.subprocess.DEVNULL, stdout=asyncio.subprocess.DEVNULL, stderr=asyncio.subprocess.DEVNULL)
+			await killer.wait()
+		if process.returncode is None:
+			process.kill()
+
+	async def close(self, host: str):
+		process = await asyncio.create_subprocess_exec(*self._ssh("-O", "exit", host),
+			stdout=asyncio.subprocess.DEVNULL, stderr=asyncio.subprocess.DEVNULL)
+		await process.wait()
+
+	def shutdown(self):
+		"""Remove the control socket directory if it was created here, after all sessions are closed"""
+		if self._own_control_dir:
+			shutil.rmtree(self.control_dir, ignore_errors=True)
+
+
+class Runner:
+	"""Bounded-concurrency command execution on a backend, with one session per host"""
+
+	def __init__(self, backend=None, max_concurrency: int = None, per_host: int = None):
+		self.backend = backend or SSHBackend()
+		self._limit = asyncio.Semaphore(max_concurrency) if max_concurrency else None
+		self._per_host = per_host
+		self._host_limits: dict[str, asyncio.Semaphore] = {}
+		self._sessions: dict[str, asyncio.Task] = {}
+
+	async def __aenter__(self) -> "Runner":
+		return self
+
+	async def __aexit__(self, *exc):
+		await self.close()
+
+	async def session(self, host: str):
+		"""Connect to `host` once, concurrent callers wait for the same connection"""
+		if host not in self._sessions:
+			self._sessions[host] = asyncio.ensure_future(self.backend.connect(host))
+		await self._sessions[host]
+
+	async def close(self):
+		await asyncio.gather(*[self.backend.close(host) for host in self._sessions], return_exceptions=True)
+		self._sessions.clear()
+		self.backend.shutdown()
+
+	async def _limited(self, host: str):
+		if self._per_host and host not in self._host_limits:
+			self._host_limits[host] = asyncio.Semaphore(self._per_host)
+		for limit in (self._limit, self._host_limits.get(host)):
+			if limit: await limit.acquire()
+
+	def _release(self, host: str):
+		for limit in (self._limit, self._host_limits.get(host)):
+			if limit: limit.release()
+
+	async def run(self, host: str, command: str, timeout: float = None, stdout: Path = None) -> Result:
+		"""
+		Run `command` on `host`. stdout is streamed into the file `stdout` if given, else returned.
+		After `timeout` seconds, or if the awaiting task is cancelled, the command is killed.
+		"""
+		await self.session(host)
+		await self._limited(host)
+		start = time.monotonic()
+		process, pid, reading = None, None, None
+		try:
+			process, pid = await self.backend.spawn(host, command)
+			sink = open(stdout, "wb") if stdout else None
+			try:
+				reading = asyncio.gather(_read(process.stdout, sink), _read(process.stderr, None))
+				out, err = await asyncio.wait_for(reading, timeout)
+				await process.wait()
+			finally:
+				if sink: sink.close()
+			return Result(host=host, command=command, returncode=process.returncode,
+			              stdout=out.decode(errors="replace"), stderr=err.decode(errors="replace"),
+			              elapsed=time.monotonic() - start)
+		except asyncio.TimeoutError:
+			await self._kill(host, process, pid, reading)
+			return Result(host=host, command=command, returncode=None, stdout="", stderr="",
+			              elapsed=time.monotonic() - start, timed_out=True)
+		except asyncio.CancelledError:
+			await self._kill(host, process, pid, reading)
+			raise
+		finally:
+			self._release(host)
+
+	async def _kill(self, host: str, process: asyncio.subprocess.Process, pid: int, reading: asyncio.Future = None):
+		if reading is not None: # cancelled by `wait_for`, collect its CancelledError instead of logging it
+			await asyncio.gather(reading, return_exceptions=True)
+		if process is None or process.returncode is not None:
+			return
+		await self.backend.kill(host, process, pid)
+		await process.wait()
+
+	async def run_all(self, commands: list[tuple[str, str]], **kwargs) -> list[Result]:
+		"""Run (host, command) tuples concurrently, see `run`"""
+		return await asyncio.gather(*[self.run(host, command, **kwargs) for host, command in commands])
+
+async def _read(stream: asyncio.StreamReader, sink) -> bytes:
+	"""Read `stream` until EOF, into `sink` if given (returns b"") or into the returned bytes"""
+	chunks = []
+	while chunk := await stream.read(CHUNK_SIZE):
+		if sink: sink.write(chunk)
+		else: chunks.append(chunk)
+	return b"".join(chunks)
@@ -0,0 +1,109 @@
+"""
+Headless batch renderer for all characterization figures.
+
+Every visualisation script provides `figures(save) -> {name: render callable}`.
+This script collects the figures of all scripts and renders them on a process pool
+with the Agg backend, printing the render time of each figure.
+
+`--profile out.jsonl` records the parse, aggregate and render stages (see `profiling.py`) as JSON lines.
+
+Usage: `python common/render.py [-j PROCESSES] [--profile PATH] [FILTER ...]`
+"""
+import argparse
+import importlib.util
+import multiprocessing
+import sys
+import time
+from dataclasses import dataclass
+from pathlib import Path
+
+import matplotlib
+matplotlib.use("Agg") # before any script imports pyplot, never open a GUI
+
+import profiling
+
+basepath = Path(__file__).resolve().parent.parent
+
+SCRIPTS = [
+	basepath / "compute-characterization" / "visualisation" / "analyse-c2c.py",
+	basepath / "compute-characterization" / "visualisation" / "analyse_roofline.py",
+	basepath / "memory-characterization" / "visualisation" / "analyse_caches.py",
+	basepath / "memory-characterization" / "visualisation" / "analyse_bandwidth.py",
+	basepath / "memory-characterization" / "visualisation" / "analyse_numa.py",
+	basepath / "network-characterization" / "mpi" / "visualisation" / "analyse_osu.py",
+	basepath / "network-characterization" / "mpi" / "visualisation" / "overhead.py",
+	basepath / "network-characterization" / "point-to-point" / "visualisation" / "main_iperf.py",
+	basepath / "network-characterization" / "point-to-point" / "visualisation" / "main_netperf.py",
+	basepath / "network-characterization" / "raw-slingshot" / "visualisation" / "analyse_raw_cxi.py",
+]
+
+@dataclass
+class FigureSpec:
+	script: Path
+	name: str
+
+	def __str__(self) -> str:
+		return f"{self.script.relative_to(basepath).parent.parent}/{self.name}"
+
+# per process: script -> (figures, rcParams after import)
+_loaded: dict[Path, tuple[dict, dict]] = {}
+
+def load_script(script: Path) -> tuple[dict, dict]:
+	"""Import a visualisation script by path and return its figures and matplotlib settings"""
+	if script not in _loaded:
+		# each script sets its own fonts at import time, keep them apart
+		matplotlib.rc_file_defaults()
+		sys.path.insert(0, str(script.parent))
+		spec = importlib.util.spec_from_file_location(script.stem.replace("-", "_"), script)
+		module = importlib.util.module_from_spec(spec)
+		spec.loader.exec_module(module)
+		_loaded[script] = (module.figures(save=True), dict(matplotlib.rcParams))
+	return _loaded[script]
+
+def collect(scripts: list[Path] = SCRIPTS) -> list[FigureSpec]:
+	return [FigureSpec(script, name) for script in scripts for name in load_script(script)[0]]
+
+def render(spec: FigureSpec) -> tuple[FigureSpec, float, list[profiling.Record]]:
+	"""Render one figure, returns its render time and the stages recorded meanwhile (if profiling is enabled)"""
+	figures, rc = load_script(spec.script)
+	start = time.perf_counter()
+	with matplotlib.rc_context(rc), profiling.stage("render", figure=spec.name):
+		figures[spec.name]()
+	records = profiling.records()
+	profiling.reset()
+	return spec, time.perf_counter() - start, records
+
+def _init_worker():
+	matplotlib.use("Agg", force=True)
+
+def render_all(specs: list[FigureSpec], processes: int = None) -> list[tuple[FigureSpec, float, list[profiling.Record]]]:
+	"""Render all figures on `processes` worker processes (default: all cores), returns the render time and stages per figure"""
+	if processes == 1:
+		return list(map(render, specs))
+	with multiprocessing.Pool(processes, initializer=_init_worker) as pool:
+		return list(pool.imap_unordered(render, specs))
+
+def main():
+	parser = argparse.ArgumentParser(description="Render all characterization figures")
+	parser.add_argument("-j", "--processes", type=int, default=None, help="number of worker processes (default: all cores)")
+	parser.add_argument("--profile", type=Path, default=None, help="append the timed stages to this JSON lines file")
+	parser.add_argument("filter", nargs="*", help="only render figures whose name contains one of these strings")
+	args = parser.parse_args()
+
+	if args.profile:
+		profiling.enable()
+	start = time.perf_counter()
+	specs = collect() # parses and aggregates the data of all scripts, workers inherit it
+	if args.filter:
+		specs = [spec for spec in specs if any(f in spec.name for f in args.filter)]
+	records = profiling.records()
+	profiling.reset()
+	timings = render_all(specs, args.processes)
+
+	for spec, seconds, _ in sorted(timings, key=lambda t: -t[1]):
+		print(f"{seconds:8.2f}s  {spec}")
+	print(f"{len(timings)} figures in {time.perf_counter() - start:.2f}s")
+	if args.profile:
+		profiling.write(args.profile, records + [record for _, _, figure_records in timings for record in figure_records])
+
+if __name__ == "__main__": main()
@@ -0,0 +1,190 @@
+"""
+Multi-block parser for OSU and CXI result files.
+
+The shell drivers append to their outputs (`>>`), so a repeated or resumed benchmark leaves several result blocks
+in one `.dat` file: a title with parameter lines, a column header and the numeric rows, once per run.
+`parse_osu` and `parse_cxi` split a file into these blocks and return them as one repeat × size × metric array:
+
+- blocks start at their title line (`# OSU MPI ... Test`, `CXI ... Test`), a file without titles is one block
+- the numeric rows of a block are found with one regular expression search per run of consecutive rows and
+  converted with `np.fromstring` straight from the file text, no per-line splitting or CSV round trip
+- blocks without rows (e.g. a run killed before its first message size) are skipped, rows cut short or with fields
+  that are not numbers (checked with a strict regular expression, `np.fromstring` reads e.g. `1.6e` as 1.6) are
+  dropped with a warning, sizes missing in some blocks are NaN there
+- all values are floats, also counts such as the operations of the CXI tests
+- per block metadata: the title, the `key : value` parameter lines and the line number of the title
+
+`load` caches the parsed blocks in the measurement cache (`measurement_cache.py`) as a long table.
+"""
+import re
+import sys
+import warnings
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable
+
+import numpy as np
+import pandas as pd
+
+import measurement_cache
+
+PARSER_VERSION = 3
+
+_ROWS = re.compile(r"^[ \t]*\d[^\n]*(?:\n[ \t]*\d[^\n]*)*", flags=re.MULTILINE) # consecutive lines starting with a digit
+# whitespace separated decimal numbers, `nan` or `inf` only (possessive, no backtracking)
+_NUMBERS = re.compile(r"\s*+(?:[-+]?(?:(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?|nan|inf)(?:\s++|\Z))*+", flags=re.IGNORECASE)
+
+@dataclass
+class Blocks:
+	sizes: np.ndarray   # message sizes of all blocks [B]
+	metrics: list[str]  # column headers after the size
+	values: np.ndarray  # repeat × size × metric, NaN where a block has no row
+	meta: list[dict]    # per block: `title`, `line` and the parameters of its header
+	size_name: str = None # header of the size column, the index name of `frame`
+
+	@property
+	def repeats(self) -> int:
+		return len(self.values)
+
+	def frame(self, repeat: int = 0) -> pd.DataFrame:
+		"""size × metric table of one block, sizes it does not have dropped"""
+		df = pd.DataFrame(self.values[repeat], index=pd.Index(self.sizes, name=self.size_name), columns=self.metrics)
+		missing = np.isnan(self.values[repeat]).all(axis=1)
+		return df[~missing] if missing.any() else df
+
+	def frames(self) -> list[pd.DataFrame]:
+		return [self.frame(r) for r in range(self.repeats)]
+
+	def to_frame(self) -> pd.DataFrame:
+		"""Long table (`repeat`, `size`, metrics) with the metadata in `attrs`, the form stored in the cache"""
+		flat = self.values.reshape(-1, len(self.metrics))
+		df = pd.DataFrame({"repeat": np.repeat(np.arange(self.repeats), len(self.sizes)),
+		                   "size": np.tile(self.sizes, self.repeats),
+		                   **{metric: flat[:, i] for i, metric in enumerate(self.metrics)}})
+		df.attrs = {"meta": self.meta, "size_name": self.size_name}
+		return df
+
+	@classmethod
+	def from_frame(cls, df: pd.DataFrame) -> "Blocks":
+		table = df.to_numpy(dtype=float) # repeat, size, metrics
+		repeats = int(table[-1, 0]) + 1
+		sizes = table[:len(table) // repeats, 1].astype(np.int64)
+		return cls(sizes=sizes, metrics=list(df.columns[2:]), values=table[:, 2:].reshape(repeats, len(sizes), -1),
+		           meta=list(df.attrs.get("meta", [])), size_name=df.attrs.get("size_name"))
+
+
+def _numbers(text: str) -> np.ndarray:
+	with warnings.catch_warnings():
+		warnings.simplefilter("ignore", DeprecationWarning) # text not read to its end, see the callers
+		return np.fromstring(text, sep=" ")
+
+def _rows(text: str, begin: int, end: int, columns: int, source: str = "") -> np.ndarray:
+	"""rows × columns of the numbers in `text[begin:end]`, rows that are cut short or not numeric dropped"""
+	span = text[begin:end]
+	values = _numbers(span)
+	# `fromstring` stops at the first token that is not a number or reads a prefix of it (`1.6e`, `1.6.2`),
+	# all tokens must be numbers and must have been read
+	if values.size % columns or values.size != len(span.split()) or not _NUMBERS.fullmatch(span):
+		lines = span.splitlines()
+		rows = [np.array(line.split(), dtype=float) for line in lines
+		        if len(line.split()) == columns and _NUMBERS.fullmatch(line)]
+		warnings.warn(f"{source}: {len(lines) - len(rows)} malformed rows dropped "
+		              f"(line {text.count(chr(10), 0, begin) + 1} ff.)")
+		values = np.array(rows).ravel()
+	return values.reshape(-1, columns)
+
+def _params(text: str) -> dict[str, str]:
+	"""Title (first line with text) and `key : value` lines of a block header, `#` prefixes removed"""
+	params = {}
+	for line in text.splitlines():
+		line = line.lstrip("#").strip()
+		if not line or line.startswith("---"):
+			continue
+		if "title" not in params and ":" not in line:
+			params["title"] = line
+		elif ":" in line:
+			key, _, value = line.partition(":")
+			params[key.strip()] = value.strip()
+	return params
+
+def parse(text: str, start: re.Pattern, header: re.Pattern, columns: Callable[[str], list[str]],
+		  source: str = "") -> Blocks:
+	"""
+	Blocks of `text`, each from the line of a match of `start` to the next: the first match of `header` is the column
+	header (`columns` splits it, the first column is the size), the rows follow it
+	"""
+	# `start` begins with a literal (fast to scan for), blocks begin at the start of its line
+	starts = [text.rfind("\n", 0, m.start()) + 1 for m in start.finditer(text)
+	          if not text[text.rfind("\n", 0, m.start()) + 1:m.start()].strip()]
+	if not starts or starts[0] > 0 and header.search(text, 0, starts[0]):
+		starts.insert(0, 0) # rows before the first title
+	names, blocks, meta = None, [], []
+	line, counted = 1, 0
+	for begin, end in zip(starts, starts[1:] + [len(text)]):
+		line, counted = line + text.count("\n", counted, begin), begin
+		head = header.search(text, begin, end)
+		if not head:
+			continue
+		block_columns = columns(head.group(1))
+		if names is None:
+			names = block_columns
+		elif block_columns != names:
+			raise ValueError(f"{source}: block at line {line} has the columns {block_columns}, not {names}")
+		rows = [_rows(text, m.start(), m.end(), len(names), source) for m in _ROWS.finditer(text, head.end(), end)]
+		rows = [r for r in rows if len(r)]
+		if not rows:
+			continue
+		blocks.append(np.concatenate(rows))
+		meta.append({"line": line, **_params(text[begin:head.start()])})
+	if not blocks:
+		raise ValueError(f"{source}: no result rows")
+
+	if all(len(b) == len(blocks[0]) and (b[:, 0] == blocks[0][:, 0]).all() for b in blocks[1:]):
+		sizes, values = blocks[0][:, 0], np.stack(blocks)[:, :, 1:] # complete repeats of the same sizes
+	else:
+		sizes = np.unique(np.concatenate([b[:, 0] for b in blocks]))
+		values = np.full((len(blocks), len(sizes), len(names) - 1), np.nan)
+		for r, block in enumerate(blocks):
+			values[r, np.searchsorted(sizes, block[:, 0])] = block[:, 1:]
+	return Blocks(sizes=sizes.astype(np.int64), metrics=names[1:], values=values, meta=meta, size_name=names[0] or None)
+
+
+OSU_START = re.compile(r"# OSU [^\n]*Test")
+OSU_HEADER = re.compile(r"^# Size\s+(.*?)\s*$", flags=re.MULTILINE)
+CXI_START = re.compile(r"CXI [^\n]* Test")
+CXI_HEADER = re.compile(r"^(\S+ Size\[B\].*?)\s*$", flags=re.MULTILINE)
+
+def osu_columns(header: str) -> list[str]:
+	"""
+	`Latency (us)  P50 Tail Lat(us) ...` -> `["", "Latency (us)", "P50 Tail Lat(us)", ...]`: columns are separated by
+	two or more spaces, or by one after a unit (`Bandwidth (MB/s) P50 Tail BW(MB/s)`); `MB/s  Messages/s` of
+	`osu_mbw_mr` and `Iterations` of `-f` have no unit
+	"""
+	return ["", *re.split(r"(?<=\))\s+|\s{2,}", header.strip())]
+
+def cxi_columns(header: str) -> list[str]:
+	return re.split(r"\s{2,}", header.strip())
+
+def parse_osu(file: Path) -> Blocks:
+	return parse(Path(file).read_text(), OSU_START, OSU_HEADER, osu_columns, source=str(file))
+
+def parse_cxi(file: Path) -> Blocks:
+	return parse(Path(file).read_text(), CXI_START, CXI_HEADER, cxi_columns, source=str(file))
+
+PARSERS = {"osu": parse_osu, "cxi": parse_cxi}
+
+def load(file: Path, fmt: str, **tags) -> Blocks:
+	"""Blocks of an OSU or CXI (`fmt`) file through the measurement cache, `tags` see `measurement_cache.load`"""
+	df = measurement_cache.load(file, lambda f: PARSERS[fmt](f).to_frame(), parser=f"{fmt}_blocks",
+	                            version=PARSER_VERSION, **tags)
+	return Blocks.from_frame(df)
+
+
+def main():
+	for file in map(Path, sys.argv[1:]):
+		blocks = PARSERS["cxi" if "_cxi_" in file.name else "osu"](file)
+		print(f"{file.name}: {blocks.repeats} blocks, {len(blocks.sizes)} sizes, {', '.join(blocks.metrics)}")
+		for meta in blocks.meta:
+			print(f"  line {meta['line']}: {meta.get('title', '')}")
+
+if __name__ == "__main__": main()
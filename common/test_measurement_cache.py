@@ -0,0 +1,39 @@
+"""Warm loads of `measurement_cache` return the frame of a cold parse, run with `python -m pytest common`"""
+import numpy as np
+import pandas as pd
+import pytest
+
+import measurement_cache
+
+pytest.importorskip("pyarrow")
+
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+	monkeypatch.setattr(measurement_cache, "CACHE_DIR", tmp_path / "cache")
+	monkeypatch.setattr(measurement_cache, "_index", None)
+	monkeypatch.delenv("CHARACTERIZATION_CACHE_DISABLE", raising=False)
+	return measurement_cache
+
+@pytest.mark.parametrize("frame", [
+	pd.DataFrame(np.arange(36.).reshape(3, 12)),                                # int labels (core ids), default index
+	pd.DataFrame(np.arange(36.).reshape(12, 3).T, index=[10, 2, 7]),            # int labels, own index
+	pd.DataFrame({"Size": [1, 2], "BW[MB/s]": [.5, np.nan]}).set_index("Size"), # string labels
+], ids=["range_index", "int_index", "str_labels"])
+def test_warm_equals_cold(cache, tmp_path, frame):
+	source = tmp_path / "run.csv"
+	source.write_text("raw")
+	cold = cache.load(source, lambda f: frame.copy(), parser="test", version=1)
+	warm = cache.load(source, lambda f: pytest.fail("served from the cache"), parser="test", version=1)
+	assert cold.equals(warm)
+	pd.testing.assert_index_equal(cold.columns, warm.columns)
+	assert sorted(warm.columns) == sorted(frame.columns) # int labels sort as numbers, not as text
+
+def test_attrs_kept(cache, tmp_path):
+	source = tmp_path / "run.dat"
+	source.write_text("raw")
+	frame = pd.DataFrame({"repeat": [0, 0], "size": [1, 2], "Mean[us]": [1., 2.]})
+	frame.attrs = {"meta": [{"line": 1, "title": "CXI RDMA Send Latency Test"}]}
+	cache.load(source, lambda f: frame, parser="test", version=1)
+	warm = cache.load(source, lambda f: pytest.fail("served from the cache"), parser="test", version=1)
+	assert warm.attrs == frame.attrs and warm.equals(frame)
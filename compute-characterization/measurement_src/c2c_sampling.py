@@ -0,0 +1,327 @@
+"""
+Adaptive pair sampling for core-to-core latency matrices.
+
+`core-to-core-latency` measures all N·(N-1)/2 core pairs. This driver measures a sample of pairs
+(one `--cores i,j` run each) and completes the matrix from the topology structure:
+
+1. coarse: every core is measured against `degree` random partners and its likely SMT siblings
+   (neighbouring ids and ids N/2 apart, plus the siblings Linux reports when measuring)
+2. finest groups: cores connected by pairs at least 1.25 × faster than the median measured latency of
+   both cores (SMT siblings, core clusters); all pairs inside groups of at most `group_limit` cores are measured
+3. a latency model is fitted to the measured pairs between groups: every core gets coordinates in a
+   `dims`-dimensional space and a height, the latency of a pair is their distance plus both heights
+   (network coordinates, Dabek et al.: "Vivaldi", 2004), fitted with relative residuals; the pairs of each
+   core with its `neighbours` nearest cores in the model are measured and the groups updated (cluster boundaries)
+4. variance: the completed matrix is cut into about √N blocks of cores (average linkage, see `topology.py`);
+   blocks with fewer than `min_block` measured pairs, or whose measured pairs deviate from the model by more
+   than `tolerance` (relative RMS), get twice as many measured pairs, until `budget` of all pairs is measured
+   (steps 1 to 3 are not limited by the budget)
+5. fill: unmeasured pairs are the model latency, corrected by the median relative residual of the
+   measured pairs of their finest group pair, else of their block pair, within the measured range
+
+The confidence of a pair is 1 if measured, else 1 - the relative RMS residual of the measured pairs of its
+block pair (clipped to [0, 1]), an estimate of how far the model may be off.
+
+The completed matrix is written like the output of `core-to-core-latency --csv` (lower triangle),
+the confidence next to it as `<name>.confidence.csv`, both for `visualisation/analyse-c2c.py`.
+`--replay` samples from an existing full measurement instead of running the tool and reports the error
+of the completed matrix, to choose parameters before spending time on the machine.
+
+Usage: `python c2c_sampling.py OUT.csv [--cores N] [--binary core-to-core-latency] [--replay FULL.csv]`
+"""
+import argparse
+import itertools
+import math
+import os
+import subprocess
+import sys
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Callable
+
+import numpy as np
+import pandas as pd
+
+sys.path.append(str(Path(__file__).resolve().parents[1] / "visualisation"))
+sys.path.append(str(Path(__file__).resolve().parents[2] / "common"))
+import bootstrap
+import topology
+
+Pair = tuple[int, int] # i < j
+Measure = Callable[[Pair], float] # latency [ns]
+
+@dataclass
+class Sample:
+	n: int
+	latency: dict[Pair, float] = field(default_factory=dict)
+
+	def matrix(self) -> np.ndarray:
+		m = np.full((self.n, self.n), np.nan)
+		if self.latency:
+			i, j = np.array(list(self.latency.keys())).T
+			m[i, j] = m[j, i] = list(self.latency.values())
+		return m
+
+	@property
+	def fraction(self) -> float:
+		return len(self.latency) / (self.n * (self.n - 1) / 2)
+
+@dataclass
+class Completion:
+	latency: np.ndarray    # completed matrix, NaN diagonal
+	confidence: np.ndarray # 1: measured
+	measured: int          # pairs
+	fraction: float        # of all pairs
+
+
+def tool_measure(binary: str, iterations: int = 5000, samples: int = 600, tolerance: float = None,
+                 max_repeats: int = 30) -> Measure:
+	"""
+	Mean latency of one pair from a `core-to-core-latency --cores i,j --csv` run, with `tolerance` the mean of
+	repeated runs until the relative half width of its 95% bootstrap interval is at most `tolerance`
+	"""
+	def once(pair: Pair) -> float:
+		command = [binary, "--bench", "1", "--cores", f"{pair[0]},{pair[1]}", "--csv", str(iterations), str(samples)]
+		output = subprocess.run(command, check=True, capture_output=True, text=True).stdout
+		rows = [line.split(",") for line in output.strip().splitlines()]
+		return float(rows[1][0])
+
+	def measure(pair: Pair) -> float:
+		if not tolerance:
+			return once(pair)
+		_, ci = bootstrap.repeat_until(lambda: np.array([once(pair)]), tolerance, max_repeats=max_repeats)
+		return float(ci.estimate[0])
+	return measure
+
+def replay_measure(full: np.ndarray, noise: float = 0., seed: int = 0) -> Measure:
+	"""Latency of a pair from an existing full matrix, with relative Gaussian `noise`"""
+	rng = np.random.default_rng(seed)
+	return lambda pair: full[pair] * (1 + noise * rng.standard_normal())
+
+
+def _group_index(groups: list[list[int]], n: int) -> np.ndarray:
+	index = np.zeros(n, dtype=int)
+	for g, members in enumerate(groups):
+		index[members] = g
+	return index
+
+def fit_model(m: np.ndarray, dims: int = 3, iterations: int = 2000, rate: float = .05, seed: int = 0,
+              groups: list[list[int]] = None) -> np.ndarray:
+	"""
+	Latency model of all pairs from the measured pairs of `m` (NaN: not measured):
+	coordinates x and heights h per core, latency(i, j) = |x_i - x_j| + h_i + h_j, fitted by Adam.
+	Pairs inside `groups` are left out (NaN), they are measured and would pull the groups into points.
+	"""
+	n = len(m)
+	index = _group_index(groups or [[c] for c in range(n)], n)
+	i, j = np.nonzero(np.triu(~np.isnan(m) & (index[:, None] != index[None]), k=1))
+	scale = np.median(m[i, j])
+	y = m[i, j] / scale
+	rng = np.random.default_rng(seed)
+	params = np.concatenate([rng.normal(scale=.1, size=(n, dims)), np.full((n, 1), .1)], axis=1)
+	moment, velocity = np.zeros_like(params), np.zeros_like(params)
+	for step in range(1, iterations + 1):
+		x, h = params[:, :dims], params[:, dims]
+		diff = x[i] - x[j]
+		distance = np.sqrt((diff ** 2).sum(axis=1) + 1e-9)
+		g = 2 * (distance + h[i] + h[j] - y) / y ** 2 # d(relative squared residual)/d(prediction)
+		grad = np.zeros_like(params)
+		for d in range(dims):
+			component = g * diff[:, d] / distance
+			grad[:, d] = np.bincount(i, component, n) - np.bincount(j, component, n)
+		grad[:, dims] = np.bincount(i, g, n) + np.bincount(j, g, n)
+		moment = .9 * moment + .1 * grad
+		velocity = .999 * velocity + .001 * grad ** 2
+		params -= rate * (moment / (1 - .9 ** step)) / (np.sqrt(velocity / (1 - .999 ** step)) + 1e-8)
+		params[:, dims] = np.maximum(params[:, dims], 0)
+	x, h = params[:, :dims], params[:, dims]
+	model = (np.sqrt(((x[:, None] - x[None]) ** 2).sum(axis=-1)) + h[:, None] + h[None]) * scale
+	model[index[:, None] == index[None]] = np.nan
+	return model
+
+def block_groups(m: np.ndarray, blocks: int) -> list[list[int]]:
+	"""About `blocks` groups of cores with similar latencies (average linkage)"""
+	merges = topology.average_linkage(topology.PackedSymmetric.from_dense(m))
+	return topology.cut(merges, merges[len(m) - blocks, 2]) if blocks < len(m) else [[c] for c in range(len(m))]
+
+def tight_groups(measured: np.ndarray, gap_ratio: float = 1.25) -> list[list[int]]:
+	"""
+	Finest topology groups (SMT siblings, core clusters) from the measured pairs only: connected cores whose
+	latency is at least `gap_ratio` times below the median measured latency of both
+	"""
+	n = len(measured)
+	median = np.nanmedian(np.where(np.isnan(measured).all(axis=1)[:, None], np.inf, measured), axis=1)
+	i, j = np.nonzero(np.triu(measured * gap_ratio < np.minimum(median[:, None], median[None]), k=1))
+	parent = list(range(n))
+	def find(c: int) -> int:
+		while parent[c] != c:
+			parent[c] = parent[parent[c]]
+			c = parent[c]
+		return c
+	for a, b in zip(i, j):
+		parent[find(a)] = find(b)
+	groups = {}
+	for c in range(n):
+		groups.setdefault(find(c), []).append(c)
+	return list(groups.values())
+
+def block_residuals(measured: np.ndarray, model: np.ndarray, groups: list[list[int]]) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+	"""Per group pair: number of measured pairs, median and RMS of their relative residuals"""
+	n, k = len(measured), len(groups)
+	index = _group_index(groups, n)
+	i, j = np.nonzero(np.triu(~np.isnan(measured) & ~np.isnan(model), k=1))
+	residual = measured[i, j] / model[i, j] - 1
+	a, b = np.minimum(index[i], index[j]), np.maximum(index[i], index[j])
+	count, median, rms = np.zeros((k, k)), np.full((k, k), np.nan), np.full((k, k), np.nan)
+	order = np.lexsort((b, a))
+	for (ga, gb), members in itertools.groupby(order, key=lambda p: (a[p], b[p])):
+		r = residual[list(members)]
+		count[ga, gb] = count[gb, ga] = len(r)
+		median[ga, gb] = median[gb, ga] = np.median(r)
+		rms[ga, gb] = rms[gb, ga] = np.sqrt(np.mean(r ** 2))
+	return count, median, rms
+
+
+def sibling_candidates(core: int, n: int) -> list[int]:
+	"""Partners under the usual SMT numberings: neighbouring ids (0, 1) and halves (0, n/2)"""
+	return [core ^ 1, (core + n // 2) % n] if n > 2 else []
+
+def sample(n: int, measure: Measure, degree: int = 4, neighbours: int = 3, group_limit: int = 8,
+		   dims: int = 3, blocks: int = None, min_block: int = 2, tolerance: float = .05, budget: float = .3,
+		   rounds: int = 3, known_groups: list[list[int]] = None, seed: int = 0, log: Callable[[str], None] = lambda s: None) -> Completion:
+	rng = np.random.default_rng(seed)
+	result = Sample(n)
+	limit = int(budget * n * (n - 1) / 2)
+
+	def add(pairs, limited: bool = True) -> int:
+		new = [p for p in dict.fromkeys((min(a, b), max(a, b)) for a, b in pairs if a != b) if p not in result.latency]
+		if limited:
+			new = new[:max(0, limit - len(result.latency))]
+		for p in new:
+			result.latency[p] = measure(p)
+		return len(new)
+
+	# 1. coarse: random partners per core, likely siblings and the given groups
+	for core in range(n):
+		partners = rng.choice(n - 1, size=min(degree, n - 1), replace=False)
+		add(((core, partner) for partner in partners + (partners >= core)), limited=False)
+	add(((core, partner) for core in range(n) for partner in sibling_candidates(core, n)), limited=False)
+	add((pair for g in known_groups or [] if len(g) <= group_limit for pair in itertools.combinations(g, 2)), limited=False)
+	log(f"coarse: {len(result.latency)} pairs")
+
+	# 2./3. model, nearest neighbours and finest groups
+	def groups() -> list[list[int]]:
+		return [g for g in tight_groups(result.matrix()) if len(g) <= group_limit]
+	for _ in range(2):
+		add((pair for g in groups() for pair in itertools.combinations(g, 2)), limited=False)
+	model = fit_model(result.matrix(), dims=dims, seed=seed, groups=groups())
+	nearest = np.argsort(np.where(np.isnan(model), np.inf, model), axis=1)[:, :neighbours]
+	add(((core, other) for core in range(n) for other in nearest[core]), limited=False)
+	for _ in range(2):
+		add((pair for g in groups() for pair in itertools.combinations(g, 2)), limited=False)
+	log(f"cluster boundaries: {len(result.latency)} pairs, {len(groups())} finest groups")
+
+	# 4. refine blocks with few measurements or a poor fit
+	blocks = blocks or math.ceil(math.sqrt(n))
+	for _ in range(rounds):
+		model = fit_model(result.matrix(), dims=dims, seed=seed, groups=groups())
+		completed = np.where(np.isnan(result.matrix()), model, result.matrix())
+		coarse = block_groups(completed, blocks)
+		count, _, rms = block_residuals(result.matrix(), model, coarse)
+		refine = [(a, b) for a in range(len(coarse)) for b in range(a, len(coarse))
+		          if count[a, b] < min_block or rms[a, b] > tolerance]
+		pairs = []
+		for a, b in refine:
+			candidates = [(x, y) for x in coarse[a] for y in coarse[b] if x < y and (x, y) not in result.latency]
+			take = min(len(candidates), max(min_block, int(count[a, b])))
+			pairs += [candidates[c] for c in rng.choice(len(candidates), size=take, replace=False)] if take else []
+		if not add(pairs):
+			break
+		log(f"refined {len(refine)} blocks: {len(result.latency)} pairs")
+
+	return complete(result, dims=dims, blocks=blocks, group_limit=group_limit, seed=seed)
+
+def complete(result: Sample, dims: int = 3, blocks: int = None, group_limit: int = 8, seed: int = 0) -> Completion:
+	"""Measured pairs plus the model of the unmeasured ones, corrected per block pair"""
+	n, measured = result.n, result.matrix()
+	finest = tight_groups(measured)
+	model = fit_model(measured, dims=dims, seed=seed, groups=[g for g in finest if len(g) <= group_limit])
+	completed = np.where(np.isnan(measured), model, measured)
+	correction, error = np.zeros((n, n)), np.full((n, n), np.nan)
+	for groups in [block_groups(completed, blocks or math.ceil(math.sqrt(n))), finest]:
+		count, median, rms = block_residuals(measured, model, groups)
+		index = _group_index(groups, n)
+		usable = (count >= 2)[np.ix_(index, index)]
+		correction = np.where(usable, median[np.ix_(index, index)], correction)
+		error = np.where(usable, rms[np.ix_(index, index)], error)
+	error = np.where(np.isnan(error), np.nanmedian(error), error)
+
+	between = measured[~np.isnan(model)] # measured pairs outside the finest groups
+	latency = np.where(np.isnan(measured), np.clip(model * (1 + correction), np.nanmin(between), np.nanmax(between)), measured)
+	confidence = np.where(np.isnan(measured), np.clip(1 - error, 0, 1), 1.)
+	np.fill_diagonal(latency, np.nan)
+	np.fill_diagonal(confidence, np.nan)
+	return Completion(latency=latency, confidence=confidence, measured=len(result.latency), fraction=result.fraction)
+
+
+def to_csv(matrix: np.ndarray, path: Path):
+	"""Lower triangle like `core-to-core-latency --csv`"""
+	pd.DataFrame(np.where(np.tril(np.ones_like(matrix, dtype=bool), k=-1), matrix, np.nan)) \
+		.to_csv(path, header=False, index=False, na_rep="")
+
+def sysfs_siblings(n: int) -> list[list[int]]:
+	"""SMT siblings among the first `n` CPUs of this machine, if Linux reports them"""
+	groups = set()
+	for cpu in range(n):
+		path = Path(f"/sys/devices/system/cpu/cpu{cpu}/topology/thread_siblings_list")
+		if path.is_file():
+			siblings = []
+			for part in path.read_text().strip().split(","): # `0,40` or `0-1`
+				first, _, last = part.partition("-")
+				siblings += range(int(first), int(last or first) + 1)
+			groups.add(tuple(c for c in siblings if c < n))
+	return [list(g) for g in groups if len(g) > 1]
+
+def read_full(path: Path) -> np.ndarray:
+	df = pd.read_csv(path, header=None)
+	return df.combine_first(df.T).to_numpy(dtype=float)
+
+def main():
+	parser = argparse.ArgumentParser(description="Core-to-core latency matrix from an adaptive sample of core pairs")
+	parser.add_argument("out", type=Path, help="completed matrix CSV, the confidence goes to <out>.confidence.csv")
+	parser.add_argument("--cores", type=int, default=None, help="number of cores (default: all online cores)")
+	parser.add_argument("--binary", default="./core-to-core-latency")
+	parser.add_argument("--iterations", type=int, default=5000)
+	parser.add_argument("--samples", type=int, default=600)
+	parser.add_argument("--ci-tolerance", type=float, default=None,
+	                    help="repeat every pair until the relative half width of its 95%% confidence interval is at most this")
+	parser.add_argument("--replay", type=Path, default=None, help="sample from this full measurement instead of measuring")
+	parser.add_argument("--noise", type=float, default=0., help="relative noise added to replayed latencies")
+	parser.add_argument("--degree", type=int, default=4, help="random partners per core in the coarse sample")
+	parser.add_argument("--budget", type=float, default=.3, help="maximum fraction of all pairs to measure")
+	parser.add_argument("--tolerance", type=float, default=.05, help="relative RMS model residual that makes a block refined")
+	parser.add_argument("--seed", type=int, default=0)
+	args = parser.parse_args()
+
+	full = read_full(args.replay) if args.replay else None
+	n = len(full) if full is not None else args.cores or len(os.sched_getaffinity(0))
+	measure = replay_measure(full, args.noise, args.seed) if full is not None \
+		else tool_measure(args.binary, args.iterations, args.samples, args.ci_tolerance)
+
+	start = time.perf_counter()
+	result = sample(n, measure, degree=args.degree, tolerance=args.tolerance, budget=args.budget,
+	                known_groups=None if full is not None else sysfs_siblings(n), seed=args.seed,
+	                log=lambda s: print(s, file=sys.stderr))
+	print(f"measured {result.measured} of {n * (n - 1) // 2} pairs ({result.fraction:.0%}) in {time.perf_counter() - start:.1f}s",
+	      file=sys.stderr)
+	if full is not None:
+		unmeasured = result.confidence < 1
+		error = np.abs(result.latency / full - 1)[unmeasured]
+		print(f"unmeasured pairs: median error {np.median(error):.1%}, 95th percentile {np.percentile(error, 95):.1%}, "
+		      f"max {error.max():.1%}", file=sys.stderr)
+
+	to_csv(result.latency, args.out)
+	to_csv(result.confidence.round(3), args.out.with_suffix(".confidence.csv"))
+
+if __name__ == "__main__": main()
@@ -0,0 +1,249 @@
+/*
+ * Peak floating-point throughput (FP64) of scalar, SIMD and FMA instructions.
+ *
+ * Every kernel updates independent accumulators held in registers, enough of them to cover the latency of
+ * the floating-point units, so the result is bound by the issue rate only:
+ * - scalar: one double per instruction, separate add and multiply chains (no fusion possible)
+ * - simd:   the same on vectors of the widest vector unit the compiler targets (-march/-mcpu=native)
+ * - fma:    fused multiply-add on vectors, 2 FLOP per lane and instruction
+ * Every thread is pinned to its own CPU set, all threads run a kernel concurrently between two barriers,
+ * the result is the number of FLOP of all threads over the wall time of the fastest repetition.
+ * The number of iterations per repetition doubles until a repetition takes at least the minimum time.
+ *
+ * Build: cc -O3 -pthread peak_flops.c -o peak_flops (plus -march=native or -mcpu=native where supported)
+ * Usage: peak_flops [-k KERNELS] [-r REPEATS] [-m MIN_SECONDS] [-c CPUS ...]
+ *   KERNELS: comma-separated, default scalar,simd,fma
+ *   CPUS:    CPU list of one thread, e.g. 0 or 0-3,8; one -c per thread, default one unpinned thread
+ * Output: one line `kernel,threads,gflops,vector_bytes` per kernel
+ */
+#define _GNU_SOURCE
+#include <pthread.h>
+#include <sched.h>
+#include <stdio.h>
+#include <stdlib.h>
+#include <string.h>
+#include <time.h>
+#include <unistd.h>
+
+#if defined(__AVX512F__)
+#define VECTOR 64
+#elif defined(__AVX__)
+#define VECTOR 32
+#else
+#define VECTOR 16 /* SSE2, NEON */
+#endif
+#define LANES (VECTOR / (int)sizeof(double))
+#define CHAINS 12 /* independent accumulators per kernel, fit into 16 vector registers */
+
+typedef double vector __attribute__((vector_size(VECTOR)));
+
+enum kernel { SCALAR, SIMD, FMA, KERNELS };
+static const char *names[KERNELS] = {"scalar", "simd", "fma"};
+
+struct thread {
+	pthread_t id;
+	int pinned;
+	cpu_set_t cpus;
+	double sink; /* keeps the results alive */
+};
+
+static struct thread *threads;
+static int nthreads;
+static int kernels[KERNELS], nkernels;
+static int repeats = 5;
+static double min_time = .01;
+static pthread_barrier_t barrier;
+
+/* written by thread 0 between barriers */
+static long iterations;
+static int measured;
+static double best;
+
+static double now(void) {
+	struct timespec t;
+	clock_gettime(CLOCK_MONOTONIC, &t);
+	return t.tv_sec + t.tv_nsec * 1e-9;
+}
+
+/* the empty asm hides the values from the optimizer: no vectorization, no constant folding */
+#define OPAQUE(x) __asm__ volatile("" : "+x"(x))
+#if defined(__aarch64__)
+#undef OPAQUE
+#define OPAQUE(x) __asm__ volatile("" : "+w"(x))
+#endif
+
+/* applies a statement to every accumulator x0 ... x11, as separate variables that stay in registers */
+#define CHAIN_PAIRS(op) op(x0, x1) op(x2, x3) op(x4, x5) op(x6, x7) op(x8, x9) op(x10, x11)
+#define DECLARE(a, b) a = add * 1, b = add * 2,
+#define ADD_MUL(a, b) a += add; b *= mul;
+#define FMA2(a, b) a = a * mul + add; b = b * mul + add;
+#define HIDE(a, b) OPAQUE(a); OPAQUE(b);
+#define SUM(a, b) + a + b
+
+/* FLOP per iteration: CHAINS / 2 adds and CHAINS / 2 multiplies */
+static __attribute__((noinline)) double scalar_kernel(long n) {
+	double add = 1e-9, mul = 1. - 1e-9;
+	OPAQUE(add);
+	OPAQUE(mul);
+	double CHAIN_PAIRS(DECLARE) sum = 0;
+	for (long i = 0; i < n; i++) {
+		CHAIN_PAIRS(ADD_MUL)
+		CHAIN_PAIRS(HIDE)
+	}
+	return sum CHAIN_PAIRS(SUM);
+}
+
+/* FLOP per iteration: LANES * CHAINS */
+static __attribute__((noinline)) double simd_kernel(long n) {
+	vector add, mul;
+	for (int l = 0; l < LANES; l++) {
+		add[l] = 1e-9;
+		mul[l] = 1. - 1e-9;
+	}
+	OPAQUE(add);
+	OPAQUE(mul);
+	vector CHAIN_PAIRS(DECLARE) sum = add * 0;
+	for (long i = 0; i < n; i++) {
+		CHAIN_PAIRS(ADD_MUL)
+		CHAIN_PAIRS(HIDE)
+	}
+	return (sum CHAIN_PAIRS(SUM))[0];
+}
+
+/* FLOP per iteration: 2 * LANES * CHAINS, x * mul + add contracts to one instruction (GCC default -ffp-contract=fast) */
+static __attribute__((noinline)) double fma_kernel(long n) {
+	vector add, mul;
+	for (int l = 0; l < LANES; l++) {
+		add[l] = 1e-9;
+		mul[l] = 1. - 1e-9;
+	}
+	OPAQUE(add);
+	OPAQUE(mul);
+	vector CHAIN_PAIRS(DECLARE) sum = add * 0;
+	for (long i = 0; i < n; i++) {
+		CHAIN_PAIRS(FMA2)
+		CHAIN_PAIRS(HIDE)
+	}
+	return (sum CHAIN_PAIRS(SUM))[0];
+}
+
+static double flop_per_iteration(enum kernel k) {
+	switch (k) {
+	case SCALAR: return CHAINS;
+	case SIMD: return (double)LANES * CHAINS;
+	case FMA: return 2. * LANES * CHAINS;
+	default: return 0;
+	}
+}
+
+static void run(struct thread *t, enum kernel k, long n) {
+	switch (k) {
+	case SCALAR: t->sink += scalar_kernel(n); break;
+	case SIMD: t->sink += simd_kernel(n); break;
+	case FMA: t->sink += fma_kernel(n); break;
+	default: break;
+	}
+}
+
+static void *worker(void *arg) {
+	struct thread *t = arg;
+	int leader = t == threads;
+	if (t->pinned && pthread_setaffinity_np(pthread_self(), sizeof t->cpus, &t->cpus)) {
+		fprintf(stderr, "peak_flops: cannot pin thread %ld\n", (long)(t - threads));
+		exit(1);
+	}
+
+	for (int k = 0; k < nkernels; k++) {
+		pthread_barrier_wait(&barrier); /* all threads left the previous measurement loop */
+		if (leader) { iterations = 1024; measured = 0; best = 0; }
+		pthread_barrier_wait(&barrier);
+		while (measured < repeats) {
+			pthread_barrier_wait(&barrier);
+			double start = now();
+			run(t, kernels[k], iterations);
+			pthread_barrier_wait(&barrier);
+			if (leader) {
+				double elapsed = now() - start;
+				if (measured == 0 && elapsed < min_time) iterations *= 2; /* calibration */
+				else {
+					best = best == 0 || elapsed < best ? elapsed : best;
+					measured++;
+				}
+			}
+			pthread_barrier_wait(&barrier);
+		}
+		if (leader) {
+			double flop = (double)nthreads * flop_per_iteration(kernels[k]) * iterations;
+			printf("%s,%d,%.3f,%d\n", names[kernels[k]], nthreads, flop / best * 1e-9, kernels[k] == SCALAR ? (int)sizeof(double) : VECTOR);
+			fflush(stdout);
+		}
+	}
+	return NULL;
+}
+
+static int parse_cpus(const char *list, cpu_set_t *cpus) {
+	CPU_ZERO(cpus);
+	for (const char *p = list; *p;) {
+		char *end;
+		long first = strtol(p, &end, 10), last = first;
+		if (end == p) return -1;
+		if (*end == '-') {
+			p = end + 1;
+			last = strtol(p, &end, 10);
+			if (end == p) return -1;
+		}
+		if (*end && *end != ',') return -1;
+		for (long cpu = first; cpu <= last; cpu++) CPU_SET(cpu, cpus);
+		p = *end ? end + 1 : end;
+	}
+	return 0;
+}
+
+static void add_kernels(char *list) {
+	nkernels = 0;
+	for (char *name = strtok(list, ","); name; name = strtok(NULL, ",")) {
+		int k = 0;
+		while (k < KERNELS && strcmp(name, names[k])) k++;
+		if (k == KERNELS) {
+			fprintf(stderr, "peak_flops: unknown kernel %s\n", name);
+			exit(2);
+		}
+		kernels[nkernels++] = k;
+	}
+}
+
+int main(int argc, char **argv) {
+	char defaults[] = "scalar,simd,fma";
+	add_kernels(defaults);
+
+	int opt;
+	while ((opt = getopt(argc, argv, "k:r:m:c:")) != -1) {
+		switch (opt) {
+		case 'k': add_kernels(optarg); break;
+		case 'r': repeats = atoi(optarg); break;
+		case 'm': min_time = atof(optarg); break;
+		case 'c':
+			threads = realloc(threads, (nthreads + 1) * sizeof *threads);
+			memset(&threads[nthreads], 0, sizeof *threads);
+			threads[nthreads].pinned = 1;
+			if (parse_cpus(optarg, &threads[nthreads].cpus)) {
+				fprintf(stderr, "peak_flops: invalid CPU list %s\n", optarg);
+				return 2;
+			}
+			nthreads++;
+			break;
+		default:
+			fprintf(stderr, "usage: %s [-k KERNELS] [-r REPEATS] [-m MIN_SECONDS] [-c CPUS ...]\n", argv[0]);
+			return 2;
+		}
+	}
+	if (nthreads == 0) {
+		threads = calloc(1, sizeof *threads);
+		nthreads = 1;
+	}
+
+	pthread_barrier_init(&barrier, NULL, nthreads);
+	for (int i = 0; i < nthreads; i++) pthread_create(&threads[i].id, NULL, worker, &threads[i]);
+	for (int i = 0; i < nthreads; i++) pthread_join(threads[i].id, NULL);
+	return 0;
+}
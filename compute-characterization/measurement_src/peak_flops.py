@@ -0,0 +1,95 @@
+"""
+Peak FP64 throughput per core and per node with `peak_flops.c` (scalar, SIMD and FMA kernels).
+
+`peak_flops.c` is compiled on the fly with `$CC` (default `cc`) for the vector unit of this machine
+(`-march=native` or `-mcpu=native`). It runs with one thread on the first physical core (per core)
+and with one thread per physical core (per node), SMT siblings stay idle. Other thread counts can be added with `--threads`.
+
+Results go to `../data/peak/peak_<host>.csv` (`Kernel,Threads,GFLOP/s,Vector (B)`),
+see `visualisation/analyse_roofline.py`.
+
+Usage: `python peak_flops.py [--host NAME] [--threads 1 2 4 ...]`
+"""
+import argparse
+import io
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+import pandas as pd
+
+SYSFS = Path("/sys/devices/system/cpu")
+SOURCE = Path(__file__).resolve().parent / "peak_flops.c"
+KERNELS = ["scalar", "simd", "fma"]
+COLUMNS = ["Kernel", "Threads", "GFLOP/s", "Vector (B)"]
+
+def cpu_list(text: str) -> list[int]:
+	"""`0-3,8` -> [0, 1, 2, 3, 8]"""
+	cpus = []
+	for part in filter(None, text.strip().split(",")):
+		first, _, last = part.partition("-")
+		cpus += range(int(first), int(last or first) + 1)
+	return cpus
+
+def physical_cores(cpus: list[int] = None) -> list[int]:
+	"""First available CPU of every physical core"""
+	cpus = sorted(cpus or os.sched_getaffinity(0))
+	cores = {}
+	for cpu in cpus:
+		siblings = [cpu]
+		for name in ("core_cpus_list", "thread_siblings_list"):
+			path = SYSFS / f"cpu{cpu}" / "topology" / name
+			if path.is_file():
+				siblings = cpu_list(path.read_text())
+				break
+		cores.setdefault(min(c for c in siblings if c in cpus), cpu)
+	return sorted(cores.values())
+
+def compile_peak_flops(directory: Path) -> Path:
+	binary = directory / "peak_flops"
+	cc = os.environ.get("CC", "cc")
+	for flags in (["-march=native"], ["-mcpu=native"], []):
+		result = subprocess.run([cc, "-O3", *flags, "-pthread", str(SOURCE), "-o", str(binary)], capture_output=True, text=True)
+		if result.returncode == 0:
+			return binary
+	raise RuntimeError(f"cannot compile {SOURCE.name}:\n{result.stderr}")
+
+def run(binary: Path, cpus: list[int], kernels: list[str] = KERNELS, repeats: int = 5, min_time: float = .1) -> pd.DataFrame:
+	"""GFLOP/s of all threads by kernel, one thread pinned to each of `cpus`"""
+	command = [str(binary), "-k", ",".join(kernels), "-r", str(repeats), "-m", str(min_time)]
+	for cpu in cpus:
+		command += ["-c", str(cpu)]
+	output = subprocess.run(command, check=True, capture_output=True, text=True).stdout
+	return pd.read_csv(io.StringIO(output), names=COLUMNS)
+
+
+def main():
+	parser = argparse.ArgumentParser(description="Peak FP64 throughput per core and per node")
+	parser.add_argument("--host", default=socket.gethostname().split(".")[0].replace("_", "-"), help="host name of the output file")
+	parser.add_argument("--out", type=Path, default=None, help="output CSV (default: ../data/peak/peak_<host>.csv)")
+	parser.add_argument("--threads", type=int, nargs="+", default=None, help="thread counts (default: 1 and all cores)")
+	parser.add_argument("--kernels", nargs="+", choices=KERNELS, default=KERNELS)
+	parser.add_argument("--repeats", type=int, default=5)
+	parser.add_argument("--min-time", type=float, default=.1, help="minimum duration of one repetition [s]")
+	args = parser.parse_args()
+
+	cores = physical_cores()
+	out = args.out or Path(__file__).resolve().parent.parent / "data" / "peak" / f"peak_{args.host}.csv"
+	out.parent.mkdir(parents=True, exist_ok=True)
+	print(f"{len(cores)} physical cores", file=sys.stderr)
+
+	results = []
+	with tempfile.TemporaryDirectory() as directory:
+		binary = compile_peak_flops(Path(directory))
+		for threads in sorted(set(args.threads or [1, len(cores)])):
+			if threads > len(cores):
+				continue
+			print(f"{threads} threads", file=sys.stderr)
+			results.append(run(binary, cores[:threads], args.kernels, args.repeats, args.min_time))
+	pd.concat(results).to_csv(out, index=False)
+	print(f"written to {out}", file=sys.stderr)
+
+if __name__ == "__main__": main()
@@ -0,0 +1,175 @@
+"""
+Roofline model per host from peak compute and per-cache-level bandwidth measurements.
+
+- compute ceilings: `measurement_src/peak_flops.py` (`data/peak/peak_<host>.csv`), scalar, SIMD and FMA peak
+- memory ceilings: `memory-characterization/measurement_src/membw.py` (`data/bandwidth/membw_<host>.csv`),
+  the bandwidth of every cache level and main memory (levels and representative sizes from `analyse_bandwidth.py`)
+- application kernels (optional): `data/roofline/kernels_<host>.csv` with
+  `Kernel,Scope,Arithmetic Intensity (FLOP/B),GFLOP/s`, e.g. from hardware counters or hand-counted FLOP and bytes
+
+One roofline per host and scope: `core` (one thread) and `node` (one thread per physical core,
+bandwidth of the best placement at the largest thread count of the sweep). Attainable performance at an arithmetic
+intensity I is min(peak, bandwidth × I), the ridge point peak / bandwidth separates memory- from compute-bound kernels.
+Hosts need both a peak and a bandwidth measurement.
+
+Usage: `python analyse_roofline.py [--kernel triad]`
+"""
+import argparse
+import sys
+from dataclasses import dataclass, field
+from functools import partial
+from pathlib import Path
+from typing import Callable
+
+import numpy as np
+import pandas as pd
+import matplotlib
+import matplotlib.ticker
+import matplotlib.pyplot as plt
+
+sys.path.append(str(Path(__file__).resolve().parents[2] / "common"))
+sys.path.append(str(Path(__file__).resolve().parents[2] / "memory-characterization" / "visualisation"))
+import measurement_cache
+import analyse_bandwidth
+
+matplotlib.rc('font', **{
+	'family' : 'sans',
+	'size'   : 22})
+
+basepath = Path(__file__).parent
+basepath_data = basepath.parent / "data"
+
+SCOPES = ["core", "node"]
+PEAKS = {"fma": "FMA", "simd": "SIMD", "scalar": "Scalar"}
+INTENSITY = "Arithmetic Intensity (FLOP/B)"
+
+@dataclass
+class Roofline:
+	host: str
+	scope: str
+	peaks: dict[str, float]      # GFLOP/s by kernel (scalar, simd, fma)
+	bandwidths: dict[str, float] # GB/s by cache level label, main memory last
+	kernels: pd.DataFrame = field(default_factory=pd.DataFrame) # Kernel, Arithmetic Intensity (FLOP/B), GFLOP/s
+
+	@property
+	def peak(self) -> float:
+		return max(self.peaks.values())
+
+	def attainable(self, intensity: np.ndarray, level: str) -> np.ndarray:
+		return np.minimum(self.peak, self.bandwidths[level] * np.asarray(intensity))
+
+	def ridges(self) -> dict[str, float]:
+		"""Arithmetic intensity [FLOP/B] above which a kernel working in a level is compute-bound"""
+		return {level: self.peak / bandwidth for level, bandwidth in self.bandwidths.items()}
+
+	def bound(self) -> pd.DataFrame:
+		"""Application kernels with their bound by main memory (or the largest level) and the fraction of the roof"""
+		if self.kernels.empty:
+			return self.kernels
+		level = list(self.bandwidths)[-1]
+		df = self.kernels.copy()
+		df["Bound"] = np.where(df[INTENSITY] < self.ridges()[level], "memory", "compute")
+		df["Of Roof"] = df["GFLOP/s"] / self.attainable(df[INTENSITY], level)
+		return df
+
+
+def load_peaks(path: Path = basepath_data / "peak") -> dict[str, pd.DataFrame]:
+	"""Peak measurements by host"""
+	peaks = {}
+	for f in sorted(path.glob("peak_*.csv")):
+		host = f.stem.split("_")[-1]
+		peaks[host] = measurement_cache.load(f, pd.read_csv, parser="peak_flops", version=1,
+			campaign="compute-characterization", host_set=host, benchmark="peak_flops")
+	return peaks
+
+def level_bandwidths(sweep: analyse_bandwidth.Sweep, scope: str, kernel: str = "triad") -> dict[str, float]:
+	"""Bandwidth [GB/s] per cache level and main memory, best placement"""
+	sizes = analyse_bandwidth.level_sizes(sweep.df["Region"].unique(), analyse_bandwidth.detect_levels(sweep))
+	df = sweep.df[sweep.df["Kernel"] == kernel]
+	df = df[df["Threads"] == (1 if scope == "core" else df["Threads"].max())]
+	best = df.groupby("Region")[analyse_bandwidth.BANDWIDTH].max()
+	return {level: float(best[size]) for level, size in sizes.items() if size in best.index}
+
+def load_rooflines(kernel: str = "triad") -> dict[str, Roofline]:
+	sweeps = {sweep.host: sweep for sweep in analyse_bandwidth.load_sweeps().values()}
+	rooflines = {}
+	for host, peaks in load_peaks().items():
+		if host not in sweeps:
+			print(f"no bandwidth sweep for {host}, skipping its roofline", file=sys.stderr)
+			continue
+		kernels_file = basepath_data / "roofline" / f"kernels_{host}.csv"
+		kernels = pd.read_csv(kernels_file) if kernels_file.is_file() else pd.DataFrame()
+		for scope in SCOPES:
+			threads = 1 if scope == "core" else peaks["Threads"].max()
+			selected = peaks[peaks["Threads"] == threads]
+			scoped = kernels[kernels["Scope"] == scope] if not kernels.empty else kernels
+			rooflines[f"{scope}_{host}"] = Roofline(host=host, scope=scope,
+				peaks=dict(zip(selected["Kernel"], selected["GFLOP/s"])),
+				bandwidths=level_bandwidths(sweeps[host], scope, kernel), kernels=scoped)
+	return rooflines
+
+
+def plot_roofline(roofline: Roofline, save: bool = False):
+	"""Compute ceilings as horizontal lines, one slope per cache level, application kernels as points"""
+	fig, ax = plt.subplots(figsize=(12, 8))
+	ridges = roofline.ridges()
+	intensity = np.logspace(np.log2(min(ridges.values())) - 4, np.log2(max(ridges.values())) + 4, 200, base=2)
+
+	colors = plt.get_cmap("viridis")(np.linspace(0, .9, len(roofline.bandwidths)))
+	for color, (level, bandwidth) in zip(colors, roofline.bandwidths.items()):
+		ax.plot(intensity, roofline.attainable(intensity, level), color=color, label=f"{level}: {bandwidth:.0f} GB/s")
+	for kernel, label in PEAKS.items():
+		if kernel in roofline.peaks:
+			ax.axhline(roofline.peaks[kernel], color="grey", linestyle="--", linewidth=1)
+			ax.annotate(f"{label}: {roofline.peaks[kernel]:.0f} GFLOP/s", (intensity[-1], roofline.peaks[kernel]),
+			            ha="right", va="bottom", size=16, color="grey")
+
+	for _, row in roofline.kernels.iterrows():
+		ax.plot(row[INTENSITY], row["GFLOP/s"], marker="o", color="red", linestyle="none")
+		ax.annotate(row["Kernel"], (row[INTENSITY], row["GFLOP/s"]), xytext=(6, -6), textcoords="offset points",
+		            va="top", size=16, color="red")
+
+	ax.set_xscale("log", base=2)
+	ax.set_yscale("log", base=10)
+	ax.xaxis.set_major_formatter(matplotlib.ticker.StrMethodFormatter(r"{x:g}"))
+	ax.tick_params(axis="both", labelsize=18)
+	ax.set_xlabel("Arithmetic Intensity [FLOP/B]")
+	ax.set_ylabel("Attainable FP64 [GFLOP/s]")
+	ax.set_title(f"{roofline.host}, per {roofline.scope}")
+	ax.grid("x")
+	ax.grid("y")
+	ax.grid("y", which="minor", alpha=.25)
+	ax.legend(loc="lower right", fontsize=14)
+
+	fig.tight_layout()
+	if save: plt.savefig(basepath / "figures" / f"roofline_{roofline.scope}_{roofline.host}.pdf")
+	else:    plt.show()
+	plt.close(fig)
+
+
+def roofline_figures(rooflines: dict[str, Roofline], save: bool = True) -> dict[str, Callable[[], None]]:
+	return {f"roofline_{name}": partial(plot_roofline, roofline, save=save)
+	        for name, roofline in rooflines.items() if roofline.peaks and roofline.bandwidths}
+
+def figures(save: bool = True) -> dict[str, Callable[[], None]]:
+	"""Figures of this script by output name, see `common/render.py`"""
+	if not (basepath / "figures").is_dir():
+		(basepath / "figures").mkdir(parents=True)
+	return roofline_figures(load_rooflines(), save=save)
+
+def main():
+	parser = argparse.ArgumentParser(description="Roofline per host and scope, figures go to `figures/`")
+	parser.add_argument("--kernel", default="triad", help="bandwidth kernel of the memory ceilings")
+	args = parser.parse_args()
+
+	rooflines = load_rooflines(args.kernel)
+	with pd.option_context("display.width", 200, "display.precision", 2):
+		for name, roofline in rooflines.items():
+			print(f"== {name}: peak {roofline.peaks} GFLOP/s")
+			print(pd.DataFrame({"GB/s": roofline.bandwidths, "ridge [FLOP/B]": roofline.ridges()}))
+			if not roofline.kernels.empty:
+				print(roofline.bound().to_string(index=False))
+	for render in roofline_figures(rooflines).values():
+		render()
+
+if __name__ == "__main__": main()
@@ -0,0 +1,220 @@
+"""
+Core topology discovery from core-to-core latency matrices.
+
+The symmetric latency matrix is stored as a packed upper triangle and clustered with
+average-linkage (UPGMA) hierarchical clustering on that triangle, so no dense n × n matrix is
+allocated. Large relative gaps between successive merge latencies separate the topology levels
+(SMT siblings, core clusters/CCX, NUMA/socket).
+
+SMT siblings with a slower pair latency than the others (e.g. the first cluster of a machine
+running the measurement threads there) miss the gap of the SMT level. Cores left single at
+that level are paired if they are mutual nearest neighbours below `smt_threshold_ns` within
+the same group of the next level.
+
+Usage: `python topology.py ../data/<measurement>.csv [--out topology.json]`
+"""
+import argparse
+import json
+from dataclasses import dataclass, field, asdict
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+
+@dataclass
+class PackedSymmetric:
+	"""Symmetric matrix without diagonal, stored as its row-major packed upper triangle"""
+	n: int
+	values: np.ndarray # n*(n-1)/2
+
+	@staticmethod
+	def from_dense(matrix, dtype=np.float32) -> "PackedSymmetric":
+		matrix = np.asarray(matrix, dtype=np.float64)
+		rows, cols = np.triu_indices(len(matrix), k=1)
+		upper, lower = matrix[rows, cols], matrix[cols, rows]
+		# measurements only fill one triangle, or both with slightly different values
+		values = np.where(np.isnan(upper), lower, np.where(np.isnan(lower), upper, (upper + lower) / 2))
+		return PackedSymmetric(n=len(matrix), values=values.astype(dtype))
+
+	def index(self, i, j):
+		i, j = np.minimum(i, j), np.maximum(i, j)
+		return i * self.n - i * (i + 1) // 2 + (j - i - 1)
+
+	def __getitem__(self, ij) -> float:
+		i, j = ij
+		return np.nan if i == j else self.values[self.index(i, j)]
+
+	def to_dense(self, diagonal: float = np.nan) -> np.ndarray:
+		dense = np.full((self.n, self.n), diagonal, dtype=np.float64)
+		rows, cols = np.triu_indices(self.n, k=1)
+		dense[rows, cols] = self.values
+		dense[cols, rows] = self.values
+		return dense
+
+
+@dataclass
+class Level:
+	name: str
+	threshold_ns: float # groups are formed by merges below this latency
+	groups: list[list[int]]
+
+@dataclass
+class Topology:
+	num_cores: int
+	levels: list[Level] = field(default_factory=list) # finest first
+	order: list[int] = field(default_factory=list)    # core IDs, topologically related cores next to each other
+
+	def level(self, name: str) -> Level:
+		return next(filter(lambda l: l.name == name, self.levels), None)
+
+	def to_dict(self) -> dict:
+		return asdict(self)
+
+	def save(self, path: Path):
+		with open(path, "w") as outfile:
+			json.dump(self.to_dict(), outfile, indent=1)
+
+	@staticmethod
+	def load(path: Path) -> "Topology":
+		with open(path, "r") as infile:
+			d = json.load(infile)
+		return Topology(num_cores=d["num_cores"], order=d["order"],
+		                levels=[Level(**level) for level in d["levels"]])
+
+
+def average_linkage(packed: PackedSymmetric) -> np.ndarray:
+	"""
+	UPGMA clustering, returns the merges as rows of (cluster a, cluster b, latency, size),
+	with original cores as clusters 0..n-1 and the i-th merge creating cluster n+i.
+	Works on a copy of the packed triangle, merged clusters update their row in place.
+	"""
+	n = packed.n
+	d = packed.values.astype(np.float64)
+	d[np.isnan(d)] = np.nanmax(packed.values) # unmeasured pairs
+	size = np.ones(n)
+	cluster = np.arange(n)
+	others = np.arange(n)
+	merges = np.zeros((n - 1, 4))
+	for step in range(n - 1):
+		k = int(np.argmin(d))
+		# row of the k-th entry of the packed triangle: the largest i with index(i, i+1) <= k
+		i = n - 2 - int(np.floor(np.sqrt(4 * n * (n - 1) - 8 * k - 7) / 2 - .5))
+		j = k - int(packed.index(i, i + 1)) + i + 1
+		merges[step] = cluster[i], cluster[j], d[k], size[i] + size[j]
+		m = others[(others != i) & (others != j)]
+		row_i, row_j = packed.index(i, m), packed.index(j, m)
+		d[row_i] = (size[i] * d[row_i] + size[j] * d[row_j]) / (size[i] + size[j])
+		d[row_j] = np.inf
+		d[k] = np.inf
+		others = others[others != j]
+		size[i] += size[j]
+		cluster[i] = n + step
+	return merges
+
+def cut(merges: np.ndarray, threshold: float) -> list[list[int]]:
+	"""Groups of cores formed by all merges below `threshold`, ordered by their lowest core ID"""
+	n = len(merges) + 1
+	members = {c: [c] for c in range(n)}
+	for step, (a, b, latency, _) in enumerate(merges):
+		if latency < threshold:
+			members[n + step] = members.pop(int(a)) + members.pop(int(b))
+	return sorted((sorted(group) for group in members.values()), key=lambda g: g[0])
+
+def pair_singles(packed: PackedSymmetric, groups: list[list[int]], parents: list[list[int]] | None,
+				 threshold_ns: float) -> list[list[int]]:
+	"""Pair the single cores of `groups` that are mutual nearest neighbours below `threshold_ns` in the same parent group"""
+	singles = np.array([g[0] for g in groups if len(g) == 1])
+	if len(singles) < 2:
+		return groups
+	parent = {core: p for p, group in enumerate(parents or [list(range(packed.n))]) for core in group}
+	latency = np.full((len(singles), len(singles)), np.inf)
+	for a, b in zip(*np.triu_indices(len(singles), k=1)):
+		if parent[singles[a]] == parent[singles[b]] and np.isfinite(value := packed[singles[a], singles[b]]):
+			latency[a, b] = latency[b, a] = value
+	nearest = np.argmin(latency, axis=1)
+	paired = [[int(singles[a]), int(singles[b])] for a, b in enumerate(nearest)
+	          if a < b and nearest[b] == a and latency[a, b] < threshold_ns]
+	done = {core for pair in paired for core in pair}
+	return sorted([g for g in groups if len(g) > 1 or g[0] not in done] + paired, key=lambda g: g[0])
+
+def discover(matrix, gap_ratio: float = 1.25, smt_threshold_ns: float = 20) -> Topology:
+	"""
+	Infer the topology levels of a (dense or packed) core-to-core latency matrix.
+	A level boundary is placed wherever the next merge latency is at least `gap_ratio` times the previous one.
+	Pairs merged below `smt_threshold_ns` are considered SMT siblings.
+	"""
+	packed = matrix if isinstance(matrix, PackedSymmetric) else PackedSymmetric.from_dense(matrix)
+	merges = average_linkage(packed)
+	latencies = merges[:, 2]
+
+	gaps = np.flatnonzero(latencies[1:] >= gap_ratio * latencies[:-1])
+	partitions = []
+	for g in gaps:
+		threshold = float(np.sqrt(latencies[g] * latencies[g + 1]))
+		groups = cut(merges, threshold)
+		if 1 < len(groups) < packed.n and (not partitions or len(groups) < len(partitions[-1][1])):
+			partitions.append((threshold, groups))
+
+	levels = []
+	for threshold, groups in partitions:
+		# mostly pairs (siblings of noisy cores may only join at the next level),
+		# all merges below the threshold form the pairs, the last of them is the slowest pair
+		sizes = np.array([len(g) for g in groups])
+		smt = not levels and sizes.max() == 2 and (sizes == 2).mean() >= .5 \
+		      and latencies[packed.n - len(groups) - 1] < smt_threshold_ns
+		clusters = len([level for level in levels if level.name != "smt"])
+		name = "smt" if smt else "cluster" if clusters == 0 else f"cluster{clusters + 1}"
+		levels.append(Level(name=name, threshold_ns=threshold, groups=groups))
+	if levels and levels[0].name == "smt":
+		levels[0].groups = pair_singles(packed, levels[0].groups, levels[1].groups if len(levels) > 1 else None,
+		                                smt_threshold_ns)
+	non_smt = [level for level in levels if level.name != "smt"]
+	if len(non_smt) > 1:
+		non_smt[-1].name = "numa"
+
+	# sort cores by (coarsest group, ..., finest group, core), each group identified by its lowest core
+	group_of = [{core: g[0] for g in level.groups for core in g} for level in reversed(levels)]
+	order = sorted(range(packed.n), key=lambda core: (*[m[core] for m in group_of], core))
+	return Topology(num_cores=packed.n, levels=levels, order=order)
+
+
+def reorder(df: pd.DataFrame, topology: Topology) -> pd.DataFrame:
+	"""Heatmap in topology order, labels are positions"""
+	order = np.asarray(topology.order)
+	return pd.DataFrame(np.asarray(df)[np.ix_(order, order)])
+
+def tick_spacing(topology: Topology, max_ticks: int = 32) -> int:
+	"""Tick spacing: the finest group size, doubled until at most `max_ticks` ticks remain"""
+	step = max(map(len, topology.levels[0].groups)) if topology.levels else 1
+	while topology.num_cores / step > max_ticks:
+		step *= 2
+	return step
+
+def zoom_window(topology: Topology) -> tuple[int, int]:
+	"""Positions of the first group of the second-finest level, or of four finest groups"""
+	if len(topology.levels) > 1:
+		return 0, len(topology.levels[1].groups[0]) - 1
+	size = max(map(len, topology.levels[0].groups)) if topology.levels else 2
+	return 0, min(4 * size, topology.num_cores) - 1
+
+
+def main():
+	parser = argparse.ArgumentParser(description="Discover the core topology from a core-to-core latency CSV")
+	parser.add_argument("csv", type=Path)
+	parser.add_argument("--gap-ratio", type=float, default=1.25)
+	parser.add_argument("--smt-threshold", type=float, default=20, help="[ns]")
+	parser.add_argument("--out", type=Path, default=None, help="write the topology as JSON")
+	args = parser.parse_args()
+
+	df = pd.read_csv(args.csv, header=None)
+	topology = discover(df.combine_first(df.T), gap_ratio=args.gap_ratio, smt_threshold_ns=args.smt_threshold)
+	for level in topology.levels:
+		sizes = sorted({len(g) for g in level.groups})
+		print(f"{level.name:10s} < {level.threshold_ns:7.1f} ns: {len(level.groups):4d} groups of {sizes} cores")
+	if args.out:
+		topology.save(args.out)
+	else:
+		print(json.dumps(topology.to_dict()))
+
+if __name__ == "__main__": main()
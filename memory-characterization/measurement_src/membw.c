@@ -0,0 +1,281 @@
+/*
+ * STREAM-like memory bandwidth kernels (read, write, copy, triad) and a pointer-chasing latency kernel
+ * over a sweep of working-set sizes.
+ *
+ * Every thread is pinned to its own CPU set and allocates and first-touches its own arrays, so the
+ * pages are local to the NUMA node the thread runs on. The working set of a thread (all arrays of a
+ * kernel) is the given size. All threads run the kernel concurrently between two barriers, the
+ * bandwidth is the number of bytes read and written by all threads (STREAM counting, no write-allocate
+ * traffic) over the wall time of the fastest repetition. The number of passes over the arrays per
+ * repetition doubles until a repetition takes at least the minimum time.
+ * The latency kernel follows a random cyclic chain through all cache lines of the buffer, its result
+ * is the mean time per load of one thread. With -n, all buffers are bound to that NUMA node (mbind).
+ *
+ * Build: cc -O3 -pthread membw.c -o membw (plus -march=native or -mcpu=native where supported)
+ * Usage: membw [-k KERNELS] [-s SIZES] [-r REPEATS] [-m MIN_SECONDS] [-n NODE] [-c CPUS ...]
+ *   KERNELS: comma-separated, default read,write,copy,triad, or latency
+ *   SIZES:   comma-separated working-set sizes per thread [kB], default 4,8,...,65536
+ *   CPUS:    CPU list of one thread, e.g. 0 or 0-3,8; one -c per thread, default one unpinned thread
+ * Output: one line `kernel,size_kb,value` per kernel and size, the bandwidth [GB/s] or the latency [ns]
+ */
+#define _GNU_SOURCE
+#include <pthread.h>
+#include <sched.h>
+#include <stdio.h>
+#include <stdlib.h>
+#include <stdint.h>
+#include <string.h>
+#include <sys/mman.h>
+#include <sys/syscall.h>
+#include <time.h>
+#include <unistd.h>
+
+#define LINE 64 /* bytes per link of the latency chain */
+#define MPOL_BIND 2
+#define MPOL_MF_STRICT 1
+
+enum kernel { READ, WRITE, COPY, TRIAD, LATENCY, KERNELS };
+static const char *names[KERNELS] = {"read", "write", "copy", "triad", "latency"};
+static const int arrays[KERNELS] = {1, 1, 2, 3, 1}; /* arrays of the working set, each read or written once per pass */
+
+struct thread {
+	pthread_t id;
+	int pinned;
+	cpu_set_t cpus;
+	double sink; /* keeps the read and latency kernels alive */
+};
+
+static struct thread *threads;
+static int nthreads;
+static int kernels[KERNELS], nkernels;
+static long *sizes;
+static int nsizes;
+static int repeats = 5;
+static double min_time = .01;
+static int node = -1;
+static pthread_barrier_t barrier;
+
+/* written by thread 0 between barriers */
+static long passes;
+static int measured;
+static double best;
+
+static double now(void) {
+	struct timespec t;
+	clock_gettime(CLOCK_MONOTONIC, &t);
+	return t.tv_sec + t.tv_nsec * 1e-9;
+}
+
+static __attribute__((noinline)) double read_pass(const double *restrict a, size_t n) {
+	double s[32] = {0}; /* independent sums, enough to hide the add latency of vector units */
+	size_t i;
+	for (i = 0; i + 32 <= n; i += 32)
+		for (int j = 0; j < 32; j++) s[j] += a[i + j];
+	for (; i < n; i++) s[0] += a[i];
+	for (int j = 1; j < 32; j++) s[0] += s[j];
+	return s[0];
+}
+
+static __attribute__((noinline)) void write_pass(double *restrict a, size_t n, double value) {
+	for (size_t i = 0; i < n; i++) a[i] = value;
+}
+
+static __attribute__((noinline)) void copy_pass(double *restrict a, const double *restrict b, size_t n) {
+	for (size_t i = 0; i < n; i++) a[i] = b[i];
+}
+
+static __attribute__((noinline)) void triad_pass(double *restrict a, const double *restrict b, const double *restrict c, size_t n) {
+	for (size_t i = 0; i < n; i++) a[i] = b[i] + 3. * c[i];
+}
+
+static __attribute__((noinline)) void *chase(void **p, size_t n) {
+	for (size_t i = 0; i < n; i++) p = (void **)*p;
+	return p;
+}
+
+/* random cyclic permutation of the cache lines (Sattolo), defeats the hardware prefetchers */
+static void link_lines(char *buffer, size_t lines, uint64_t seed) {
+	size_t *order = malloc(lines * sizeof *order);
+	if (!order) {
+		fprintf(stderr, "membw: cannot allocate the latency chain\n");
+		exit(1);
+	}
+	for (size_t i = 0; i < lines; i++) order[i] = i;
+	for (size_t i = lines - 1; i > 0; i--) {
+		seed ^= seed << 13; seed ^= seed >> 7; seed ^= seed << 17;
+		size_t j = seed % i, swap = order[i];
+		order[i] = order[j];
+		order[j] = swap;
+	}
+	for (size_t i = 0; i < lines; i++)
+		*(void **)(buffer + order[i] * LINE) = buffer + order[(i + 1) % lines] * LINE;
+	free(order);
+}
+
+static double *allocate(size_t bytes) {
+	double *buffer = mmap(NULL, bytes, PROT_READ | PROT_WRITE, MAP_PRIVATE | MAP_ANONYMOUS, -1, 0);
+	if (buffer == MAP_FAILED) return NULL;
+	if (node >= 0) {
+		unsigned long mask[16] = {0};
+		mask[node / (8 * sizeof *mask)] = 1UL << node % (8 * sizeof *mask);
+		if (syscall(SYS_mbind, buffer, bytes, MPOL_BIND, mask, 8 * sizeof mask, MPOL_MF_STRICT)) {
+			perror("membw: mbind");
+			exit(1);
+		}
+	}
+	return buffer;
+}
+
+static void run(struct thread *t, enum kernel k, double *buffer, size_t n, long count) {
+	double *a = buffer, *b = buffer + n, *c = buffer + 2 * n;
+	for (long p = 0; p < count; p++) {
+		switch (k) {
+		case READ: t->sink += read_pass(a, n); break;
+		case WRITE: write_pass(a, n, (double)p); break;
+		case COPY: copy_pass(a, b, n); break;
+		case TRIAD: triad_pass(a, b, c, n); break;
+		case LATENCY: t->sink += (uintptr_t)chase((void **)buffer, n) & 1; break;
+		default: break;
+		}
+	}
+}
+
+static void *worker(void *arg) {
+	struct thread *t = arg;
+	int leader = t == threads;
+	if (t->pinned && pthread_setaffinity_np(pthread_self(), sizeof t->cpus, &t->cpus)) {
+		fprintf(stderr, "membw: cannot pin thread %ld\n", (long)(t - threads));
+		exit(1);
+	}
+
+	for (int s = 0; s < nsizes; s++) {
+		size_t bytes = (size_t)sizes[s] * 1024;
+		double *buffer = allocate(bytes);
+		if (!buffer) {
+			fprintf(stderr, "membw: cannot allocate %ld kB\n", sizes[s]);
+			exit(1);
+		}
+
+		for (int k = 0; k < nkernels; k++) {
+			size_t n = bytes / sizeof(double) / arrays[kernels[k]];
+			if (kernels[k] == LATENCY) link_lines((char *)buffer, n = bytes / LINE, 0x9e3779b97f4a7c15ULL + (t - threads));
+			else for (size_t i = 0; i < bytes / sizeof(double); i++) buffer[i] = 1.; /* the first pass touches the pages */
+			pthread_barrier_wait(&barrier); /* all threads left the previous measurement loop */
+			if (leader) { passes = 1; measured = 0; best = 0; }
+			pthread_barrier_wait(&barrier);
+			while (measured < repeats) {
+				pthread_barrier_wait(&barrier);
+				double start = now();
+				run(t, kernels[k], buffer, n, passes);
+				pthread_barrier_wait(&barrier);
+				if (leader) {
+					double elapsed = now() - start;
+					if (measured == 0 && elapsed < min_time) passes *= 2; /* calibration */
+					else {
+						best = best == 0 || elapsed < best ? elapsed : best;
+						measured++;
+					}
+				}
+				pthread_barrier_wait(&barrier);
+			}
+			if (leader) {
+				double moved = (double)nthreads * arrays[kernels[k]] * n * sizeof(double) * passes;
+				double value = kernels[k] == LATENCY ? best / passes / n * 1e9 : moved / best * 1e-9;
+				printf("%s,%ld,%.3f\n", names[kernels[k]], sizes[s], value);
+				fflush(stdout);
+			}
+		}
+		munmap(buffer, bytes);
+	}
+	return NULL;
+}
+
+static int parse_cpus(const char *list, cpu_set_t *cpus) {
+	CPU_ZERO(cpus);
+	for (const char *p = list; *p;) {
+		char *end;
+		long first = strtol(p, &end, 10), last = first;
+		if (end == p) return -1;
+		if (*end == '-') {
+			p = end + 1;
+			last = strtol(p, &end, 10);
+			if (end == p) return -1;
+		}
+		if (*end && *end != ',') return -1;
+		for (long cpu = first; cpu <= last; cpu++) CPU_SET(cpu, cpus);
+		p = *end ? end + 1 : end;
+	}
+	return 0;
+}
+
+static void add_sizes(const char *list) {
+	nsizes = 0;
+	for (const char *p = list; *p;) {
+		char *end;
+		sizes = realloc(sizes, (nsizes + 1) * sizeof *sizes);
+		sizes[nsizes++] = strtol(p, &end, 10);
+		if (end == p || (*end && *end != ',') || sizes[nsizes - 1] <= 0) {
+			fprintf(stderr, "membw: invalid sizes %s\n", list);
+			exit(2);
+		}
+		p = *end ? end + 1 : end;
+	}
+}
+
+static void add_kernels(char *list) {
+	nkernels = 0;
+	for (char *name = strtok(list, ","); name; name = strtok(NULL, ",")) {
+		int k = 0;
+		while (k < KERNELS && strcmp(name, names[k])) k++;
+		if (k == KERNELS) {
+			fprintf(stderr, "membw: unknown kernel %s\n", name);
+			exit(2);
+		}
+		kernels[nkernels++] = k;
+	}
+}
+
+int main(int argc, char **argv) {
+	char defaults[] = "read,write,copy,triad";
+	add_kernels(defaults);
+	add_sizes("4,8,16,32,64,128,256,512,1024,2048,4096,8192,16384,32768,65536");
+
+	int opt;
+	while ((opt = getopt(argc, argv, "k:s:r:m:n:c:")) != -1) {
+		switch (opt) {
+		case 'k': add_kernels(optarg); break;
+		case 's': add_sizes(optarg); break;
+		case 'r': repeats = atoi(optarg); break;
+		case 'm': min_time = atof(optarg); break;
+		case 'n':
+			node = atoi(optarg);
+			if (node < 0 || node >= 1023) {
+				fprintf(stderr, "membw: invalid node %s\n", optarg);
+				return 2;
+			}
+			break;
+		case 'c':
+			threads = realloc(threads, (nthreads + 1) * sizeof *threads);
+			memset(&threads[nthreads], 0, sizeof *threads);
+			threads[nthreads].pinned = 1;
+			if (parse_cpus(optarg, &threads[nthreads].cpus)) {
+				fprintf(stderr, "membw: invalid CPU list %s\n", optarg);
+				return 2;
+			}
+			nthreads++;
+			break;
+		default:
+			fprintf(stderr, "usage: %s [-k KERNELS] [-s SIZES] [-r REPEATS] [-m MIN_SECONDS] [-n NODE] [-c CPUS ...]\n", argv[0]);
+			return 2;
+		}
+	}
+	if (nthreads == 0) {
+		threads = calloc(1, sizeof *threads);
+		nthreads = 1;
+	}
+
+	pthread_barrier_init(&barrier, NULL, nthreads);
+	for (int i = 0; i < nthreads; i++) pthread_create(&threads[i].id, NULL, worker, &threads[i]);
+	for (int i = 0; i < nthreads; i++) pthread_join(threads[i].id, NULL);
+	return 0;
+}
@@ -0,0 +1,169 @@
+"""
+Memory bandwidth sweep over working-set sizes, thread counts and thread placements with `membw.c`.
+
+The CPU topology comes from `/sys/devices/system`, so the sweep runs on any Linux machine:
+- `core`: thread i pinned to the first CPU of physical core i, cores in NUMA node and cluster order
+  (fills one cluster and node after the other)
+- `cluster`: thread i pinned to all CPUs of cluster i mod #clusters (spreads over the clusters)
+- `numa`: thread i pinned to all CPUs of NUMA node i mod #nodes (spreads over the nodes)
+Machines without cluster or NUMA information have one cluster per core or one node.
+
+Thread counts are the powers of two up to the number of cores plus the number of cores.
+Sizes are the working set per thread [kB], powers of two from 4 kB to 4 × the largest cache,
+limited so that all threads together use at most `--memory` of the available memory.
+`membw.c` is compiled on the fly with `$CC` (default `cc`).
+
+Results go to `../data/bandwidth/membw_<host>.csv`, one row per placement, thread count, kernel and size,
+with the size as `Region` [kB] like the MemoryLatency CSVs.
+
+Usage: `python membw.py [--host NAME] [--placements core cluster numa] [--threads 1 2 4 ...] [--max-size-kb N]`
+"""
+import argparse
+import io
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+from dataclasses import dataclass
+from pathlib import Path
+
+import pandas as pd
+
+SYSFS = Path("/sys/devices/system")
+SOURCE = Path(__file__).resolve().parent / "membw.c"
+KERNELS = ["read", "write", "copy", "triad"]
+PLACEMENTS = ["core", "cluster", "numa"]
+COLUMNS = ["Placement", "Threads", "Kernel", "Region", "Bandwidth (GB/s)"]
+
+@dataclass
+class Topology:
+	cores: list[list[int]]    # CPUs (SMT siblings) per physical core, in node and cluster order
+	clusters: list[list[int]]
+	nodes: list[list[int]]    # CPUs per NUMA node with CPUs
+	node_ids: list[int]       # of `nodes`, empty without NUMA information
+	memory_nodes: list[int]   # NUMA nodes with memory, including nodes without CPUs
+
+	def domains(self, placement: str) -> list[list[int]]:
+		return {"core": [core[:1] for core in self.cores], "cluster": self.clusters, "numa": self.nodes}[placement]
+
+
+def cpu_list(text: str) -> list[int]:
+	"""`0-3,8` -> [0, 1, 2, 3, 8]"""
+	cpus = []
+	for part in filter(None, text.strip().split(",")):
+		first, _, last = part.partition("-")
+		cpus += range(int(first), int(last or first) + 1)
+	return cpus
+
+def _groups(cpus: list[int], siblings) -> list[list[int]]:
+	"""Distinct groups of the available `cpus`, `siblings(cpu)` lists the CPUs of a cpu's group"""
+	groups = {}
+	for cpu in cpus:
+		group = tuple(c for c in siblings(cpu) if c in cpus) or (cpu,)
+		groups.setdefault(group, list(group))
+	return list(groups.values())
+
+def topology(cpus: list[int] = None) -> Topology:
+	cpus = sorted(cpus or os.sched_getaffinity(0))
+
+	def siblings(*names: str):
+		def read(cpu: int) -> list[int]:
+			for name in names:
+				path = SYSFS / "cpu" / f"cpu{cpu}" / "topology" / name
+				if path.is_file():
+					return cpu_list(path.read_text())
+			return [cpu]
+		return read
+
+	nodes = {int(node.name[4:]): [c for c in cpu_list((node / "cpulist").read_text()) if c in cpus]
+	         for node in SYSFS.glob("node/node[0-9]*")}
+	node_ids = sorted(i for i, node in nodes.items() if node)
+	has_memory = SYSFS / "node" / "has_memory"
+	memory_nodes = cpu_list(has_memory.read_text()) if has_memory.is_file() else sorted(nodes)
+	nodes = [nodes[i] for i in node_ids] or [cpus]
+	node_of = {cpu: i for i, node in enumerate(nodes) for cpu in node}
+	cluster_of = {cpu: i for i, cluster in enumerate(_groups(cpus, siblings("cluster_cpus_list"))) for cpu in cluster}
+
+	ordered = sorted(cpus, key=lambda cpu: (node_of.get(cpu, 0), cluster_of[cpu], cpu))
+	cores = _groups(ordered, siblings("core_cpus_list", "thread_siblings_list"))
+	clusters = _groups(ordered, siblings("cluster_cpus_list", "core_cpus_list", "thread_siblings_list"))
+	return Topology(cores=cores, clusters=clusters, nodes=nodes, node_ids=node_ids, memory_nodes=memory_nodes)
+
+def largest_cache_kb() -> int:
+	sizes = [int(f.read_text().strip().rstrip("K")) for f in SYSFS.glob("cpu/cpu0/cache/index*/size")
+	         if f.read_text().strip().endswith("K")]
+	return max(sizes, default=32768)
+
+def available_memory_kb() -> int:
+	meminfo = dict(line.split(":", 1) for line in Path("/proc/meminfo").read_text().splitlines())
+	return int(meminfo.get("MemAvailable", meminfo["MemFree"]).split()[0])
+
+def thread_counts(cores: int) -> list[int]:
+	counts = [2 ** i for i in range(cores.bit_length()) if 2 ** i <= cores]
+	return counts + ([cores] if counts[-1] != cores else [])
+
+def compile_membw(directory: Path) -> Path:
+	binary = directory / "membw"
+	cc = os.environ.get("CC", "cc")
+	for flags in (["-march=native"], ["-mcpu=native"], []):
+		result = subprocess.run([cc, "-O3", *flags, "-pthread", str(SOURCE), "-o", str(binary)], capture_output=True, text=True)
+		if result.returncode == 0:
+			return binary
+	raise RuntimeError(f"cannot compile {SOURCE.name}:\n{result.stderr}")
+
+def run(binary: Path, cpus: list[list[int]], sizes_kb: list[int], kernels: list[str] = KERNELS,
+		repeats: int = 5, min_time: float = .01, node: int = None) -> pd.DataFrame:
+	"""
+	`Value`: bandwidth [GB/s] (`latency` kernel: latency [ns]) by kernel and size for one thread per CPU set in `cpus`,
+	with all buffers on NUMA node `node` if given
+	"""
+	command = [str(binary), "-k", ",".join(kernels), "-s", ",".join(map(str, sizes_kb)),
+	           "-r", str(repeats), "-m", str(min_time)]
+	if node is not None:
+		command += ["-n", str(node)]
+	for thread in cpus:
+		command += ["-c", ",".join(map(str, thread))]
+	output = subprocess.run(command, check=True, capture_output=True, text=True).stdout
+	return pd.read_csv(io.StringIO(output), names=["Kernel", "Region", "Value"])
+
+
+def main():
+	parser = argparse.ArgumentParser(description="Memory bandwidth sweep over sizes, thread counts and placements")
+	parser.add_argument("--host", default=socket.gethostname().split(".")[0].replace("_", "-"), help="host name of the output file")
+	parser.add_argument("--out", type=Path, default=None, help="output CSV (default: ../data/bandwidth/membw_<host>.csv)")
+	parser.add_argument("--placements", nargs="+", choices=PLACEMENTS, default=PLACEMENTS)
+	parser.add_argument("--threads", type=int, nargs="+", default=None, help="thread counts (default: powers of two and all cores)")
+	parser.add_argument("--kernels", nargs="+", choices=KERNELS, default=KERNELS)
+	parser.add_argument("--min-size-kb", type=int, default=4)
+	parser.add_argument("--max-size-kb", type=int, default=None, help="largest working set per thread (default: 4 × the largest cache)")
+	parser.add_argument("--memory", type=float, default=.5, help="fraction of the available memory all threads may use")
+	parser.add_argument("--repeats", type=int, default=5)
+	parser.add_argument("--min-time", type=float, default=.01, help="minimum duration of one repetition [s]")
+	args = parser.parse_args()
+
+	topo = topology()
+	out = args.out or Path(__file__).resolve().parent.parent / "data" / "bandwidth" / f"membw_{args.host}.csv"
+	out.parent.mkdir(parents=True, exist_ok=True)
+	max_size = args.max_size_kb or 4 * largest_cache_kb()
+	sizes = [2 ** i for i in range(max_size.bit_length()) if args.min_size_kb <= 2 ** i <= max_size]
+	budget = args.memory * available_memory_kb()
+	print(f"{len(topo.cores)} cores, {len(topo.clusters)} clusters, {len(topo.nodes)} NUMA nodes", file=sys.stderr)
+
+	results = []
+	with tempfile.TemporaryDirectory() as directory:
+		binary = compile_membw(Path(directory))
+		for placement in args.placements:
+			for threads in args.threads or thread_counts(len(topo.cores)):
+				if threads > len(topo.cores):
+					continue
+				domains = topo.domains(placement)
+				cpus = [domains[i % len(domains)] for i in range(threads)]
+				fitting = [size for size in sizes if size * threads <= budget]
+				print(f"{placement}: {threads} threads", file=sys.stderr)
+				df = run(binary, cpus, fitting, args.kernels, args.repeats, args.min_time)
+				results.append(df.rename(columns={"Value": "Bandwidth (GB/s)"}).assign(Placement=placement, Threads=threads)[COLUMNS])
+				pd.concat(results).to_csv(out, index=False) # keep partial results
+	print(f"written to {out}", file=sys.stderr)
+
+if __name__ == "__main__": main()
@@ -0,0 +1,88 @@
+"""
+CPU domain × memory domain latency and bandwidth matrix with `membw.c`.
+
+For every NUMA node with CPUs (CPU domain) and every NUMA node with memory (memory domain, including
+nodes without CPUs), the `latency` kernel runs on the first core of the CPU domain with its buffer bound
+to the memory domain (random pointer chase over all cache lines, ns per load). The `read` kernel runs with
+one thread per core of the CPU domain, all buffers bound to the memory domain (GB/s of all threads),
+unless the buffers do not fit into `--memory` of the free memory of the node or `--no-bandwidth` is given.
+Machines without NUMA information or with a single memory node give a single-domain result without binding.
+
+Sizes are the working set per thread [kB], by default the powers of two of at least 2 × and 8 × the largest cache,
+so that the loads go to memory.
+
+Results go to `../data/numa/numa_<host>.csv` (`CPU Node,Memory Node,Region,Latency (ns),Bandwidth (GB/s)`).
+
+Usage: `python numa_matrix.py [--host NAME] [--sizes-kb N ...] [--no-bandwidth]`
+"""
+import argparse
+import socket
+import sys
+import tempfile
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+import membw
+
+COLUMNS = ["CPU Node", "Memory Node", "Region", "Latency (ns)", "Bandwidth (GB/s)"]
+
+def node_free_kb(node: int) -> int:
+	meminfo = membw.SYSFS / "node" / f"node{node}" / "meminfo"
+	if not meminfo.is_file():
+		return membw.available_memory_kb()
+	line = next(line for line in meminfo.read_text().splitlines() if "MemFree:" in line)
+	return int(line.split()[-2])
+
+def default_sizes() -> list[int]:
+	size = 1 << (2 * membw.largest_cache_kb() - 1).bit_length() # power of two ≥ 2 × the largest cache
+	return [size, 4 * size]
+
+def measure(binary: Path, topo: membw.Topology, sizes_kb: list[int], bandwidth: bool = True,
+			memory: float = .5, repeats: int = 3, min_time: float = .01) -> pd.DataFrame:
+	"""One row per CPU domain, memory domain and size"""
+	numa = len(topo.memory_nodes) > 1
+	cpu_nodes = topo.node_ids if numa else [topo.node_ids[0] if topo.node_ids else 0]
+	memory_nodes = topo.memory_nodes if numa else cpu_nodes
+	rows = []
+	for cpu_node, cpus in zip(cpu_nodes, topo.nodes):
+		cores = [core[:1] for core in topo.cores if core[0] in cpus]
+		for memory_node in memory_nodes:
+			node = memory_node if numa else None
+			print(f"CPU node {cpu_node}, memory node {memory_node}", file=sys.stderr)
+			latency = membw.run(binary, cores[:1], sizes_kb, ["latency"], repeats, min_time, node)
+			df = pd.DataFrame({"CPU Node": cpu_node, "Memory Node": memory_node, "Region": latency["Region"],
+			                   "Latency (ns)": latency["Value"], "Bandwidth (GB/s)": np.nan})
+			fitting = [size for size in sizes_kb if size * len(cores) <= memory * node_free_kb(memory_node)]
+			if bandwidth and fitting:
+				read = membw.run(binary, cores, fitting, ["read"], repeats, min_time, node)
+				df["Bandwidth (GB/s)"] = df["Region"].map(read.set_index("Region")["Value"])
+			rows.append(df[COLUMNS])
+	return pd.concat(rows, ignore_index=True)
+
+
+def main():
+	parser = argparse.ArgumentParser(description="CPU node × memory node latency and bandwidth matrix")
+	parser.add_argument("--host", default=socket.gethostname().split(".")[0].replace("_", "-"), help="host name of the output file")
+	parser.add_argument("--out", type=Path, default=None, help="output CSV (default: ../data/numa/numa_<host>.csv)")
+	parser.add_argument("--sizes-kb", type=int, nargs="+", default=None, help="working sets per thread (default: at least 2 × and 8 × the largest cache)")
+	parser.add_argument("--no-bandwidth", action="store_true", help="measure the latency only")
+	parser.add_argument("--memory", type=float, default=.5, help="fraction of the free memory of a node the bandwidth threads may use")
+	parser.add_argument("--repeats", type=int, default=3)
+	parser.add_argument("--min-time", type=float, default=.01, help="minimum duration of one repetition [s]")
+	args = parser.parse_args()
+
+	topo = membw.topology()
+	out = args.out or Path(__file__).resolve().parent.parent / "data" / "numa" / f"numa_{args.host}.csv"
+	out.parent.mkdir(parents=True, exist_ok=True)
+	print(f"CPU nodes {topo.node_ids or '-'}, memory nodes {topo.memory_nodes or '-'}", file=sys.stderr)
+
+	with tempfile.TemporaryDirectory() as directory:
+		binary = membw.compile_membw(Path(directory))
+		df = measure(binary, topo, args.sizes_kb or default_sizes(), not args.no_bandwidth,
+		             args.memory, args.repeats, args.min_time)
+	df.to_csv(out, index=False)
+	print(f"written to {out}", file=sys.stderr)
+
+if __name__ == "__main__": main()
@@ -0,0 +1,231 @@
+"""
+Memory bandwidth saturation curves from `measurement_src/membw.py` sweeps (`data/bandwidth/membw_<host>.csv`).
+
+Cache levels of a host come from its MemoryLatency measurement (`data/*_<host>.csv`, see `cache_boundaries.py`),
+or without one from the single-thread bandwidth curve of the sweep (`bandwidth_levels`). Bandwidth steps are gradual,
+so a plateau extends while the bandwidth stays within `tolerance` of its maximum and the transition sizes in between
+are skipped. Without a plateau at the largest sizes, all plateaus are cache levels and no size is labelled memory.
+Every cache level is represented by the measured size closest to the center of its plateau (log scale),
+main memory by the largest measured size. Sizes are per thread: a level shared by several threads
+holds all their working sets only while threads × size fits into it.
+
+Per placement, kernel and level, `saturation` reports the peak bandwidth, the fewest threads reaching
+`fraction` of the peak, and the parallel efficiency at the peak.
+
+Usage: `python analyse_bandwidth.py [../data/bandwidth/<sweep>.csv ...] [--kernel triad]`
+"""
+import argparse
+import sys
+import warnings
+from dataclasses import dataclass
+from functools import partial
+from pathlib import Path
+from typing import Callable
+
+import numpy as np
+import pandas as pd
+import matplotlib
+import matplotlib.ticker
+import matplotlib.pyplot as plt
+
+sys.path.append(str(Path(__file__).resolve().parents[2] / "common"))
+import measurement_cache
+import cache_boundaries
+
+matplotlib.rc('font', **{
+	'family' : 'sans',
+	'size'   : 22})
+
+basepath = Path(__file__).parent
+basepath_data = basepath.parent / "data"
+
+BANDWIDTH = "Bandwidth (GB/s)"
+PLACEMENTS = ["core", "cluster", "numa"]
+
+@dataclass
+class Sweep:
+	name: str        # `<test>_<host>`
+	df: pd.DataFrame # Placement, Threads, Kernel, Region [kB per thread], Bandwidth (GB/s)
+
+	@property
+	def host(self) -> str:
+		return self.name.split("_")[-1]
+
+	def placements(self) -> list[str]:
+		return [p for p in PLACEMENTS if p in set(self.df["Placement"])]
+
+	def select(self, placement: str, kernel: str) -> pd.DataFrame:
+		"""Threads × Region bandwidth"""
+		df = self.df[(self.df["Placement"] == placement) & (self.df["Kernel"] == kernel)]
+		return df.pivot_table(index="Threads", columns="Region", values=BANDWIDTH)
+
+
+def load_sweeps(path: Path = basepath_data / "bandwidth") -> dict[str, Sweep]:
+	sweeps = {}
+	for f in sorted(path.glob("*.csv")):
+		df = measurement_cache.load(f, pd.read_csv, parser="memory_bandwidth", version=1,
+			campaign="memory-characterization", host_set=f.stem.split("_")[-1], benchmark="_".join(f.stem.split("_")[:-1]))
+		sweeps[f.stem] = Sweep(name=f.stem, df=df)
+	return sweeps
+
+def bandwidth_levels(bandwidth: pd.Series, tolerance: float = .2, min_points: int = 2) -> cache_boundaries.Boundaries:
+	"""
+	Cache levels and main memory plateau of a bandwidth curve indexed by size, latencies are times per byte [ns/B].
+	A plateau ends at the first size more than `tolerance` below its maximum bandwidth, segments shorter
+	than `min_points` are transitions. The last plateau is main memory only if it reaches the largest size.
+	"""
+	sizes, values = bandwidth.index.to_numpy(), bandwidth.to_numpy(dtype=float)
+	segments, start = [], 0
+	for i in range(1, len(values) + 1):
+		if i == len(values) or values[i] * (1 + tolerance) < values[start:i].max():
+			segments.append((start, i))
+			start = i
+	found = [cache_boundaries.Plateau(start_kb=int(sizes[s]), end_kb=int(sizes[e-1]), latency_ns=float(np.median(1 / values[s:e])))
+	         for s, e in segments if e - s >= min_points]
+	memory = found.pop() if found and found[-1].end_kb == sizes[-1] else None
+	levels = [cache_boundaries.CacheLevel(name=f"L{i+1}", capacity_kb=plateau.end_kb, latency_ns=plateau.latency_ns, plateau=plateau)
+	          for i, plateau in enumerate(found)]
+	return cache_boundaries.Boundaries(levels=levels, memory=memory)
+
+def detect_levels(sweep: Sweep, kernel: str = "read") -> cache_boundaries.Boundaries:
+	"""Cache levels from the latency measurement of the host, else from the single-thread bandwidth"""
+	latency = sorted(f for f in basepath_data.glob(f"*_{sweep.host}.csv") if "_hugepages" not in f.stem)
+	if latency:
+		return cache_boundaries.detect(cache_boundaries.load(latency[0]))
+	single = sweep.df[(sweep.df["Threads"] == 1) & (sweep.df["Kernel"] == kernel)].groupby("Region")[BANDWIDTH].max()
+	boundaries = bandwidth_levels(single)
+	if boundaries.memory is None:
+		warnings.warn(f"{sweep.name}: no main memory plateau in the single-thread {kernel} bandwidth, "
+		              f"sizes up to {single.index.max()} kB are treated as caches")
+	return boundaries
+
+def level_sizes(sizes: np.ndarray, boundaries: cache_boundaries.Boundaries) -> dict[str, int]:
+	"""Measured size [kB] per cache level and main memory, by label like `L2 (1024 kB)`"""
+	sizes = np.sort(np.asarray(sizes))
+	result = {}
+	for level in boundaries.levels:
+		within = sizes[(sizes >= level.plateau.start_kb) & (sizes <= level.capacity_kb)]
+		if len(within):
+			center = np.log2(level.plateau.center_kb)
+			result[f"{level.name} ({level.capacity_kb} kB)"] = int(within[np.argmin(np.abs(np.log2(within) - center))])
+	if boundaries.memory and boundaries.levels and sizes[-1] > 2 * boundaries.levels[-1].capacity_kb:
+		result["memory"] = int(sizes[-1])
+	return result
+
+def saturation(sweep: Sweep, sizes: dict[str, int], fraction: float = .9) -> pd.DataFrame:
+	rows = []
+	for placement in sweep.placements():
+		for kernel in sweep.df["Kernel"].unique():
+			table = sweep.select(placement, kernel)
+			for level, size in sizes.items():
+				if size not in table.columns: continue
+				curve = table[size].dropna()
+				peak_threads = curve.idxmax()
+				single = curve.get(1, np.nan)
+				rows.append({"placement": placement, "kernel": kernel, "level": level, "size_kb": size,
+				             "single_gbs": single, "peak_gbs": curve.max(), "peak_threads": peak_threads,
+				             "saturation_threads": curve.index[curve >= fraction * curve.max()][0],
+				             "efficiency": curve.max() / (peak_threads * single)})
+	return pd.DataFrame(rows)
+
+
+def plot_threads(sweep: Sweep, sizes: dict[str, int], kernel: str = "triad", fraction: float = .9, save: bool = False):
+	"""Bandwidth vs. threads per placement, one curve per cache level, saturation points circled"""
+	placements = sweep.placements()
+	fig, axes = plt.subplots(1, len(placements), figsize=(7 * len(placements) + 2, 7), sharey=True, squeeze=False)
+	for ax, placement in zip(axes[0], placements):
+		table = sweep.select(placement, kernel)
+		for level, size in sizes.items():
+			if size not in table.columns: continue
+			curve = table[size].dropna()
+			lines = ax.plot(curve.index, curve, marker="o", label=level)
+			saturated = curve.index[curve >= fraction * curve.max()][0]
+			ax.plot(saturated, curve[saturated], marker="o", markersize=16, fillstyle="none", color=lines[0].get_color())
+
+		ax.set_xscale("log", base=2)
+		ax.set_yscale("log", base=10)
+		ax.xaxis.set_major_locator(matplotlib.ticker.FixedLocator(table.index))
+		ax.xaxis.set_major_formatter(matplotlib.ticker.StrMethodFormatter(r"{x:.0f}"))
+		ax.xaxis.set_minor_locator(matplotlib.ticker.NullLocator())
+		ax.tick_params(axis="both", labelsize=18)
+		ax.set_title(f"per {placement}")
+		ax.set_xlabel("Threads")
+		ax.grid("x")
+		ax.grid("y")
+		ax.grid("y", which="minor", alpha=.25)
+	axes[0][0].set_ylabel(f"{kernel.capitalize()} Bandwidth [GB/s]")
+	axes[0][0].legend(loc="upper left", fontsize=16)
+
+	fig.tight_layout()
+	if save:
+		plt.savefig(basepath / "figures" / f"bandwidth_threads_{sweep.name}.pdf")
+	else: plt.show()
+	plt.close(fig)
+
+def plot_sizes(sweep: Sweep, boundaries: cache_boundaries.Boundaries, kernel: str = "triad", placement: str = "core",
+			   save: bool = False):
+	"""Bandwidth vs. working-set size per thread, one curve per thread count, cache capacities as red lines"""
+	fig, ax = plt.subplots(figsize=(9, 7))
+	table = sweep.select(placement, kernel)
+	colors = plt.get_cmap("viridis")(np.linspace(0, .9, len(table.index)))
+	for color, (threads, curve) in zip(colors, table.iterrows()):
+		curve = curve.dropna()
+		ax.plot(curve.index, curve, color=color, label=str(threads))
+
+	ax.set_xscale("log", base=2)
+	ax.set_yscale("log", base=10)
+	ax.set_xticks(table.columns, labels=table.columns, rotation=45, ha='right', size=18)
+	ax.xaxis.set_minor_locator(matplotlib.ticker.NullLocator())
+	ax.tick_params(axis='y', labelsize=18)
+	ax.set_xlabel("Test Size per Thread [kB]")
+	ax.set_ylabel(f"{kernel.capitalize()} Bandwidth [GB/s]")
+
+	for level in boundaries.levels:
+		ax.axvline(x=level.capacity_kb, color="red")
+
+	ax.grid("x")
+	ax.grid("y")
+	ax.grid("y", which="minor", alpha=.25)
+	ax.legend(title="Threads", loc="lower left", fontsize=14, title_fontsize=14, ncols=2)
+	fig.tight_layout()
+	if save:
+		plt.savefig(basepath / "figures" / f"bandwidth_sizes_{sweep.name}.pdf")
+	else: plt.show()
+	plt.close(fig)
+
+
+def sweep_figures(sweeps: dict[str, Sweep], kernel: str = "triad", save: bool = True) -> dict[str, Callable[[], None]]:
+	figs = {}
+	for name, sweep in sweeps.items():
+		boundaries = detect_levels(sweep)
+		sizes = level_sizes(sweep.df["Region"].unique(), boundaries)
+		figs[f"bandwidth_threads_{name}"] = partial(plot_threads, sweep, sizes, kernel=kernel, save=save)
+		figs[f"bandwidth_sizes_{name}"] = partial(plot_sizes, sweep, boundaries, kernel=kernel, save=save)
+	return figs
+
+def figures(save: bool = True) -> dict[str, Callable[[], None]]:
+	"""Figures of this script by output name, see `common/render.py`"""
+	if not (basepath / "figures").is_dir():
+		(basepath / "figures").mkdir(parents=True)
+	return sweep_figures(load_sweeps(), save=save)
+
+def main():
+	parser = argparse.ArgumentParser(description="Bandwidth saturation of membw sweeps, figures go to `figures/`")
+	parser.add_argument("csv", type=Path, nargs="*", help="sweep CSVs (default: all in ../data/bandwidth)")
+	parser.add_argument("--kernel", default="triad", help="kernel of the figures")
+	parser.add_argument("--fraction", type=float, default=.9, help="fraction of the peak bandwidth that counts as saturated")
+	args = parser.parse_args()
+
+	sweeps = load_sweeps()
+	if args.csv:
+		sweeps = {f.stem: Sweep(name=f.stem, df=pd.read_csv(f)) for f in args.csv}
+	for sweep in sweeps.values():
+		boundaries = detect_levels(sweep)
+		print(f"== {sweep.name}")
+		print(boundaries.to_frame().to_string(index=False))
+		with pd.option_context("display.width", 200, "display.precision", 2):
+			print(saturation(sweep, level_sizes(sweep.df["Region"].unique(), boundaries), args.fraction).to_string(index=False))
+	for render in sweep_figures(sweeps, kernel=args.kernel, save=True).values():
+		render()
+
+if __name__ == "__main__": main()
@@ -1,3 +1,4 @@
+import sys
 import pandas as pd
 from pathlib import Path
 import matplotlib
@@ -5,7 +6,12 @@ import matplotlib.ticker
 import matplotlib.patheffects
 import matplotlib.pyplot as plt
 from dataclasses import dataclass
+from functools import partial
+from typing import Callable
 
+sys.path.append(str(Path(__file__).resolve().parents[2] / "common"))
+import measurement_cache
+import cache_boundaries
 
 matplotlib.rc('font', **{
 	'family' : 'sans',
@@ -35,7 +41,8 @@ class Run:
 
 def plot_one(run: Run, save: bool = False, 
 			 annotations: list[int] = None,
-			 cache_levels: list[int] = None):
+			 cache_levels: list[int] = None,
+			 tlb_reach: int = None):
 	fig,ax = plt.subplots(figsize=(9, 7))
 	
 	plt.rcParams['axes.titley'] = 1.075 
@@ -63,9 +70,12 @@ def plot_one(run: Run, save: bool = False,
 		for level in cache_levels:
 			ax.axvline(x=level, color="red")
 
+	if tlb_reach:
+		ax.axvline(x=tlb_reach, color="gray", linestyle="--")
+
 	if annotations:
 		for annotation in annotations:
-			value = run.df.loc[annotation, "Latency Hugepages (ns)"]
+			value = run.df.loc[annotation, "Latency Hugepages (ns)" if hugepages else "Latency (ns)"]
 			ax. annotate(f"{value:.2f}", xy=(annotation,value),
 				fontsize=16, xytext=(annotation, value*1.5),
 				horizontalalignment="center",
@@ -84,40 +94,75 @@ def plot_one(run: Run, save: bool = False,
 	if save:
 		plt.savefig(basepath / "figures" / f"caches_{run.name}.pdf")
 	else: plt.show()
+	plt.close(fig)
 
 
-def main():
+def load_runs() -> dict[str, Run]:
 	basepath_data = basepath.parent / "data"
-	if not (basepath / "figures").is_dir():
-		(basepath / "figures").mkdir(parents=True)
 
 	runs = {}
 	for f in list(filter(lambda x: x.suffix == ".csv", basepath_data.iterdir())):
-		df = pd.read_csv(f, sep=",").set_index("Region")
+		df = measurement_cache.load(f, lambda f: pd.read_csv(f, sep=",").set_index("Region"),
+			parser="memory_latency", version=1, campaign="memory-characterization",
+			host_set=f.stem.split("_")[-1], benchmark="_".join(f.stem.split("_")[:-1]))
 		r = Run(name=f.stem, df=df)
 		runs[r.name] = r
-	
-	save = True
-
-	# Infrastructure Node
-	plot_one(runs["asm_test_cn03"].set_arch("Ampere Altra Max")
-			 .merge(runs["asm_test_hugepages_cn03"], "Latency Hugepages (ns)"), 
-		cache_levels=[64, 1024, 32768], # data from `lscpu` and processor TRM
-		annotations=[16,256,8192],
-		save=save)
-
-	# Compute Node
-	plot_one(runs["asm_test_infra2"].set_arch("AMD EPYC")
-		 .merge(runs["asm_test_hugepages_infra2"], "Latency Hugepages (ns)"), 
-	cache_levels=[32, 512, 32768], # data from `lscpu` and processor TRM
-		annotations=[16,256,8192],
-	save=save)
-
-	## Example
-	# plot_one(runs["<YOURMEASUREMENTS>"].set_arch("<SYSTEMARCH>")
-	# 		 .merge(runs["<YOURMEASUREMENTS_HUGEPAGES>"], "Latency Hugepages (ns)"),
-	# 		 cache_levels=[<L1>, <L2>, <L3/SLC>],  # true cache size in kB - data from `lscpu` and processor TRM
-	# 		 annotations=[<ANNOTATION_POINTS...>],
-	# 		 save=save)
+	return runs
+
+def auto_figures(runs: dict[str, Run], exclude: list[str] = (), save: bool = True) -> dict[str, Callable[[], None]]:
+	"""
+	Figures of all runs not in `exclude`, merged with their `_hugepages` run if present.
+	Cache levels, TLB reach and annotations are detected from the curves, see `cache_boundaries.py`.
+	"""
+	figs = {}
+	for name, run in sorted(runs.items()):
+		if name in exclude or "_hugepages" in name:
+			continue
+		if cache_boundaries.hugepages_name(name) in runs:
+			run = run.merge(runs[cache_boundaries.hugepages_name(name)], "Latency Hugepages (ns)")
+		boundaries = cache_boundaries.detect(run.df)
+		figs[f"caches_{name}"] = partial(plot_one, run,
+			cache_levels=[level.capacity_kb for level in boundaries.levels],
+			annotations=cache_boundaries.annotation_points(run.df, boundaries),
+			tlb_reach=boundaries.tlb_reach_kb,
+			save=save)
+	return figs
+
+def figures(save: bool = True) -> dict[str, Callable[[], None]]:
+	"""Figures of this script by output name, see `common/render.py`"""
+	if not (basepath / "figures").is_dir():
+		(basepath / "figures").mkdir(parents=True)
+
+	runs = load_runs()
+
+	return {
+		# Compute Node
+		"caches_asm_test_cn03": partial(plot_one, runs["asm_test_cn03"].set_arch("Ampere Altra Max")
+				 .merge(runs["asm_test_hugepages_cn03"], "Latency Hugepages (ns)"), 
+			cache_levels=[64, 1024, 32768], # data from `lscpu` and processor TRM
+			annotations=[16,256,8192],
+			save=save),
+
+		# Infrastructure Node
+		"caches_asm_test_infra2": partial(plot_one, runs["asm_test_infra2"].set_arch("AMD EPYC")
+			 .merge(runs["asm_test_hugepages_infra2"], "Latency Hugepages (ns)"), 
+			cache_levels=[32, 512, 32768], # data from `lscpu` and processor TRM
+			annotations=[16,256,8192],
+			save=save),
+
+		# all other measurements in `data/`, with detected cache levels
+		**auto_figures(runs, exclude=["asm_test_cn03", "asm_test_infra2"], save=save),
+
+		## Example with manual cache levels
+		# "caches_<YOURMEASUREMENTS>": partial(plot_one, runs["<YOURMEASUREMENTS>"].set_arch("<SYSTEMARCH>")
+		# 		 .merge(runs["<YOURMEASUREMENTS_HUGEPAGES>"], "Latency Hugepages (ns)"),
+		# 		 cache_levels=[<L1>, <L2>, <L3/SLC>],  # true cache size in kB - data from `lscpu` and processor TRM
+		# 		 annotations=[<ANNOTATION_POINTS...>],
+		# 		 save=save),
+	}
+
+def main():
+	for render in figures(save=True).values():
+		render()
 
 if __name__ == "__main__": main()
\ No newline at end of file
@@ -0,0 +1,126 @@
+"""
+CPU domain × memory domain heatmaps from `measurement_src/numa_matrix.py` measurements (`data/numa/numa_<host>.csv`).
+
+One heatmap per host, working-set size and metric (latency, and read bandwidth if measured), in the style of
+`compute-characterization/visualisation/analyse-c2c.py`. `relative` divides every row by its local entry
+(the memory of the CPU node itself), i.e. the NUMA factor of every remote access.
+Measurements of machines without NUMA nodes are 1 × 1 matrices.
+
+Usage: `python analyse_numa.py [../data/numa/<measurement>.csv ...]`
+"""
+import argparse
+import sys
+from dataclasses import dataclass
+from functools import partial
+from pathlib import Path
+from typing import Callable
+
+import numpy as np
+import pandas as pd
+from mpl_toolkits import axes_grid1
+import matplotlib
+import matplotlib.pyplot as plt
+
+sys.path.append(str(Path(__file__).resolve().parents[2] / "common"))
+import heatmap
+import measurement_cache
+
+matplotlib.rc('font', **{
+	'family' : 'sans',
+	'size'   : 22})
+
+basepath = Path(__file__).parent
+
+METRICS = {"latency": ("Latency (ns)", "Latency [ns]"), "bandwidth": ("Bandwidth (GB/s)", "Read Bandwidth [GB/s]")}
+
+@dataclass
+class Run:
+	name: str        # `numa_<host>`
+	df: pd.DataFrame # CPU Node, Memory Node, Region [kB], Latency (ns), Bandwidth (GB/s)
+
+	@property
+	def host(self) -> str:
+		return self.name.split("_")[-1]
+
+	def sizes(self) -> list[int]:
+		return sorted(self.df["Region"].unique())
+
+	def matrix(self, size: int, metric: str = "latency") -> pd.DataFrame:
+		"""CPU node × memory node"""
+		df = self.df[self.df["Region"] == size]
+		return df.pivot_table(index="CPU Node", columns="Memory Node", values=METRICS[metric][0], dropna=False)
+
+def relative(matrix: pd.DataFrame) -> pd.DataFrame:
+	"""Every row divided by its local entry, NaN for CPU nodes without memory"""
+	local = pd.Series([matrix.loc[node, node] if node in matrix.columns else np.nan for node in matrix.index], index=matrix.index)
+	return matrix.div(local, axis=0)
+
+
+def add_colorbar(im, aspect=20, pad_fraction=0.5, **kwargs):
+	"""Add a vertical color bar to an image plot."""
+	divider = axes_grid1.make_axes_locatable(im.axes)
+	width = axes_grid1.axes_size.AxesY(im.axes, aspect=1./aspect)
+	pad = axes_grid1.axes_size.Fraction(pad_fraction, width)
+	current_ax = plt.gca()
+	cax = divider.append_axes("right", size=width, pad=pad)
+	plt.sca(current_ax)
+	return im.axes.figure.colorbar(im, cax=cax, **kwargs)
+
+def plot_one(run: Run, size: int, metric: str = "latency", save: bool = False):
+	fig, ax = plt.subplots(figsize=(10, 9))
+	im = heatmap.plot(ax, run.matrix(size, metric), ticks=True, cmap="viridis")
+
+	cbar = add_colorbar(im)
+	cbar.set_label(METRICS[metric][1])
+	ax.tick_params(axis='both', labelsize=20)
+	ax.set_xlabel("Memory Node")
+	ax.set_ylabel("CPU Node")
+	ax.xaxis.tick_top()
+	ax.xaxis.set_label_position("top")
+	ax.set_title(f"{size} kB per thread", y=-.1)
+
+	fig.tight_layout()
+	if save: plt.savefig(basepath / "figures" / f"numa_{metric}_{run.host}_{size}kB.pdf")
+	else:    plt.show()
+	plt.close(fig)
+
+
+def load_runs(files: list[Path] = None) -> dict[str, Run]:
+	files = files if files else sorted((basepath.parent / "data" / "numa").glob("*.csv"))
+	runs = {}
+	for f in files:
+		df = measurement_cache.load(f, pd.read_csv, parser="numa_matrix", version=1,
+			campaign="memory-characterization", host_set=f.stem.split("_")[-1], benchmark="numa_matrix")
+		runs[f.stem] = Run(name=f.stem, df=df)
+	return runs
+
+def run_figures(runs: dict[str, Run], save: bool = True) -> dict[str, Callable[[], None]]:
+	figs = {}
+	for run in runs.values():
+		for size in run.sizes():
+			for metric, (column, _) in METRICS.items():
+				if run.df.loc[run.df["Region"] == size, column].notna().any():
+					figs[f"numa_{metric}_{run.host}_{size}kB"] = partial(plot_one, run, size, metric, save=save)
+	return figs
+
+def figures(save: bool = True) -> dict[str, Callable[[], None]]:
+	"""Figures of this script by output name, see `common/render.py`"""
+	if not (basepath / "figures").is_dir():
+		(basepath / "figures").mkdir(parents=True)
+	return run_figures(load_runs(), save=save)
+
+def main():
+	parser = argparse.ArgumentParser(description="CPU node × memory node heatmaps, figures go to `figures/`")
+	parser.add_argument("csv", type=Path, nargs="*", help="measurements (default: all in ../data/numa)")
+	args = parser.parse_args()
+
+	runs = load_runs(args.csv)
+	with pd.option_context("display.width", 200, "display.precision", 2):
+		for run in runs.values():
+			for size in run.sizes():
+				latency = run.matrix(size)
+				print(f"== {run.name}, {size} kB: latency [ns]\n{latency}\nrelative to local\n{relative(latency)}")
+	for render in run_figures(runs).values():
+		render()
+
+if __name__ == "__main__": main()
@@ -0,0 +1,120 @@
+"""
+Cache and TLB boundary detection for `MemoryLatency` curves (Region [kB] → Latency [ns]).
+
+Latency curves are piecewise flat: one plateau per cache level plus main memory, separated by
+transitions. Plateaus are runs of sizes whose latency does not rise by more than `tolerance`
+from one size to the next. The capacity of a level is the largest size still within `tolerance`
+of its plateau latency. The hugepages curve has (almost) no TLB misses and is used for the
+capacities, the size where the default curve splits from it is the TLB reach of the default pages.
+
+Usage: `python cache_boundaries.py [../data/<measurement>.csv ...]` (default: all CSVs in `../data`)
+"""
+import argparse
+from dataclasses import dataclass, field
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+LATENCY = "Latency (ns)"
+LATENCY_HUGEPAGES = "Latency Hugepages (ns)"
+
+@dataclass
+class Plateau:
+	start_kb: int
+	end_kb: int
+	latency_ns: float # median over the plateau
+
+	@property
+	def center_kb(self) -> float:
+		return float(np.sqrt(self.start_kb * self.end_kb))
+
+@dataclass
+class CacheLevel:
+	name: str # L1, L2, ... - the last cache level may be an L3 or a system level cache (SLC)
+	capacity_kb: int
+	latency_ns: float
+	plateau: Plateau
+
+@dataclass
+class Boundaries:
+	levels: list[CacheLevel] = field(default_factory=list)
+	memory: Plateau = None
+	tlb_reach_kb: int = None # last size where default and hugepages latencies agree
+
+	def to_frame(self) -> pd.DataFrame:
+		return pd.DataFrame([{"level": l.name, "capacity_kb": l.capacity_kb, "latency_ns": l.latency_ns,
+		                      "plateau_kb": f"{l.plateau.start_kb}-{l.plateau.end_kb}"} for l in self.levels])
+
+
+def plateaus(latency: pd.Series, tolerance: float = .2, min_points: int = 3) -> list[Plateau]:
+	"""Plateaus of a latency curve indexed by size, in ascending size order"""
+	sizes, values = latency.index.to_numpy(), latency.to_numpy(dtype=float)
+	# a rise by more than `tolerance` starts a new segment, drops are measurement noise at small sizes
+	starts = np.flatnonzero(np.r_[True, values[1:] > (1 + tolerance) * values[:-1]])
+	ends = np.r_[starts[1:], len(values)]
+	return [Plateau(start_kb=int(sizes[s]), end_kb=int(sizes[e-1]), latency_ns=float(np.median(values[s:e])))
+	        for s, e in zip(starts, ends) if e - s >= min_points]
+
+def tlb_reach(default: pd.Series, hugepages: pd.Series, tolerance: float = .1) -> int:
+	"""Last size before the default curve stays more than `tolerance` above the hugepages curve"""
+	ratio = (default / hugepages).dropna()
+	split = ratio.to_numpy() > 1 + tolerance
+	# sustained split: this and the next size (if any) differ
+	sustained = np.flatnonzero(split & np.r_[split[1:], True])
+	if len(sustained) == 0 or sustained[0] == 0:
+		return None
+	return int(ratio.index[sustained[0] - 1])
+
+def detect(df: pd.DataFrame, tolerance: float = .2) -> Boundaries:
+	"""
+	Cache levels, main memory plateau and TLB reach of a run (see `analyse_caches.Run`).
+	Capacities are taken from the hugepages curve if the run has one.
+	"""
+	latency = df[LATENCY_HUGEPAGES if LATENCY_HUGEPAGES in df.columns else LATENCY].dropna()
+	found = plateaus(latency, tolerance=tolerance)
+	levels = []
+	for i, plateau in enumerate(found[:-1]):
+		within = latency[(latency.index >= plateau.start_kb) & (latency.index < found[i+1].start_kb)]
+		capacity = within.index[within <= (1 + tolerance) * plateau.latency_ns].max()
+		levels.append(CacheLevel(name=f"L{i+1}", capacity_kb=int(capacity), latency_ns=plateau.latency_ns, plateau=plateau))
+
+	reach = tlb_reach(df[LATENCY], df[LATENCY_HUGEPAGES]) if LATENCY_HUGEPAGES in df.columns else None
+	return Boundaries(levels=levels, memory=found[-1] if found else None, tlb_reach_kb=reach)
+
+def annotation_points(df: pd.DataFrame, boundaries: Boundaries) -> list[int]:
+	"""One measured size per cache level, closest to the center of its plateau on the log scale"""
+	sizes = df.index.to_numpy()
+	return [int(sizes[np.argmin(np.abs(np.log2(sizes) - np.log2(level.plateau.center_kb)))]) for level in boundaries.levels]
+
+
+def hugepages_name(name: str) -> str:
+	"""`<test>_<host>` → `<test>_hugepages_<host>`"""
+	*test, host = name.split("_")
+	return "_".join([*test, "hugepages", host])
+
+def load(path: Path) -> pd.DataFrame:
+	"""Measurement CSV joined with its `_hugepages` counterpart, if present"""
+	df = pd.read_csv(path, sep=",").set_index("Region")
+	hugepages = path.with_stem(hugepages_name(path.stem))
+	if hugepages.is_file():
+		df = df.join(pd.read_csv(hugepages, sep=",").set_index("Region").rename(columns={LATENCY: LATENCY_HUGEPAGES}))
+	return df
+
+def main():
+	parser = argparse.ArgumentParser(description="Detect cache capacities, latency plateaus and TLB reach of MemoryLatency curves")
+	parser.add_argument("csv", type=Path, nargs="*")
+	parser.add_argument("--tolerance", type=float, default=.2, help="relative latency rise that ends a plateau")
+	args = parser.parse_args()
+
+	files = args.csv or sorted((Path(__file__).parent.parent / "data").glob("*.csv"))
+	for f in filter(lambda f: "_hugepages" not in f.stem, files):
+		boundaries = detect(load(f), tolerance=args.tolerance)
+		print(f"== {f.stem}")
+		print(boundaries.to_frame().to_string(index=False))
+		if boundaries.memory:
+			print(f"memory: {boundaries.memory.latency_ns:.1f} ns from {boundaries.memory.start_kb} kB")
+		if boundaries.tlb_reach_kb:
+			print(f"TLB reach (default pages): {boundaries.tlb_reach_kb} kB")
+
+if __name__ == "__main__": main()
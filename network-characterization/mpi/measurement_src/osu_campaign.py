@@ -0,0 +1,136 @@
+"""
+Resumable OSU campaign driver, the Python counterpart of `osu_cluster.sh`.
+
+Runs the same point-to-point and collective benchmarks with the same settings and file names,
+but every benchmark is a unit of a campaign manifest (see `common/campaign.py`): outputs are
+written atomically instead of appended with `>>`, and `--resume <campaign folder>` reruns only
+missing or failed benchmarks of an interrupted campaign. Commands run on `common/remote.py`
+with one persistent ssh session per host.
+
+Usage: `python osu_campaign.py --host-set {cn,infra} --mpi-type {openmpi,openmpi-native} [--resume DIR]`
+"""
+import argparse
+import asyncio
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parents[3] / "common"))
+import campaign
+import remote
+
+# nodes/hosts differentiation is a workaround for pending DNS/hosts entries
+HOST_SETS = {
+	"cn": ["10.97.4.1", "10.97.4.2", "10.97.4.3", "10.97.4.4"],
+	"infra": ["10.97.3.1", "10.97.3.2"],
+}
+
+# (host set, MPI type) -> mpirun, OSU build, MPI arguments
+MPI = {
+	("cn", "openmpi"): (
+		"/home/f5b3a7ad-ecee-426f-b7b7-1c62c2706216/build/spack/opt/spack/linux-opensuse15-neoverse_n1/gcc-7.5.0/openmpi-4.1.6-jwwrsiru34dllaww7plas5bmt6ae2n4u/bin/mpirun",
+		"/home/pfriese/build/osu-openmpi416-ucx/c/mpi", ""),
+	("infra", "openmpi"): (
+		"/home/f5b3a7ad-ecee-426f-b7b7-1c62c2706216/build/spack_infra/opt/spack/linux-opensuse15-zen/gcc-7.5.0/openmpi-4.1.6-efmvxxr6sninfblcgndhcyobpmsnpj3w/bin/mpirun",
+		"/home/pfriese/build_infra/osu-openmpi/c/mpi", "--mca btl_tcp_if_include eth0"),
+	("infra", "openmpi-native"): (
+		"/opt/openmpi-4.1.5/bin/mpirun",
+		"/home/pfriese/build_infra/osu-openmpi-native/c/mpi", ""),
+}
+
+OSU_TESTS_PT2PT = ["pt2pt/standard/osu_bw", "pt2pt/standard/osu_bibw", "pt2pt/standard/osu_latency"]
+OSU_TESTS_COLLECTIVES = ["collective/blocking/osu_gather", "collective/blocking/osu_allgather",
+                         "collective/blocking/osu_reduce", "collective/blocking/osu_allreduce",
+                         "collective/blocking/osu_alltoall", "collective/blocking/osu_bcast"]
+OSU_GLOBAL_ARGS = "--tail-lat --message-size :4194304"
+
+
+def valid(result: remote.Result, output: str) -> bool:
+	"""Exit code 0 and an OSU output with a header and at least one result line"""
+	lines = output.splitlines()
+	return result.ok and any(line.startswith("# Size") for line in lines) and any(line[:1].isdigit() for line in lines)
+
+class OSUCampaign:
+	def __init__(self, host_set: str, mpi_type: str, outdir: Path, runner: remote.Runner,
+				 mpirun: str, osu_basepath: str, mpi_args: str, nodes: list[str],
+				 timeout: float = 3600, resume: Path = None):
+		self.host_set, self.mpi_type, self.runner, self.timeout = host_set, mpi_type, runner, timeout
+		self.mpirun, self.osu_basepath, self.mpi_args, self.nodes = mpirun, osu_basepath, mpi_args, nodes
+		self.stem = resume.name if resume else f"measurements_osu_{mpi_type}_{host_set}_{datetime.now().strftime('%y-%m-%dT%H%M')}"
+		self.outdir = resume or outdir / self.stem
+		self.manifest = campaign.Manifest(self.outdir / f"{self.stem}_manifest.json")
+
+	def command(self, test: str) -> str:
+		hosts = self.nodes[:2] if test in OSU_TESTS_PT2PT else self.nodes
+		return f"{self.mpirun} {self.mpi_args} --host {','.join(hosts)} {self.osu_basepath}/{test} {OSU_GLOBAL_ARGS}"
+
+	async def write_meta(self):
+		meta = self.outdir / f"{self.stem}_meta.md"
+		if meta.is_file(): # resumed campaign
+			with open(meta, "a") as outfile:
+				outfile.write(f"Resumed: `{datetime.now().strftime('%c')} ({int(time.time())})`\n")
+			return
+		mpi_version, osu_version = await asyncio.gather(
+			self.runner.run(self.nodes[0], f"{self.mpirun} --version", timeout=30),
+			self.runner.run(self.nodes[1], f"{self.osu_basepath}/pt2pt/standard/osu_bw --version", timeout=30))
+		meta.write_text("\n".join([
+			f"Measurement Start Timestamp: `{datetime.now().strftime('%c')} ({int(time.time())})`",
+			f"mpirun: `{self.mpirun}`",
+			f"Nodes: `{' '.join(self.nodes)}`",
+			f"Measurement tool: `{self.mpirun}` (Version: `{mpi_version.stdout.strip()}`)",
+			f"OSU version: `{osu_version.stdout.strip()}`",
+		]) + "\n")
+
+	async def run(self):
+		self.outdir.mkdir(parents=True, exist_ok=True)
+		tests = OSU_TESTS_PT2PT + OSU_TESTS_COLLECTIVES
+		self.manifest.plan([campaign.Unit(id=Path(test).name, benchmark=Path(test).name, host_set=self.host_set,
+		                                  output=f"{self.stem}_{Path(test).name}.dat") for test in tests])
+		todo = [(test, self.manifest.units[Path(test).name]) for test in tests
+		        if not self.manifest.is_done(self.manifest.units[Path(test).name])]
+		await self.write_meta()
+
+		# one benchmark at a time, they share the nodes
+		for i, (test, unit) in enumerate(todo):
+			print(f"[{i+1}/{len(todo)}] Running {test}")
+			result = await self.runner.run(self.nodes[0], self.command(test), timeout=self.timeout,
+			                               stdout=self.manifest.start(unit))
+			if result.timed_out:
+				self.manifest.fail(unit, f"timeout after {self.timeout}s")
+			elif not valid(result, self.manifest.partial(unit).read_text()):
+				self.manifest.fail(unit, f"exit code {result.returncode}: {result.stderr.strip() or 'no result rows'}")
+			else:
+				self.manifest.complete(unit)
+			if unit.status == campaign.FAILED:
+				print(f"{test}: {unit.error}")
+		print(self.manifest.summary())
+
+
+def main():
+	parser = argparse.ArgumentParser(description="Run the OSU benchmarks of osu_cluster.sh as a resumable campaign")
+	parser.add_argument("--host-set", choices=list(HOST_SETS), default="cn")
+	parser.add_argument("--mpi-type", choices=sorted({m for _, m in MPI}), default="openmpi")
+	parser.add_argument("--nodes", nargs="+", default=None, help="default: the nodes of the host set")
+	parser.add_argument("--mpirun", default=None, help="default: see `MPI`")
+	parser.add_argument("--osu-basepath", default=None, help="default: see `MPI`")
+	parser.add_argument("--timeout", type=float, default=3600, help="[s] per benchmark")
+	parser.add_argument("--local", action="store_true", help="run all commands as local subprocesses instead of via ssh")
+	parser.add_argument("--outdir", type=Path, default=Path.cwd())
+	parser.add_argument("--resume", type=Path, default=None, help="campaign folder of an interrupted run, runs its missing and failed benchmarks")
+	args = parser.parse_args()
+
+	mpirun, osu_basepath, mpi_args = MPI.get((args.host_set, args.mpi_type), ("", "", ""))
+	if not (args.mpirun or mpirun):
+		parser.error(f"no MPI configured for --host-set {args.host_set} --mpi-type {args.mpi_type}")
+
+	async def run():
+		backend = remote.LocalBackend() if args.local else remote.SSHBackend()
+		async with remote.Runner(backend) as runner:
+			await OSUCampaign(args.host_set, args.mpi_type, args.outdir, runner,
+			                  mpirun=args.mpirun or mpirun, osu_basepath=args.osu_basepath or osu_basepath,
+			                  mpi_args=mpi_args, nodes=args.nodes or HOST_SETS[args.host_set],
+			                  timeout=args.timeout, resume=args.resume).run()
+	campaign.run(run)
+
+if __name__ == "__main__": main()
@@ -1,8 +1,8 @@
+import argparse
 from pathlib import Path
 
 import pandas as pd
-import re
-import io
+import sys
 
 import matplotlib
 import matplotlib.pyplot as plt
@@ -10,6 +10,13 @@ import matplotlib.ticker
 import matplotlib.patheffects
 
 from dataclasses import dataclass
+from functools import partial
+from typing import Callable
+
+sys.path.append(str(Path(__file__).resolve().parents[3] / "common"))
+import alpha_beta
+import bootstrap
+import result_blocks
 
 pd.options.display.max_columns=99
 pd.options.display.width=1920
@@ -24,6 +31,8 @@ class Measurement:
 	name: str
 	mpi_type: str
 	df: pd.DataFrame
+	ci: bootstrap.Interval = None # of all columns, see `merge_repeats`
+	blocks: result_blocks.Blocks = None # repeat × size × metric of the raw file
 
 	def get_name(self) -> str:
 		return f"{self.name}"#" @ {self.mpi_type}"
@@ -32,16 +41,25 @@ class Measurement:
 		self.df = self.df.loc[fr:to,]
 		return self
 
-def visualise(measurement: Measurement, save: bool = False, basepath: Path = None):
+def merge_repeats(repeats: [Measurement], level: float = .95) -> Measurement:
+	"""Mean of repeated measurements of one benchmark, with the bootstrap confidence interval of every column"""
+	ci = bootstrap.interval([m.df for m in repeats], level=level)
+	return Measurement(name=repeats[0].name, mpi_type=repeats[0].mpi_type, df=ci.estimate, ci=ci)
+
+def visualise(measurement: Measurement, save: bool = False, basepath: Path = None, column: str = None):
+	"""`column` of the measurement (default: the first, e.g. the average latency), with its confidence band if known"""
 	fig, ax = plt.subplots(figsize=(12,6))
 
 
 	df = measurement.df
-	ax.plot(df[[df.columns[0]]])
+	column = column or df.columns[0]
+	lines = ax.plot(df[[column]])
+	if measurement.ci is not None:
+		bootstrap.band(ax, df.index, measurement.ci.column(column), color=lines[0].get_color())
 
 	ax.set_xscale("log")
 	ax.set_yscale("log")
-	ax.set_ylabel(df.columns[0])
+	ax.set_ylabel(column)
 	ax.set_xlabel("Message Size (byte)")
 
 	ax.xaxis.grid()
@@ -53,23 +71,28 @@ def visualise(measurement: Measurement, save: bool = False, basepath: Path = Non
 
 	if save:
 		plt.savefig(basepath / "figures" / f"{measurement.get_name()}.pdf")
-
-	plt.show()
+	else:
+		plt.show()
+	plt.close(fig)
 
 
 def visualise_multiple(measurements: [Measurement],
 					   annotations: list[(int,int,int,int)] = None, 
 					   save: bool = False, 
-					   name: str = "", basepath: Path = None):
+					   name: str = "", basepath: Path = None, column: str = None):
+	"""`column` of every measurement (default: the first), with confidence bands of merged repeats"""
 	fig, ax = plt.subplots(figsize=(9,9))
 
 	for measurement in measurements:
-		ax.plot(measurement.df[[measurement.df.columns[0]]], 
+		col = column or measurement.df.columns[0]
+		lines = ax.plot(measurement.df[[col]], 
 			    label=measurement.get_name())
+		if measurement.ci is not None:
+			bootstrap.band(ax, measurement.df.index, measurement.ci.column(col), color=lines[0].get_color())
 
 	ax.set_xscale("log", base=2)
 	ax.set_yscale("log")
-	ax.set_ylabel(measurements[0].df.columns[0])
+	ax.set_ylabel(column or measurements[0].df.columns[0])
 	ax.set_xlabel("Message Size (byte)")
 
 	ax.xaxis.grid()
@@ -84,7 +107,7 @@ def visualise_multiple(measurements: [Measurement],
 
 	if annotations:
 		for a_idx, a_pos, a_offset_x,a_offset_y in annotations:
-			value = measurements[a_idx].df.loc[a_pos, measurements[a_idx].df.columns[0]]
+			value = measurements[a_idx].df.loc[a_pos, column or measurements[a_idx].df.columns[0]]
 			ax. annotate(f"{value:.2f}", xy=(a_pos,value),
 				fontsize=16, xytext=(a_pos*a_offset_x, value*a_offset_y),
 				horizontalalignment="center",
@@ -100,35 +123,44 @@ def visualise_multiple(measurements: [Measurement],
 		plt.savefig(basepath / "figures" / f"{name}.pdf")
 	else:
 		plt.show()
+	plt.close(fig)
 
-def load_measurements(basepath_measurements: Path, ts: str) -> dict[str,Measurement]:
-	pattern_header = re.compile(r"# Size\s+(.*?)$", flags=re.MULTILINE)
-	pattern_remove_prefixes = re.compile(r"#.*?$\n", flags=re.MULTILINE)
-	pattern_to_csv = re.compile(" +", flags=re.MULTILINE)
+def from_blocks(blocks: result_blocks.Blocks, name: str, mpi_type: str) -> Measurement:
+	"""Measurement of a result file, repeated runs appended to it (several blocks) merged"""
+	repeats = [Measurement(name=name, mpi_type=mpi_type, df=df) for df in blocks.frames()]
+	measurement = repeats[0] if len(repeats) == 1 else merge_repeats(repeats)
+	measurement.blocks = blocks
+	return measurement
 
+def load_measurements(basepath_measurements: Path, ts: str) -> dict[str,Measurement]:
 	measurements = {}
 	for file in list(filter(lambda x: x.suffix == ".dat", (basepath_measurements / ts).iterdir())):
-		with open(file, "r") as infile:
-			lines = infile.read()
-			matches = pattern_header.search(lines)
-			header_raw = matches.group(1)
-			header_split = [s.strip() for s in header_raw.split(")") if len(s) > 0]
-			headers = [f"{s})" for s in header_split]
-			lines_without_header = pattern_remove_prefixes.sub("", lines)
-			data = pattern_to_csv.sub(";", lines_without_header)
-			data_buf = io.StringIO()
-			data_buf.write(data + "\n")
-			data_buf.seek(0)
-			df = pd.read_csv(data_buf, sep=";", names=headers)
-			name = "_".join(file.stem.split("_")[-2:])
-			mpi_type = ts.split("_")[2]
-			measurements[name] = Measurement(df=df, mpi_type=mpi_type, name=name)	
+		name = "_".join(file.stem.split("_")[-2:])
+		mpi_type = ts.split("_")[2]
+		blocks = result_blocks.load(file, "osu", campaign=ts, host_set=ts.split("_")[3], mpi_type=mpi_type, benchmark=name)
+		measurements[name] = from_blocks(blocks, name, mpi_type)
 	return measurements
 
-def main():
+MODEL_BENCHMARKS = {"osu_latency": "Latency (us)", "osu_bw": "Bandwidth (MB/s)"}
+
+def models(basepath_measurements: Path) -> pd.DataFrame:
+	"""Piecewise α–β models of the point-to-point curves of all campaigns in `basepath_measurements`, fitted together"""
+	times = {}
+	for ts in sorted(d.name for d in basepath_measurements.iterdir() if d.name.startswith("measurements_osu_")):
+		measurements = load_measurements(basepath_measurements, ts)
+		for benchmark, column in MODEL_BENCHMARKS.items():
+			if benchmark not in measurements: continue
+			values = measurements[benchmark].df[column]
+			times[(ts, benchmark)] = values if benchmark == "osu_latency" else alpha_beta.bandwidth_to_time(values)
+	df = alpha_beta.to_frame(alpha_beta.fit(pd.DataFrame(times)))
+	df.insert(0, "campaign", df["curve"].map(lambda c: c[0]))
+	df.insert(1, "benchmark", df.pop("curve").map(lambda c: c[1]))
+	return df
+
+def figures(save: bool = True) -> dict[str, Callable[[], None]]:
+	"""Figures of this script by output name, see `common/render.py`"""
 	basepath = Path(__file__).parent
 	basepath_measurements = basepath.parent / "data"
-	save = True
 
 	if not (basepath / "figures").is_dir():
 		(basepath / "figures").mkdir(parents=True)
@@ -136,12 +168,24 @@ def main():
 	# OMB Frontend - Compute Node
 	measurements_cn = load_measurements(basepath_measurements,
 		"measurements_osu_openmpi_cn_23-11-22T1111")
-	visualise_multiple([measurements_cn["osu_bw"],
+	# OMB Frontend - Infrastructure Node
+	measurements_infra = load_measurements(basepath_measurements,
+		"measurements_osu_openmpi_infra_23-11-27T0955")
+	# OMB Slingshot - Infrastructure Node
+	measurements_infra_sl = load_measurements(basepath_measurements,
+		"measurements_osu_openmpi-native_infra_23-11-30T1154")
+
+	## OMB Example
+	# measurements_example = load_measurements(basepath_measurements,
+	# 										  "<YOUR_MEASUREMENTS>")
+
+	return {
+		"omb_bw_cn": partial(visualise_multiple, [measurements_cn["osu_bw"],
 						measurements_cn["osu_bibw"]],
 						annotations=[(1,65536/2,1,.35),(0,4194304,1,.35)],
-						save=save, basepath=basepath, name="omb_bw_cn")
+						save=save, basepath=basepath, name="omb_bw_cn"),
 	
-	visualise_multiple([
+		"omb_latency_cn": partial(visualise_multiple, [
 		measurements_cn["osu_latency"],
 		measurements_cn["osu_gather"],
 		measurements_cn["osu_alltoall"]],
@@ -149,62 +193,65 @@ def main():
      								 (0,4,.5,1.5),
 									 (2,4,1,1.5),
 								     (0,4194304,1,.35)],
-						save=save, basepath=basepath, name="omb_latency_cn")
-
+						save=save, basepath=basepath, name="omb_latency_cn"),
 
-	# OMB Frontend - Infrastructure Node
-	measurements_infra = load_measurements(basepath_measurements,
-		"measurements_osu_openmpi_infra_23-11-27T0955")
-	visualise_multiple([measurements_infra["osu_bw"],
+		"omb_bw_infra": partial(visualise_multiple, [measurements_infra["osu_bw"],
 						measurements_infra["osu_bibw"]],
 						annotations=[(1,65536/2,1,.35),(0,4194304,1,.35)],
-						save=save, basepath=basepath, name="omb_bw_infra")
+						save=save, basepath=basepath, name="omb_bw_infra"),
 	
-	visualise_multiple([
+		"omb_latency_infra": partial(visualise_multiple, [
 		measurements_infra["osu_latency"],#.x_filter(fr=1,to=1048576),
 		measurements_infra["osu_gather"],
 		measurements_infra["osu_alltoall"]],
 						annotations=[(1,4,2,1.5),
 									 (2,4,.5,1.5),
 									 (0,4194304,1,.35)],
-						save=save, basepath=basepath, name="omb_latency_infra")
-
+						save=save, basepath=basepath, name="omb_latency_infra"),
 
-	# OMB Slingshot - Infrastructure Node
-	measurements_infra_sl = load_measurements(basepath_measurements,
-		"measurements_osu_openmpi-native_infra_23-11-30T1154")
-
-	visualise_multiple([measurements_infra_sl["osu_bw"],
+		"omb_bw_infra_slingshot": partial(visualise_multiple, [measurements_infra_sl["osu_bw"],
 						measurements_infra_sl["osu_bibw"]],
 						annotations=[(1,4194304,.25,.5),(0,4194304,1,.35)],
-						save=save, basepath=basepath, name="omb_bw_infra_slingshot")
+						save=save, basepath=basepath, name="omb_bw_infra_slingshot"),
 	
-	visualise_multiple([
+		"omb_latency_infra_slingshot": partial(visualise_multiple, [
 		measurements_infra_sl["osu_latency"],#.x_filter(fr=1,to=1048576),
 		measurements_infra_sl["osu_gather"],
 		measurements_infra_sl["osu_alltoall"]],
 						annotations=[(1,4,2,1.5),
 									 (2,4,.5,1.5),
 									 (0,4194304,1,.35)],
-						save=save, basepath=basepath, name="omb_latency_infra_slingshot")
+						save=save, basepath=basepath, name="omb_latency_infra_slingshot"),
+
+		## OMB Example
+		# "omb_bw_<SPECIFY_NAME>": partial(visualise_multiple, [measurements_example["osu_bw"],
+		# 					measurements_example["osu_bibw"]],
+		# 				   annotations=[(1, 4194304, .25, .5), (0, 4194304, 1, .35)],
+		# 				   save=save, basepath=basepath, name="omb_bw_<SPECIFY_NAME>"),
+		#
+		# "omb_latency_<SPECIFY_NAME>": partial(visualise_multiple, [
+		# 	measurements_example["osu_latency"],  # .x_filter(fr=1,to=1048576),
+		# 	measurements_example["osu_gather"],
+		# 	measurements_example["osu_alltoall"]],
+		# 	annotations=[(1, 4, 2, 1.5),
+		# 				 (2, 4, .5, 1.5),
+		# 				 (0, 4194304, 1, .35)],
+		# 	save=save, basepath=basepath, name="omb_latency_<SPECIFY_NAME>"),
+	}
 
-	## OMB Example
-	# measurements_example = load_measurements(basepath_measurements,
-	# 										  "<YOUR_MEASUREMENTS>")
-	#
-	# visualise_multiple([measurements_example["osu_bw"],
-	# 					measurements_example["osu_bibw"]],
-	# 				   annotations=[(1, 4194304, .25, .5), (0, 4194304, 1, .35)],
-	# 				   save=save, basepath=basepath, name="omb_bw_<SPECIFY_NAME>")
-	#
-	# visualise_multiple([
-	# 	measurements_example["osu_latency"],  # .x_filter(fr=1,to=1048576),
-	# 	measurements_example["osu_gather"],
-	# 	measurements_example["osu_alltoall"]],
-	# 	annotations=[(1, 4, 2, 1.5),
-	# 				 (2, 4, .5, 1.5),
-	# 				 (0, 4194304, 1, .35)],
-	# 	save=save, basepath=basepath, name="omb_latency_<SPECIFY_NAME>")
+def main():
+	parser = argparse.ArgumentParser(description="OMB figures, or α–β models of the point-to-point curves")
+	parser.add_argument("--models", action="store_true", help="fit and print the α–β models of all campaigns in data/ instead of rendering")
+	parser.add_argument("--out", type=Path, default=None, help="also write the models to this CSV")
+	args = parser.parse_args()
+
+	if args.models:
+		df = models(Path(__file__).parent.parent / "data")
+		print(df.to_string(index=False))
+		if args.out: df.to_csv(args.out, index=False)
+		return
+	for render in figures(save=True).values():
+		render()
 
 
 if __name__ == "__main__": main()
\ No newline at end of file
@@ -0,0 +1,200 @@
+"""
+Collective latency predicted from the point-to-point models, checked against the measured OSU collectives.
+
+The piecewise α–β model of `osu_latency` (see `common/alpha_beta.py`) gives the time T(m) of one
+m-byte message, including protocol switches. The cost models of the usual algorithms (Thakur,
+Rabenseifner, Gropp: "Optimization of Collective Communication Operations in MPICH", 2005) sum
+T over the communication steps for p processes (one per node), plus γ per reduced byte.
+
+For every collective and message size the algorithm whose prediction is closest to the measurement is
+taken as the one the MPI library picked. A size is flagged if that algorithm is predicted at least
+`threshold` times slower than the best algorithm, and the measurement is at least `threshold` times
+the best prediction. Flagged size ranges become Open MPI `coll_tuned` overrides.
+
+The `coll_tuned` algorithm IDs differ between Open MPI versions (e.g. bcast 7–9 and the reduce Rabenseifner
+algorithm are new in 5.0), so only the algorithms of the Open MPI version of the campaign (from its meta file,
+`--ompi-version` to override) are candidates.
+
+Usage: `python collectives.py CAMPAIGN [--nodes P] [--ompi-version X.Y] [--rules FILE]`, the campaign is a folder name in `../data`
+"""
+import argparse
+import re
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable
+
+import numpy as np
+import pandas as pd
+
+from analyse_osu import load_measurements
+import alpha_beta
+
+# processes per host set, one per node (see `HOST_SETS` in `measurement_src/osu_campaign.py`)
+NODES = {"cn": 4, "infra": 2}
+
+# Open MPI `coll_tuned` collective IDs for dynamic rules files (`COLLTYPE_T`)
+COLLTYPE = {"allgather": 0, "allreduce": 2, "alltoall": 3, "bcast": 7, "gather": 9, "reduce": 11}
+
+# Open MPI (major, minor) of campaigns without a version in their meta file, the oldest one measured
+DEFAULT_OMPI_VERSION = (4, 1)
+
+Time = Callable[[np.ndarray], np.ndarray] # message size [B] -> time of one message [μs]
+
+@dataclass
+class Algorithm:
+	name: str
+	coll_tuned: int # `coll_tuned_<collective>_algorithm`
+	cost: Callable[[Time, np.ndarray, int, float], np.ndarray] # (T, size, p, γ) -> time [μs]
+	since: tuple[int, int] = (4, 0) # first Open MPI version with this `coll_tuned` ID
+
+def _steps(p: int) -> int:
+	return int(np.ceil(np.log2(p)))
+
+def _halving(t: Time, n: np.ndarray, p: int) -> np.ndarray:
+	"""Recursive halving (or binomial scatter): messages of n/2, n/4, ..."""
+	return sum(t(n / 2 ** k) for k in range(1, _steps(p) + 1))
+
+def _doubling(t: Time, m: np.ndarray, p: int) -> np.ndarray:
+	"""Recursive doubling (or binomial gather): messages of m, 2m, 4m, ..."""
+	return sum(t(m * 2 ** k) for k in range(_steps(p)))
+
+# OSU message size: n bytes per process for bcast/reduce/allreduce, m bytes per process pair for gather/allgather/alltoall
+ALGORITHMS = {
+	"bcast": [
+		Algorithm("linear", 1, lambda t, n, p, g: (p - 1) * t(n)),
+		Algorithm("binomial", 6, lambda t, n, p, g: _steps(p) * t(n)),
+		Algorithm("scatter_allgather", 8, lambda t, n, p, g: 2 * _halving(t, n, p), since=(5, 0)),
+		Algorithm("scatter_allgather_ring", 9, lambda t, n, p, g: _halving(t, n, p) + (p - 1) * t(n / p), since=(5, 0)),
+	],
+	"reduce": [
+		Algorithm("linear", 1, lambda t, n, p, g: (p - 1) * (t(n) + g * n)),
+		Algorithm("binomial", 5, lambda t, n, p, g: _steps(p) * (t(n) + g * n)),
+		Algorithm("rabenseifner", 7, lambda t, n, p, g: 2 * _halving(t, n, p) + (p - 1) / p * g * n, since=(5, 0)),
+	],
+	"allreduce": [
+		Algorithm("recursive_doubling", 3, lambda t, n, p, g: _steps(p) * (t(n) + g * n)),
+		Algorithm("ring", 4, lambda t, n, p, g: 2 * (p - 1) * t(n / p) + (p - 1) / p * g * n),
+		Algorithm("rabenseifner", 6, lambda t, n, p, g: 2 * _halving(t, n, p) + (p - 1) / p * g * n),
+	],
+	"gather": [
+		Algorithm("linear", 1, lambda t, m, p, g: t((p - 1) * m)),
+		Algorithm("binomial", 2, lambda t, m, p, g: _doubling(t, m, p)),
+	],
+	"allgather": [
+		Algorithm("recursive_doubling", 3, lambda t, m, p, g: _doubling(t, m, p)),
+		Algorithm("ring", 4, lambda t, m, p, g: (p - 1) * t(m)),
+	],
+	"alltoall": [
+		Algorithm("linear", 1, lambda t, m, p, g: t((p - 1) * m)),
+		Algorithm("pairwise", 2, lambda t, m, p, g: (p - 1) * t(m)),
+		Algorithm("bruck", 3, lambda t, m, p, g: _steps(p) * t(m * p / 2)),
+	],
+}
+
+
+def algorithms(collective: str, version: tuple[int, int] = DEFAULT_OMPI_VERSION) -> list[Algorithm]:
+	"""Algorithms of `collective` available in Open MPI `version` (major, minor)"""
+	return [a for a in ALGORITHMS[collective] if a.since <= tuple(version)]
+
+def ompi_version(campaign: str, basepath_measurements: Path) -> tuple[int, int]:
+	"""Open MPI (major, minor) from the `mpirun --version` line of the campaign meta file, else `DEFAULT_OMPI_VERSION`"""
+	meta = basepath_measurements / campaign / f"{campaign}_meta.md"
+	match = re.search(r"\(Open MPI\) (\d+)\.(\d+)", meta.read_text()) if meta.is_file() else None
+	return (int(match[1]), int(match[2])) if match else DEFAULT_OMPI_VERSION
+
+def predict(t: Time, collective: str, sizes: np.ndarray, p: int, gamma: float = 0.,
+			version: tuple[int, int] = DEFAULT_OMPI_VERSION) -> pd.DataFrame:
+	"""size × algorithm predicted latency [μs], for the algorithms of Open MPI `version`"""
+	sizes = np.asarray(sizes, dtype=float)
+	return pd.DataFrame({a.name: a.cost(t, sizes, p, gamma) for a in algorithms(collective, version)},
+	                    index=pd.Index(sizes.astype(int), name="size"))
+
+def check(campaign: str, basepath_measurements: Path, p: int = None, gamma: float = 0.,
+		  threshold: float = 1.5, version: tuple[int, int] = None) -> pd.DataFrame:
+	"""
+	Measured vs. predicted latency per collective and size, with the likely and the best algorithm
+	of Open MPI `version` (default: the version of the campaign)
+	"""
+	measurements = load_measurements(basepath_measurements, campaign)
+	p = p or NODES[campaign.split("_")[3]]
+	version = version or ompi_version(campaign, basepath_measurements)
+	latency = measurements["osu_latency"].df["Latency (us)"]
+	t = alpha_beta.fit(pd.DataFrame({"osu_latency": latency}))["osu_latency"].time
+
+	rows = []
+	for collective in ALGORITHMS:
+		if f"osu_{collective}" not in measurements: continue
+		measured = measurements[f"osu_{collective}"].df.iloc[:, 0]
+		candidates = algorithms(collective, version)
+		predicted = predict(t, collective, measured.index.to_numpy(), p, gamma, version)
+		values = predicted.to_numpy()
+		likely = np.argmin(np.abs(np.log(measured.to_numpy()[:, None] / values)), axis=1)
+		best = np.argmin(values, axis=1)
+		rows.append(pd.DataFrame({
+			"collective": collective, "size": measured.index, "measured_us": measured.to_numpy(),
+			"likely": predicted.columns[likely], "likely_us": values[np.arange(len(values)), likely],
+			"best": predicted.columns[best], "best_us": values[np.arange(len(values)), best],
+			"best_coll_tuned": [candidates[i].coll_tuned for i in best],
+		}))
+	result = pd.concat(rows, ignore_index=True)
+	result["slowdown"] = result["measured_us"] / result["best_us"]
+	result["flagged"] = (result["likely_us"] >= threshold * result["best_us"]) & (result["slowdown"] >= threshold)
+	return result
+
+def overrides(result: pd.DataFrame) -> pd.DataFrame:
+	"""Contiguous flagged size ranges per collective with the same suggested algorithm"""
+	flagged = result["flagged"]
+	run = (flagged != flagged.shift()) | (result["collective"] != result["collective"].shift()) \
+	      | (result["best"] != result["best"].shift())
+	groups = result.assign(run=run.cumsum())[flagged].groupby("run")
+	df = groups.agg(collective=("collective", "first"), from_size=("size", "min"), to_size=("size", "max"),
+	                algorithm=("best", "first"), coll_tuned=("best_coll_tuned", "first"),
+	                slowdown=("slowdown", "max")).reset_index(drop=True)
+	df["mca"] = [f"--mca coll_tuned_use_dynamic_rules 1 --mca coll_tuned_{c}_algorithm {a}"
+	             for c, a in zip(df["collective"], df["coll_tuned"])]
+	return df
+
+def rules(ranges: pd.DataFrame, p: int) -> str:
+	"""
+	Open MPI `coll_tuned_dynamic_rules_filename` file applying the overrides for communicators of size `p`,
+	algorithm 0 (the library's own decision) outside of the flagged ranges
+	"""
+	lines = [ranges["collective"].nunique()]
+	for collective, group in ranges.groupby("collective", sort=False):
+		entries = []
+		for _, r in group.iterrows():
+			if entries and entries[-1][0] == r["from_size"]: entries.pop()
+			entries += [(r["from_size"], r["coll_tuned"]), (r["to_size"] + 1, 0)]
+		if entries[0][0] > 0: entries.insert(0, (0, 0))
+		# collective ID, number of communicator sizes, communicator size, number of message sizes,
+		# then per message size: smallest size, algorithm, fan in/out, segment size
+		lines += [COLLTYPE[collective], 1, p, len(entries)]
+		lines += [f"{size} {algorithm} 0 0" for size, algorithm in entries]
+	return "\n".join(map(str, lines)) + "\n"
+
+
+def main():
+	parser = argparse.ArgumentParser(description="Check OSU collectives against predictions from the point-to-point latency")
+	parser.add_argument("campaign", help="measurement folder in ../data")
+	parser.add_argument("--nodes", type=int, default=None, help="number of processes (default: by host set, see `NODES`)")
+	parser.add_argument("--gamma", type=float, default=0., help="reduction time per byte [μs/B]")
+	parser.add_argument("--threshold", type=float, default=1.5, help="minimum predicted and measured slowdown")
+	parser.add_argument("--ompi-version", default=None, help="Open MPI MAJOR.MINOR of the algorithm IDs (default: from the campaign meta file)")
+	parser.add_argument("--all", action="store_true", help="list all sizes, not only the overrides")
+	parser.add_argument("--out", type=Path, default=None, help="write all sizes as CSV")
+	parser.add_argument("--rules", type=Path, default=None, help="write the overrides as Open MPI dynamic rules file")
+	args = parser.parse_args()
+
+	p = args.nodes or NODES[args.campaign.split("_")[3]]
+	version = tuple(map(int, args.ompi_version.split(".")[:2])) if args.ompi_version else None
+	result = check(args.campaign, Path(__file__).parent.parent / "data", p, args.gamma, args.threshold, version)
+	ranges = overrides(result)
+	if args.out:
+		result.to_csv(args.out, index=False)
+	if args.rules:
+		args.rules.write_text(rules(ranges, p))
+	with pd.option_context("display.max_rows", None, "display.width", 250, "display.max_colwidth", 100):
+		if args.all: print(result, end="\n\n")
+		print(ranges if len(ranges) else "no overrides")
+
+if __name__ == "__main__": main()
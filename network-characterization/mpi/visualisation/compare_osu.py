@@ -0,0 +1,216 @@
+"""
+Statistical comparison of OSU campaigns, e.g. before and after an MPI/UCX/libfabric upgrade.
+
+Campaigns are matched by benchmark and message size. Every column (average and the P50/P95/P99
+tails of `--tail-lat`) is tested for a significant change against the baseline campaign:
+
+- with repeated runs (several result blocks per file, see `result_blocks.py`), the standard error of a
+  column is the standard deviation of its block values σ over √repeats, and the test is Welch's t-test
+- a single run only has its within-run noise: the per-iteration standard deviation σ is estimated from
+  the tails, assuming normal noise (P95 - P50 = 1.645σ, P99 - P50 = 2.326σ), the standard error of a mean
+  is σ/√n, the one of a p-quantile σ·√(p(1-p)/n)/φ(z_p), with n the OSU default iteration count of the
+  benchmark and size, and the test is a z-test. Run-to-run variation is not included, so these
+  standard errors are lower bounds and changes between single runs are flagged too easily.
+- two-sided tests, Benjamini-Hochberg correction over all tests of a comparison,
+  effect size as Cohen's d (difference / σ) and relative change
+- columns without a standard error (a single run without `--tail-lat`) are `untestable`
+
+All tests are vectorized over benchmarks × sizes × columns.
+
+Usage: `python compare_osu.py BASELINE CAMPAIGN [CAMPAIGN ...]`, campaigns are folder names in `../data`
+"""
+import argparse
+import math
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from analyse_osu import Measurement, load_measurements
+
+# OSU 7.x defaults: (iterations up to LARGE_MESSAGE_SIZE, iterations above),
+# bandwidth tests take one sample per window of messages
+LARGE_MESSAGE_SIZE = 8192
+ITERATIONS = {"latency": (10000, 1000), "bandwidth": (100, 20), "collective": (1000, 100)}
+BENCHMARK_KIND = {"osu_latency": "latency", "osu_bw": "bandwidth", "osu_bibw": "bandwidth"} # others: collective
+
+QUANTILES = {"p50": .5, "p95": .95, "p99": .99}
+Z = {"p95": 1.6449, "p99": 2.3263}
+
+
+def erfc(x: np.ndarray) -> np.ndarray:
+	"""Complementary error function for x ≥ 0 (Abramowitz & Stegun 7.1.26, |error| < 1.5e-7)"""
+	t = 1 / (1 + .3275911 * x)
+	poly = t * (.254829592 + t * (-.284496736 + t * (1.421413741 + t * (-1.453152027 + t * 1.061405429))))
+	return poly * np.exp(-x * x)
+
+def betainc(a: np.ndarray, b: np.ndarray, x: np.ndarray) -> np.ndarray:
+	"""Regularized incomplete beta function I_x(a, b) (continued fraction, Numerical Recipes 6.4)"""
+	a, b, x = np.broadcast_arrays(*map(np.asarray, (a, b, x)))
+	lgamma = np.frompyfunc(math.lgamma, 1, 1)
+	with np.errstate(divide="ignore", invalid="ignore"):
+		front = np.exp((lgamma(a + b) - lgamma(a) - lgamma(b)).astype(float) + a * np.log(x) + b * np.log1p(-x))
+		direct = x < (a + 1) / (a + b + 2) # converges fast, else use I_x(a, b) = 1 - I_{1-x}(b, a)
+		aa, bb, xx = np.where(direct, a, b), np.where(direct, b, a), np.where(direct, x, 1 - x)
+		c, d = np.ones_like(xx), 1 / np.maximum(1 - (aa + bb) * xx / (aa + 1), 1e-300)
+		fraction = d
+		for m in range(1, 201):
+			for numerator in (m * (bb - m) * xx / ((aa + 2*m - 1) * (aa + 2*m)),
+			                  -(aa + m) * (aa + bb + m) * xx / ((aa + 2*m) * (aa + 2*m + 1))):
+				d = 1 / np.where(np.abs(d := 1 + numerator * d) < 1e-300, 1e-300, d)
+				c = np.where(np.abs(c := 1 + numerator / c) < 1e-300, 1e-300, c)
+				fraction = fraction * c * d
+		result = front * fraction / aa
+	return np.where(x <= 0, 0., np.where(x >= 1, 1., np.where(direct, result, 1 - result)))
+
+def two_sided_p(t: np.ndarray, dof: np.ndarray) -> np.ndarray:
+	"""P(|T| ≥ |t|) of Student's t distribution with `dof` degrees of freedom, normal for infinite `dof`"""
+	t, dof = np.broadcast_arrays(np.abs(np.asarray(t, dtype=float)), np.asarray(dof, dtype=float))
+	finite = np.isfinite(dof) & (dof > 0)
+	p = erfc(t / np.sqrt(2))
+	if finite.any():
+		p[finite] = betainc(dof[finite] / 2, .5, dof[finite] / (dof[finite] + t[finite] ** 2))
+	return np.where(np.isnan(t), np.nan, p)
+
+def normal_pdf(z: float) -> float:
+	return np.exp(-z * z / 2) / np.sqrt(2 * np.pi)
+
+def benjamini_hochberg(p: np.ndarray) -> np.ndarray:
+	"""q-values (BH adjusted p-values), NaN p-values stay NaN"""
+	q = np.full_like(p, np.nan)
+	valid = np.flatnonzero(~np.isnan(p))
+	order = valid[np.argsort(p[valid])]
+	ranked = p[order] * len(order) / np.arange(1, len(order) + 1)
+	q[order] = np.minimum(1, np.minimum.accumulate(ranked[::-1])[::-1])
+	return q
+
+def iterations(benchmark: str, sizes: np.ndarray) -> np.ndarray:
+	small, large = ITERATIONS[BENCHMARK_KIND.get(benchmark, "collective")]
+	return np.where(sizes > LARGE_MESSAGE_SIZE, large, small)
+
+
+def _metric_names(columns: pd.Index) -> list[str]:
+	return ["avg", *[c.split()[0].lower() for c in columns[1:]]]
+
+def standard_error(sigma: pd.Series, n: pd.Series, metric: str) -> pd.Series:
+	"""Standard error of `metric` over n iterations with per-iteration standard deviation `sigma`"""
+	if metric == "avg":
+		return sigma / np.sqrt(n)
+	p = QUANTILES[metric]
+	z = 0 if p == .5 else Z[metric]
+	return sigma * np.sqrt(p * (1 - p) / n) / normal_pdf(z)
+
+def spread(benchmark: str, measurement: Measurement) -> pd.DataFrame:
+	"""
+	Per size and metric: the standard deviation `sd_<metric>`, standard error `se_<metric>` and degrees of freedom
+	`dof_<metric>` of the measured values, from the repeats if there are several, else from the tails (infinite `dof`)
+	"""
+	df = measurement.df.set_axis(_metric_names(measurement.df.columns), axis=1).reindex(columns=["avg", *QUANTILES])
+	result = pd.DataFrame(index=df.index)
+	if measurement.blocks is not None and measurement.blocks.repeats > 1:
+		grouped = pd.concat(measurement.blocks.frames()).groupby(level=0)
+		sd = grouped.std().set_axis(_metric_names(measurement.blocks.metrics), axis=1).reindex(index=df.index, columns=df.columns)
+		count = grouped.count().set_axis(sd.columns, axis=1).reindex(index=df.index, columns=df.columns)
+		for metric in df.columns:
+			result[f"sd_{metric}"] = sd[metric]
+			result[f"se_{metric}"] = sd[metric] / np.sqrt(count[metric])
+			result[f"dof_{metric}"] = count[metric] - 1
+		return result
+	# no `--tail-lat`: NaN, cannot be tested
+	sigma = pd.Series(np.mean([np.abs(df[p] - df["p50"]) / Z[p] for p in Z], axis=0), index=df.index)
+	n = pd.Series(iterations(benchmark, df.index.to_numpy()), index=df.index)
+	for metric in df.columns:
+		result[f"sd_{metric}"] = sigma
+		result[f"se_{metric}"] = standard_error(sigma, n, metric)
+		result[f"dof_{metric}"] = np.inf
+	return result
+
+def tidy(campaign: str, basepath_measurements: Path) -> pd.DataFrame:
+	"""
+	One row per benchmark and size with columns avg, p50, p95, p99, their spreads (see `spread`),
+	the number of repeats and whether higher is better
+	"""
+	frames = []
+	for benchmark, measurement in load_measurements(basepath_measurements, campaign).items():
+		df = measurement.df.set_axis(_metric_names(measurement.df.columns), axis=1).reindex(columns=["avg", *QUANTILES])
+		df = df.join(spread(benchmark, measurement))
+		df["repeats"] = measurement.blocks.repeats if measurement.blocks is not None else 1
+		df["higher_is_better"] = "MB/s" in measurement.df.columns[0]
+		df.index.name = "size"
+		frames.append(df.reset_index().assign(benchmark=benchmark))
+	return pd.concat(frames, ignore_index=True)
+
+def compare(baseline: pd.DataFrame, candidate: pd.DataFrame,
+			alpha: float = .05, min_change: float = .05) -> pd.DataFrame:
+	"""
+	Test every benchmark, size and metric of `candidate` against `baseline` (see `tidy`).
+	Changes are significant if their BH-adjusted q-value is below `alpha` and the relative
+	change is at least `min_change`; columns without a standard error are untestable.
+	Rows are ranked by verdict and effect size.
+	"""
+	merged = baseline.merge(candidate, on=["benchmark", "size"], suffixes=("_base", ""))
+
+	rows = []
+	for metric in ["avg", *QUANTILES]:
+		se_base, se = merged[f"se_{metric}_base"], merged[f"se_{metric}"]
+		se_diff = np.sqrt(se_base ** 2 + se ** 2)
+		# Welch-Satterthwaite, infinite (normal) if both sides have infinite degrees of freedom
+		dof = se_diff ** 4 / (se_base ** 4 / merged[f"dof_{metric}_base"] + se ** 4 / merged[f"dof_{metric}"])
+		diff = merged[metric] - merged[f"{metric}_base"]
+		sigma = np.sqrt((merged[f"sd_{metric}"] ** 2 + merged[f"sd_{metric}_base"] ** 2) / 2)
+		rows.append(pd.DataFrame({
+			"benchmark": merged["benchmark"], "size": merged["size"], "metric": metric,
+			"baseline": merged[f"{metric}_base"], "value": merged[metric],
+			"repeats_base": merged["repeats_base"], "repeats": merged["repeats"],
+			"change": diff / merged[f"{metric}_base"],
+			"t": diff / se_diff,
+			"dof": dof.where(se_diff > 0),
+			"cohens_d": diff / sigma,
+			"higher_is_better": merged["higher_is_better"]}))
+	result = pd.concat(rows, ignore_index=True)
+
+	result["p"] = two_sided_p(result["t"].to_numpy(), result["dof"].to_numpy())
+	result["q"] = benjamini_hochberg(result["p"].to_numpy())
+	significant = (result["q"] < alpha) & (result["change"].abs() >= min_change)
+	worse = (result["change"] > 0) != result["higher_is_better"]
+	result["verdict"] = np.where(result["p"].isna(), "untestable",
+		np.where(~significant, "unchanged", np.where(worse, "regression", "improvement")))
+
+	rank = result["verdict"].map({"regression": 0, "improvement": 1, "unchanged": 2, "untestable": 3})
+	return result.assign(rank=rank, effect=result["cohens_d"].abs()) \
+		.sort_values(["rank", "effect"], ascending=[True, False]) \
+		.drop(columns=["rank", "effect", "higher_is_better"]).reset_index(drop=True)
+
+def compare_campaigns(baseline: str, campaigns: list[str], basepath_measurements: Path,
+					  alpha: float = .05, min_change: float = .05) -> pd.DataFrame:
+	"""Ranked changes of each campaign against the `baseline` campaign"""
+	base = tidy(baseline, basepath_measurements)
+	results = []
+	for campaign in campaigns:
+		result = compare(base, tidy(campaign, basepath_measurements), alpha, min_change)
+		result.insert(0, "campaign", campaign)
+		results.append(result)
+	return pd.concat(results, ignore_index=True)
+
+
+def main():
+	parser = argparse.ArgumentParser(description="Rank significant changes of OSU campaigns against a baseline campaign")
+	parser.add_argument("baseline")
+	parser.add_argument("campaigns", nargs="+")
+	parser.add_argument("--alpha", type=float, default=.05, help="false discovery rate")
+	parser.add_argument("--min-change", type=float, default=.05, help="minimum relative change")
+	parser.add_argument("--all", action="store_true", help="also list unchanged and untestable results")
+	parser.add_argument("--out", type=Path, default=None, help="write all results as CSV")
+	args = parser.parse_args()
+
+	result = compare_campaigns(args.baseline, args.campaigns, Path(__file__).parent.parent / "data",
+	                           alpha=args.alpha, min_change=args.min_change)
+	if args.out:
+		result.to_csv(args.out, index=False)
+	with pd.option_context("display.max_rows", None, "display.width", 200):
+		print(result if args.all else result[~result["verdict"].isin(["unchanged", "untestable"])])
+		untestable = (result["verdict"] == "untestable").sum()
+		if untestable and not args.all:
+			print(f"{untestable} untestable results (single run without tail latencies), see --all")
+
+if __name__ == "__main__": main()
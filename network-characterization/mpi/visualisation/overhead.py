@@ -0,0 +1,175 @@
+"""
+Software overhead of MPI over Slingshot: OSU point-to-point against the raw CXI tests of the same nodes.
+
+`osu_latency` and `osu_bw` of an Open MPI campaign over the native Slingshot provider (`openmpi-native`) are
+lined up by message size with the raw CXI tests (`raw-slingshot/`, read through `cxi_cube.py`) of the
+operations below MPI: `write` (one-sided RDMA) and `send` (two-sided, matched by the NIC). Per size:
+
+- latency of every layer, the added latency of MPI over every raw operation [μs]
+- bandwidth of every layer, the bandwidth MPI loses against every raw operation [MB/s]
+- the fabric floor: the best raw operation per size (MPI may use RDMA writes for large messages and beat `send`),
+  and the waste of MPI against it: added latency / MPI latency, lost bandwidth / floor bandwidth
+
+Negative overheads are kept, they mean MPI does better than a raw test (e.g. the CXI latency tests poll
+differently than the MPI progress engine). Contiguous size ranges where the waste reaches `threshold` are the
+hotspots where MPI tuning pays off most.
+
+Usage: `python overhead.py [OSU_CAMPAIGN] [CXI_CAMPAIGN] [--threshold 0.25] [--where Hugepages=Disabled]`,
+the campaigns are folder names in `../data` and `raw-slingshot/data`
+"""
+import argparse
+import sys
+from functools import partial
+from pathlib import Path
+from typing import Callable
+
+import matplotlib.pyplot as plt
+import matplotlib.ticker
+import numpy as np
+import pandas as pd
+
+from analyse_osu import load_measurements
+
+sys.path.append(str(Path(__file__).resolve().parents[2] / "raw-slingshot" / "visualisation"))
+import cxi_cube
+
+basepath = Path(__file__).parent
+basepath_cxi = basepath.parents[1] / "raw-slingshot" / "data"
+
+OSU_CAMPAIGN = "measurements_osu_openmpi-native_infra_23-11-30T1154"
+CXI_CAMPAIGN = "measurements_23-11-30T1546"
+OPERATIONS = ["write", "send"]
+METRICS = {"lat": ("osu_latency", "Latency (us)", "Mean[us]"), "bw": ("osu_bw", "Bandwidth (MB/s)", "BW[MB/s]")}
+
+
+def raw_curves(cube: cxi_cube.ResultCube, kind: str, operations: list[str] = OPERATIONS) -> pd.DataFrame:
+	"""size × operation of one CXI configuration"""
+	metric = METRICS[kind][2]
+	curves = {}
+	for op in operations:
+		series = cube.sel(operation=op, kind=kind).metric(metric)
+		configs = series.droplevel("Size[B]").index.unique()
+		if len(configs) > 1:
+			raise ValueError(f"{len(configs)} configurations of cxi_{op}_{kind}, select one (`where`), "
+			                 f"varying: {', '.join(cxi_cube.ResultCube(series.to_frame()).dims)}")
+		curves[op] = series.droplevel([l for l in cxi_cube.LEVELS if l != "Size[B]"])
+	return pd.DataFrame(curves).rename_axis("size")
+
+def breakdown(mpi: dict[str, pd.Series], cube: cxi_cube.ResultCube, operations: list[str] = OPERATIONS) -> pd.DataFrame:
+	"""
+	One row per message size measured by MPI and CXI: latency and bandwidth of all layers, the overhead of MPI
+	over every raw operation and over the fabric floor (`floor_*`: best raw operation), and the waste
+	"""
+	lat, bw = raw_curves(cube, "lat", operations), raw_curves(cube, "bw", operations)
+	sizes = mpi["lat"].index.intersection(mpi["bw"].index).intersection(lat.index).intersection(bw.index)
+	lat, bw = lat.loc[sizes], bw.loc[sizes]
+	mpi_lat, mpi_bw = mpi["lat"].loc[sizes], mpi["bw"].loc[sizes]
+
+	df = pd.DataFrame(index=pd.Index(sizes, name="size"))
+	for op in operations:
+		df[f"lat_{op}_us"] = lat[op]
+	df["lat_mpi_us"] = mpi_lat
+	for op in operations:
+		df[f"added_{op}_us"] = mpi_lat - lat[op]
+	df["floor_lat_op"] = lat.idxmin(axis=1)
+	df["added_us"] = mpi_lat - lat.min(axis=1)
+	df["lat_waste"] = df["added_us"] / mpi_lat
+
+	for op in operations:
+		df[f"bw_{op}_mbs"] = bw[op]
+	df["bw_mpi_mbs"] = mpi_bw
+	for op in operations:
+		df[f"lost_{op}_mbs"] = bw[op] - mpi_bw
+	df["floor_bw_op"] = bw.idxmax(axis=1)
+	df["lost_mbs"] = bw.max(axis=1) - mpi_bw
+	df["bw_waste"] = df["lost_mbs"] / bw.max(axis=1)
+	return df
+
+def hotspots(df: pd.DataFrame, threshold: float = .25) -> pd.DataFrame:
+	"""Contiguous size ranges per metric where the waste of MPI against the fabric floor reaches `threshold`"""
+	rows = []
+	for kind, waste, overhead in [("latency", "lat_waste", "added_us"), ("bandwidth", "bw_waste", "lost_mbs")]:
+		flagged = df[waste] >= threshold
+		run = (flagged != flagged.shift()).cumsum()
+		for _, group in df[flagged].groupby(run[flagged]):
+			peak = group[waste].idxmax()
+			rows.append({"metric": kind, "from_size": group.index.min(), "to_size": group.index.max(),
+			             "max_waste": group[waste].max(), "at_size": peak, "overhead": group.at[peak, overhead],
+			             "unit": "us" if kind == "latency" else "MB/s"})
+	return pd.DataFrame(rows, columns=["metric", "from_size", "to_size", "max_waste", "at_size", "overhead", "unit"]
+	                    ).sort_values("max_waste", ascending=False, ignore_index=True)
+
+def load(osu_campaign: str = OSU_CAMPAIGN, cxi_campaign: str = CXI_CAMPAIGN, where: dict = None,
+		 operations: list[str] = OPERATIONS) -> pd.DataFrame:
+	measurements = load_measurements(basepath.parent / "data", osu_campaign)
+	mpi = {kind: measurements[benchmark].df[column] for kind, (benchmark, column, _) in METRICS.items()}
+	cube = cxi_cube.load([basepath_cxi / cxi_campaign]).sel(**(where or {}))
+	return breakdown(mpi, cube, operations)
+
+
+def plot_overhead(df: pd.DataFrame, threshold: float = .25, name: str = "", save: bool = False):
+	"""Latency and bandwidth of all layers (top), waste of MPI against the fabric floor (bottom), hotspots shaded"""
+	fig, axs = plt.subplots(2, 2, figsize=(18, 14), sharex=True, height_ratios=[2, 1])
+	operations = [c[len("lat_"):-len("_us")] for c in df.columns if c.startswith("lat_") and c.endswith("_us")]
+	spots = hotspots(df, threshold)
+
+	for col, (kind, unit, waste) in enumerate([("lat", "us", "lat_waste"), ("bw", "mbs", "bw_waste")]):
+		ax, ax_waste = axs[0, col], axs[1, col]
+		for op in operations:
+			label = "MPI (OSU)" if op == "mpi" else f"CXI {op}"
+			ax.plot(df.index, df[f"{kind}_{op}_{unit}"], marker=".", label=label, lw=3 if op == "mpi" else 1.5)
+		ax_waste.bar(df.index, df[waste], width=df.index * .5, color=np.where(df[waste] >= threshold, "tab:red", "tab:gray"))
+		ax_waste.axhline(threshold, color="black", ls="--", lw=1)
+		for _, spot in spots[spots["metric"] == ("latency" if kind == "lat" else "bandwidth")].iterrows():
+			for a in (ax, ax_waste):
+				a.axvspan(spot["from_size"] / 2 ** .5, spot["to_size"] * 2 ** .5, color="tab:red", alpha=.1)
+
+		ax.set_ylabel("Latency [us]" if kind == "lat" else "Bandwidth [MB/s]")
+		ax.set_yscale("log")
+		ax.legend(fontsize=16)
+		ax_waste.set_ylabel("MPI waste")
+		ax_waste.yaxis.set_major_formatter(matplotlib.ticker.PercentFormatter(1))
+		ax_waste.set_xlabel("Message Size (byte)")
+		ax_waste.set_xscale("log", base=2)
+		ax_waste.xaxis.set_major_locator(matplotlib.ticker.LogLocator(base=2, numticks=len(df.index) // 2 + 1))
+		ax_waste.xaxis.set_major_formatter(matplotlib.ticker.StrMethodFormatter(r"{x:.0f}"))
+		plt.setp(ax_waste.get_xticklabels(), rotation=45, ha="right", size=16)
+		for a in (ax, ax_waste):
+			a.grid()
+
+	fig.tight_layout()
+	if save:
+		plt.savefig(basepath / "figures" / f"{name}.pdf")
+	else:
+		plt.show()
+	plt.close(fig)
+
+def figures(save: bool = True) -> dict[str, Callable[[], None]]:
+	"""Figures of this script by output name, see `common/render.py`"""
+	if not (basepath / "figures").is_dir():
+		(basepath / "figures").mkdir(parents=True)
+	df = load()
+	return {"mpi_overhead_infra_slingshot": partial(plot_overhead, df, name="mpi_overhead_infra_slingshot", save=save)}
+
+
+def main():
+	parser = argparse.ArgumentParser(description="Latency and bandwidth MPI adds/loses over the raw CXI operations per message size")
+	parser.add_argument("osu_campaign", nargs="?", default=OSU_CAMPAIGN, help="OSU folder in ../data (Open MPI over Slingshot)")
+	parser.add_argument("cxi_campaign", nargs="?", default=CXI_CAMPAIGN, help="CXI folder in raw-slingshot/data")
+	parser.add_argument("--operations", nargs="+", default=OPERATIONS, choices=["write", "send", "read"])
+	parser.add_argument("--where", nargs="+", default=[], metavar="PARAMETER=VALUE",
+	                    help="CXI configuration of a sweep, e.g. Hugepages=Disabled")
+	parser.add_argument("--threshold", type=float, default=.25, help="waste that marks a hotspot")
+	parser.add_argument("--all", action="store_true", help="list all sizes, not only the hotspots")
+	parser.add_argument("--out", type=Path, default=None, help="write all sizes as CSV")
+	args = parser.parse_args()
+
+	df = load(args.osu_campaign, args.cxi_campaign, dict(w.split("=", 1) for w in args.where), args.operations)
+	if args.out:
+		df.to_csv(args.out)
+	spots = hotspots(df, args.threshold)
+	with pd.option_context("display.max_rows", None, "display.width", 250, "display.precision", 3):
+		if args.all: print(df, end="\n\n")
+		print(spots if len(spots) else "no hotspots")
+
+if __name__ == "__main__": main()
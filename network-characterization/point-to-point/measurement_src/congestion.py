@@ -0,0 +1,172 @@
+"""
+Congestion campaigns: many iperf3 flows at the same time, in a traffic pattern.
+
+`pair_scheduler.py` and `iperf_cluster.sh` measure every pair on an otherwise idle fabric, the best case.
+Here all flows of a pattern run at once, like the traffic of a job in which every node communicates:
+
+- `permutation`: every node sends to one other node and receives from one (random derangement, `--seed`)
+- `bisection`: the host list is split into halves, node i of each half sends to node i of the other half
+- `incast`: all nodes send to one node (`--target`, default: the first host)
+- `all-to-all`: every node sends to every other node
+
+Every flow is one iperf3 client → server run on its own server port. All servers are started first, then every client
+sleeps until a common start time (`--start-delay` after the servers are up), so the flows start together up to the
+command launch latency of the hosts. Patterns run one after another.
+
+Output: `measurements_congestion_<timestamp>/<pattern>/` with one `<stem>_<pattern>_<server>_<client>.json` per flow
+(named like the pair campaigns, the client sends to the server) and `<stem>_<pattern>_flows.csv`
+(`server;client;port;start_s;throughput_gbitsec`), where `start_s` is the start of the flow relative to the common
+start time: the shared clock of `visualisation/iperf_congestion.py`. It is taken from the start timestamp of the
+iperf3 output (`start.timestamp.timemillis`, `timesecs` for iperf3 versions without it), so the clocks of the hosts
+must be synchronised (NTP/PTP) for sub-second alignment.
+
+Usage: `python congestion.py [--patterns permutation bisection incast all-to-all] [--hosts NAME=ADDRESS ...] [--local] [--standin]`,
+e.g. `python congestion.py --local --standin --hosts a b c d --client-args "-P 2 -t 5 -O 1 -J"`
+"""
+import argparse
+import asyncio
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+
+sys.path.append(str(Path(__file__).resolve().parents[3] / "common"))
+import campaign
+import remote
+
+sys.path.append(str(Path(__file__).resolve().parents[1] / "visualisation"))
+import iperf_ingest
+
+from pair_scheduler import CLIENT_ARGS, HOSTS, STANDIN, Campaign, Host, Pair, Tool, tools
+
+PATTERNS = ["permutation", "bisection", "incast", "all-to-all"]
+
+def flows(pattern: str, n: int, target: int = 0, seed: int = 0) -> list[tuple[int, int]]:
+	"""(server, client) index pairs of `n` hosts that run concurrently in `pattern`, the client sends to the server"""
+	if pattern == "permutation":
+		rng = np.random.default_rng(seed)
+		while np.any((destination := rng.permutation(n)) == np.arange(n)): # derangement: nobody sends to itself
+			pass
+		return [(int(destination[c]), c) for c in range(n)]
+	if pattern == "bisection":
+		half = n // 2 # odd n: the last host idles
+		return [(half + i, i) for i in range(half)] + [(i, half + i) for i in range(half)]
+	if pattern == "incast":
+		return [(target, c) for c in range(n) if c != target]
+	if pattern == "all-to-all":
+		return [(s, c) for s in range(n) for c in range(n) if s != c]
+	raise ValueError(f"unknown pattern {pattern}")
+
+def flow_start(output: Path, common: float) -> float:
+	"""Start of the flow of an iperf3 JSON output [s] relative to `common` (seconds since the epoch)"""
+	timestamp = iperf_ingest.read_start(output)["timestamp"]
+	return (timestamp["timemillis"] / 1e3 if "timemillis" in timestamp else timestamp["timesecs"]) - common
+
+
+class CongestionCampaign(Campaign):
+	"""All flows of one pattern as a single round, with a common start time of the clients"""
+
+	def __init__(self, tool: Tool, hosts: list[Host], pattern: str, client_args: str, outdir: Path, stem: str,
+				 runner: remote.Runner, base_port: int = 5201, startup: float = 1, start_delay: float = 2):
+		super().__init__(tool, hosts, client_args, outdir, runner, base_port=base_port, startup=startup)
+		self.pattern, self.start_delay = pattern, start_delay
+		self.stem = stem
+		self.outdir = outdir / stem / pattern
+		self.manifest = campaign.Manifest(self.outdir / f"{stem}_{pattern}_manifest.json")
+
+	def output(self, server: Host, client: Host) -> str:
+		return f"{self.stem}_{self.pattern}_{server.name}_{client.name}{self.tool.suffix}"
+
+	async def run_round(self, pairs: list[Pair]) -> float:
+		"""Start all servers, then all clients at a common time, returns the common start [s since the epoch]"""
+		fields = [pair.fields(self.client_args) for pair in pairs]
+		timeout = self.tool.timeout + self.start_delay
+		servers = [asyncio.create_task(self.runner.run(pair.server.name, self.tool.server.format(**f),
+		                                               timeout=timeout + 2 * self.startup))
+		           for pair, f in zip(pairs, fields)]
+		try:
+			await asyncio.sleep(self.startup)
+			common = time.time() + self.start_delay
+			clients = []
+			for pair, f in zip(pairs, fields):
+				delay = common - time.time()
+				clients.append(self.runner.run(pair.client.name, f"sleep {max(0., delay):.3f}; " + self.tool.client.format(**f),
+				                               timeout=timeout, stdout=self.manifest.start(self.unit(pair))))
+			for pair, client in zip(pairs, await asyncio.gather(*clients)):
+				self.finish(pair, client)
+			await asyncio.wait(servers, timeout=5)
+		finally:
+			for server in servers:
+				server.cancel()
+			await asyncio.gather(*servers, return_exceptions=True)
+		return common
+
+	async def run(self, pairs: list[tuple[int, int]]):
+		self.outdir.mkdir(parents=True, exist_ok=True)
+		round_pairs = [Pair(server=self.hosts[s], client=self.hosts[c], port=self.base_port + i) for i, (s, c) in enumerate(pairs)]
+		self.manifest.plan([campaign.Unit(id=f"{pair.server.name}_{pair.client.name}", benchmark=f"iperf-{self.pattern}",
+		                                  host_set=self.pattern, output=self.output(pair.server, pair.client),
+		                                  pair=[pair.server.name, pair.client.name]) for pair in round_pairs])
+		await asyncio.gather(*[self.runner.session(host.name) for host in self.hosts])
+
+		print(f"{self.pattern}: {len(round_pairs)} concurrent flows")
+		common = await self.run_round(round_pairs)
+		print(f"{self.pattern}: {self.manifest.summary()}")
+
+		with open(self.outdir / f"{self.stem}_{self.pattern}_flows.csv", "w") as outfile:
+			outfile.write("server;client;port;start_s;throughput_gbitsec\n")
+			for pair in round_pairs:
+				unit = self.unit(pair)
+				if self.manifest.is_done(unit):
+					output = self.outdir / unit.output
+					received = self.tool.csv_rows(pair.server.name, pair.client.name, output.read_text())[-1]
+					outfile.write(f"{pair.server.name};{pair.client.name};{pair.port};{flow_start(output, common):.6f};"
+					              f"{received.rsplit(';', 1)[1]}\n")
+
+
+def main():
+	parser = argparse.ArgumentParser(description="Run iperf3 flows of all hosts concurrently in traffic patterns")
+	parser.add_argument("--patterns", nargs="+", choices=PATTERNS, default=PATTERNS)
+	parser.add_argument("--hosts", nargs="+", default=HOSTS, help="NAME[=ADDRESS] (default: the OpenCUBE testbed)")
+	parser.add_argument("--target", default=None, help="receiving host of `incast` (default: the first host)")
+	parser.add_argument("--seed", type=int, default=0, help="seed of the `permutation` pattern")
+	parser.add_argument("--client-args", default=CLIENT_ARGS["iperf"], help="default: the arguments of the pair campaigns")
+	parser.add_argument("--start-delay", type=float, default=2, help="[s] between launching the clients and their common start")
+	parser.add_argument("--port", type=int, default=5201, help="port of the first flow, the others count up")
+	parser.add_argument("--timeout", type=float, default=None, help="[s] per flow (default: 90)")
+	parser.add_argument("--local", action="store_true", help="run all commands as local subprocesses instead of via ssh")
+	parser.add_argument("--standin", action="store_true", help="use `standin.py` instead of iperf3")
+	parser.add_argument("--iperf3", default="/tmp/pfriese/bin/iperf3")
+	parser.add_argument("--outdir", type=Path, default=Path.cwd())
+	args = parser.parse_args()
+
+	tool = tools({"iperf3": f"{STANDIN} iperf3" if args.standin else args.iperf3, "netperf": "", "netserver": ""})["iperf"]
+	if args.timeout:
+		tool.timeout = args.timeout
+	hosts = [Host.parse(h) for h in args.hosts]
+	if args.local:
+		hosts = [Host(name=h.name, address="127.0.0.1") for h in hosts]
+	target = [h.name for h in hosts].index(args.target) if args.target else 0
+	stem = f"measurements_congestion_{datetime.now().strftime('%y-%m-%dT%H%M')}"
+
+	async def run():
+		backend = remote.LocalBackend() if args.local else remote.SSHBackend()
+		async with remote.Runner(backend) as runner:
+			(args.outdir / stem).mkdir(parents=True, exist_ok=True)
+			probe = await runner.run(hosts[0].name, tool.version, timeout=30)
+			(args.outdir / stem / f"{stem}_meta.md").write_text("\n".join([
+				f"Measurement Start Timestamp: `{datetime.now().strftime('%c')} ({int(time.time())})`",
+				f"Client Arguments: `{args.client_args}`",
+				f"Measurement tool: `{tool.version.rsplit(' ', 1)[0]}` (Version: `{probe.stdout.strip()}`)",
+				f"Hosts: `{' '.join(h.name for h in hosts)}`",
+				f"Patterns: `{' '.join(args.patterns)}` (seed {args.seed}, incast target {hosts[target].name})",
+			]) + "\n")
+			for pattern in args.patterns:
+				await CongestionCampaign(tool, hosts, pattern, args.client_args, args.outdir, stem, runner,
+				                         base_port=args.port, start_delay=args.start_delay
+				                         ).run(flows(pattern, len(hosts), target, args.seed))
+	campaign.run(run)
+
+if __name__ == "__main__": main()
@@ -8,7 +8,8 @@ NETPERF="/tmp/pfriese/bin/netperf"
 NETSERVER="/tmp/pfriese/bin/netserver"
 
 NETPERF_SERVER_ARGS=
-NETPERF_CLIENT_ARGS="-t TCP_RR -l 60 -- -o min_latency,mean_latency,max_latency,stddev_latency"
+NETPERF_FIELDS="min_latency,mean_latency,max_latency,stddev_latency,p50_latency,p90_latency,p99_latency,transaction_rate"
+NETPERF_CLIENT_ARGS="-t TCP_RR -l 60 -v 2 -- -o $NETPERF_FIELDS" # -v 2: histogram, if netperf was built with --enable-histogram
 
 TIMEOUT="timeout -k 180 120" # Note: make sure timeout values (-k for KILL, last for normal) are large enough for iperf3 to finish!
 
@@ -23,7 +24,7 @@ function bits_to_gbits {
 }
 
 mkdir -p $OUTDIR
-echo "server;client;min_latency;mean_latency;max_latency;stddev_latency" >> $OUTFILE
+echo "server;client;${NETPERF_FIELDS//,/;}" >> $OUTFILE
 
 read -d '' meta_info << EOF
 Measurement Start Timestamp: \`$(date +%c) ($(date +%s))\`
@@ -47,7 +48,7 @@ do
 		client=$(ssh "${HOSTS[$client_node_idx]}" "$TIMEOUT" "$NETPERF -H ${NODES[$server_node_idx]} $NETPERF_CLIENT_ARGS")
 		printf "$client" >> "$OUTFILE_STEM"_"${HOSTS[$server_node_idx]}"_"${HOSTS[$client_node_idx]}.txt"
 
-		latency=$(printf "$client"|tail -n 1|sed 's/,/;/g') # floats and comma as separator doesn't match - fix netperf output
+		latency=$(printf "$client"|sed -n '/^MIGRATED/{n;n;p}'|sed 's/,/;/g') # values follow the banner and the header, then the histogram; floats and comma as separator doesn't match - fix netperf output
 
 		echo "${HOSTS[$server_node_idx]};${HOSTS[$client_node_idx]};$latency" >> "$OUTFILE"
 		echo ": $latency"
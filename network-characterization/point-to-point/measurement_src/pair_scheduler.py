@@ -0,0 +1,281 @@
+"""
+Concurrent all-pairs scheduler for iperf3/netperf campaigns.
+
+The N·(N-1) ordered server/client pairs are grouped into rounds of node-disjoint pairs with the
+circle method of round-robin tournaments: N-1 rounds cover every unordered pair once, the same
+rounds with swapped roles cover the reverse direction, 2·(N-1) rounds in total (2·N for odd N).
+All pairs of a round run concurrently, so no host serves or runs more than one test at a time.
+Commands run on `common/remote.py`, with one persistent ssh session per host.
+A manifest records finished pairs, `--resume <campaign folder>` continues an interrupted campaign.
+
+Output files are named like the ones of `iperf_cluster.sh`/`netperf_cluster.sh`, so
+`main_iperf.py`/`main_netperf.py` read them unchanged.
+
+Usage: `python pair_scheduler.py {iperf,netperf} [--hosts NAME=ADDRESS ...] [--local] [--standin]`,
+e.g. `python pair_scheduler.py iperf --local --standin --hosts a b c d --client-args "-P 2 -t 5 -O 1 -J"`
+"""
+import argparse
+import asyncio
+import json
+import os
+import shlex
+import sys
+import time
+from dataclasses import dataclass
+from datetime import datetime
+from pathlib import Path
+from typing import Callable
+
+import numpy as np
+
+sys.path.append(str(Path(__file__).resolve().parents[3] / "common"))
+import campaign
+import remote
+
+sys.path.append(str(Path(__file__).resolve().parents[1] / "visualisation"))
+import netperf_ingest
+
+# nodes/hosts differentiation is a workaround for pending DNS/hosts entries
+HOSTS = ["cn01=10.97.4.1", "cn02=10.97.4.2", "cn03=10.97.4.3", "cn04=10.97.4.4", "infra1=10.97.3.1", "infra2=10.97.3.2"]
+
+STANDIN = f"{shlex.quote(sys.executable)} {shlex.quote(str(Path(__file__).resolve().parent / 'standin.py'))}"
+
+@dataclass
+class Host:
+	name: str
+	address: str
+
+	@staticmethod
+	def parse(spec: str) -> "Host":
+		name, _, address = spec.partition("=")
+		return Host(name=name, address=address or name)
+
+@dataclass
+class Tool:
+	name: str
+	server: str        # command templates with the fields of `Pair.fields`
+	client: str
+	server_stop: str   # run on the server host after the client finished, "" if the server exits by itself
+	version: str       # prints the tool version for the meta data
+	suffix: str        # raw client output per pair: `<stem>_<server>_<client><suffix>`
+	csv_header: str
+	csv_rows: Callable[[str, str, str], list[str]] # (server, client, raw output) -> campaign CSV lines
+	timeout: float     # [s] per client
+
+NETPERF_FIELDS = "min_latency,mean_latency,max_latency,stddev_latency,p50_latency,p90_latency,p99_latency,transaction_rate"
+
+def _iperf_rows(server: str, client: str, output: str) -> list[str]:
+	end = json.loads(output)["end"]
+	return [f"{server};{client};{end[s]['bits_per_second'] / 1e9:.12f}" for s in ("sum_sent", "sum_received")]
+
+def _netperf_rows(server: str, client: str, output: str) -> list[str]:
+	"""The selected fields, parsed like the analysis does (`visualisation/netperf_ingest.py`)"""
+	values = netperf_ingest.parse(output).values
+	missing = [field for field in NETPERF_FIELDS.split(",") if field not in values]
+	if missing:
+		raise ValueError(f"netperf output without {', '.join(missing)}")
+	return [f"{server};{client};" + ";".join(np.format_float_positional(values[field], trim="-")
+	                                         for field in NETPERF_FIELDS.split(","))]
+
+def tools(binary: dict[str, str]) -> dict[str, Tool]:
+	"""Tool definitions, `binary` maps iperf3/netperf/netserver to the command to run"""
+	return {
+		"iperf": Tool(name="iperf",
+			server=f"{binary['iperf3']} -s -1 -p {{port}}",
+			client=f"{binary['iperf3']} -c {{server_address}} -p {{port}} {{client_args}}",
+			server_stop="",
+			version=f"{binary['iperf3']} --version",
+			suffix=".json",
+			csv_header="from;to;throughput_gbitsec",
+			csv_rows=_iperf_rows,
+			timeout=90),
+		"netperf": Tool(name="netperf",
+			server=f"{binary['netserver']} -D -p {{port}}",
+			client=f"{binary['netperf']} -H {{server_address}} -p {{port}} {{client_args}}",
+			server_stop=f"pkill -f '{binary['netserver']} -D -p {{port}}'", # netserver doesn't have an "exit after test" option
+			version=f"{binary['netperf']} -V",
+			suffix=".txt",
+			csv_header="server;client;" + NETPERF_FIELDS.replace(",", ";"),
+			csv_rows=_netperf_rows,
+			timeout=120),
+	}
+
+CLIENT_ARGS = {
+	"iperf": "--parallel 8 --time 60 --omit 10 --json --zerocopy",
+	"netperf": f"-t TCP_RR -l 60 -v 2 -- -o {NETPERF_FIELDS}",
+}
+
+
+def rounds(n: int) -> list[list[tuple[int, int]]]:
+	"""Ordered (server, client) index pairs of `n` hosts, grouped into rounds without a host in two pairs"""
+	players = list(range(n)) + ([None] if n % 2 else []) # odd: one host sits out each round
+	m = len(players)
+	half = []
+	for _ in range(m - 1):
+		half.append([(players[i], players[m-1-i]) for i in range(m // 2) if None not in (players[i], players[m-1-i])])
+		players = [players[0], players[-1], *players[1:-1]] # rotate all but the first
+	return half + [[(client, server) for server, client in r] for r in half]
+
+def schedule(n: int, concurrency: int = None) -> list[list[tuple[int, int]]]:
+	"""`rounds`, split into rounds of at most `concurrency` pairs"""
+	if not concurrency:
+		return rounds(n)
+	return [r[i:i+concurrency] for r in rounds(n) for i in range(0, len(r), concurrency)]
+
+
+@dataclass
+class Pair:
+	server: Host
+	client: Host
+	port: int
+
+	def fields(self, client_args: str) -> dict[str, str]:
+		return {"server": self.server.name, "server_address": self.server.address,
+		        "client": self.client.name, "port": self.port, "client_args": client_args}
+
+class Campaign:
+	"""
+	One measurement campaign: output files, meta data and the execution of the rounds.
+	Progress is recorded in a manifest (see `common/campaign.py`), passing the folder of an
+	interrupted campaign as `resume` runs only its missing and failed pairs.
+	"""
+
+	def __init__(self, tool: Tool, hosts: list[Host], client_args: str, outdir: Path,
+				 runner: remote.Runner, base_port: int = 5201, startup: float = 1, resume: Path = None):
+		self.tool, self.hosts, self.client_args, self.runner = tool, hosts, client_args, runner
+		self.base_port, self.startup = base_port, startup
+		self.stem = resume.name if resume else f"measurements_{tool.name}_{datetime.now().strftime('%y-%m-%dT%H%M')}"
+		self.outdir = resume or outdir / self.stem
+		self.manifest = campaign.Manifest(self.outdir / f"{self.stem}_manifest.json")
+
+	def output(self, server: Host, client: Host) -> str:
+		return f"{self.stem}_{server.name}_{client.name}{self.tool.suffix}"
+
+	def unit(self, pair: Pair) -> campaign.Unit:
+		return self.manifest.units[f"{pair.server.name}_{pair.client.name}"]
+
+	async def run_round(self, pairs: list[Pair]):
+		"""Start all servers, then all clients, wait for the clients and stop the servers"""
+		fields = [pair.fields(self.client_args) for pair in pairs]
+		servers = [asyncio.create_task(self.runner.run(pair.server.name, self.tool.server.format(**f),
+		                                               timeout=self.tool.timeout + 2 * self.startup))
+		           for pair, f in zip(pairs, fields)]
+		try:
+			await asyncio.sleep(self.startup)
+			clients = await asyncio.gather(*[self.runner.run(pair.client.name, self.tool.client.format(**f),
+			                                                 timeout=self.tool.timeout, stdout=self.manifest.start(self.unit(pair)))
+			                                 for pair, f in zip(pairs, fields)])
+			for pair, client in zip(pairs, clients):
+				self.finish(pair, client)
+
+			if self.tool.server_stop:
+				await asyncio.gather(*[self.runner.run(pair.server.name, self.tool.server_stop.format(**f))
+				                       for pair, f in zip(pairs, fields)])
+			await asyncio.wait(servers, timeout=5)
+		finally:
+			for server in servers:
+				server.cancel() # kills servers still running, also when the campaign is interrupted
+			await asyncio.gather(*servers, return_exceptions=True)
+
+	def finish(self, pair: Pair, client: remote.Result):
+		"""Keep the output if the client succeeded and its output is valid"""
+		unit = self.unit(pair)
+		error = f"timeout after {self.tool.timeout}s" if client.timed_out else \
+		        f"exit code {client.returncode}: {client.stderr.strip()}" if not client.ok else ""
+		if not error:
+			try:
+				self.tool.csv_rows(pair.server.name, pair.client.name, self.manifest.partial(unit).read_text())
+			except (ValueError, KeyError, IndexError) as e:
+				error = f"invalid output: {e!r}"
+		if error:
+			print(f"{pair.server.name} -> {pair.client.name}: {error}")
+			self.manifest.fail(unit, error)
+		else:
+			self.manifest.complete(unit)
+
+	async def write_meta(self, num_rounds: int, concurrency: int):
+		meta = self.outdir / f"{self.stem}_meta.md"
+		if meta.is_file(): # resumed campaign
+			with open(meta, "a") as outfile:
+				outfile.write(f"Resumed: `{datetime.now().strftime('%c')} ({int(time.time())})`, `{num_rounds} rounds`\n")
+			return
+		probe = await self.runner.run(self.hosts[0].name, self.tool.version, timeout=30)
+		meta.write_text("\n".join([
+			f"Measurement Start Timestamp: `{datetime.now().strftime('%c')} ({int(time.time())})`",
+			f"Server Arguments: ``",
+			f"Client Arguments: `{self.client_args}`",
+			f"Measurement tool: `{self.tool.version.rsplit(' ', 1)[0]}` (Version: `{probe.stdout.strip()}`)",
+			f"Schedule: `{num_rounds} rounds of up to {concurrency or len(self.hosts) // 2} concurrent pairs`",
+		]) + "\n")
+
+	async def run(self, concurrency: int = None):
+		self.outdir.mkdir(parents=True, exist_ok=True)
+		self.manifest.plan([campaign.Unit(id=f"{server.name}_{client.name}", benchmark=self.tool.name, host_set="",
+		                                  output=self.output(server, client), pair=[server.name, client.name])
+		                    for server in self.hosts for client in self.hosts if server is not client])
+		todo = {unit.id for unit in self.manifest.todo()}
+
+		plan = []
+		for round_pairs in schedule(len(self.hosts), concurrency):
+			pairs = [Pair(server=self.hosts[s], client=self.hosts[c], port=self.base_port + p)
+			         for p, (s, c) in enumerate(round_pairs)]
+			pairs = [pair for pair in pairs if self.unit(pair).id in todo]
+			if pairs: plan.append(pairs)
+		print(f"{len(todo)} of {len(self.manifest.units)} pairs to run")
+
+		# one session per host, opened up front instead of per command
+		await asyncio.gather(*[self.runner.session(host.name) for host in self.hosts])
+		await self.write_meta(len(plan), concurrency)
+
+		start = time.monotonic()
+		for i, pairs in enumerate(plan):
+			print(f"[{i+1}/{len(plan)}] " + ", ".join(f"{p.server.name} -> {p.client.name}" for p in pairs))
+			await self.run_round(pairs)
+		print(f"{len(plan)} rounds in {time.monotonic() - start:.1f}s: {self.manifest.summary()}")
+
+		# campaign CSV in the order of the sequential scripts, rewritten from all finished pairs
+		tmp = self.outdir / f"{self.stem}.csv.partial"
+		with open(tmp, "w") as outfile:
+			outfile.write(self.tool.csv_header + "\n")
+			for server in self.hosts:
+				for client in filter(lambda h: h is not server, self.hosts):
+					unit = self.manifest.units[f"{server.name}_{client.name}"]
+					if self.manifest.is_done(unit):
+						rows = self.tool.csv_rows(server.name, client.name, (self.outdir / unit.output).read_text())
+						outfile.write("".join(row + "\n" for row in rows))
+		os.replace(tmp, self.outdir / f"{self.stem}.csv")
+
+
+def main():
+	parser = argparse.ArgumentParser(description="Run iperf3/netperf between all host pairs, node-disjoint pairs concurrently")
+	parser.add_argument("tool", choices=["iperf", "netperf"])
+	parser.add_argument("--hosts", nargs="+", default=HOSTS, help="NAME[=ADDRESS] (default: the OpenCUBE testbed)")
+	parser.add_argument("--client-args", default=None, help="default: the arguments of the *_cluster.sh scripts")
+	parser.add_argument("--concurrency", type=int, default=None, help="maximum pairs per round (default: all node-disjoint pairs, 1: sequential)")
+	parser.add_argument("--port", type=int, default=5201, help="port of the first pair of a round, the others count up")
+	parser.add_argument("--timeout", type=float, default=None, help="[s] per client command (default: 90 for iperf, 120 for netperf)")
+	parser.add_argument("--local", action="store_true", help="run all commands as local subprocesses instead of via ssh")
+	parser.add_argument("--standin", action="store_true", help="use `standin.py` instead of iperf3/netperf")
+	parser.add_argument("--iperf3", default="/tmp/pfriese/bin/iperf3")
+	parser.add_argument("--netperf", default="/tmp/pfriese/bin/netperf")
+	parser.add_argument("--netserver", default="/tmp/pfriese/bin/netserver")
+	parser.add_argument("--outdir", type=Path, default=Path.cwd())
+	parser.add_argument("--resume", type=Path, default=None, help="campaign folder of an interrupted run, runs its missing and failed pairs")
+	args = parser.parse_args()
+
+	binary = {b: f"{STANDIN} {b}" if args.standin else getattr(args, b) for b in ("iperf3", "netperf", "netserver")}
+	tool = tools(binary)[args.tool]
+	if args.timeout:
+		tool.timeout = args.timeout
+	hosts = [Host.parse(h) for h in args.hosts]
+	if args.local:
+		hosts = [Host(name=h.name, address="127.0.0.1") for h in hosts]
+
+	async def run():
+		backend = remote.LocalBackend() if args.local else remote.SSHBackend()
+		async with remote.Runner(backend) as runner:
+			await Campaign(tool, hosts, args.client_args or CLIENT_ARGS[args.tool], args.outdir,
+			               runner, base_port=args.port, resume=args.resume).run(args.concurrency)
+	campaign.run(run)
+
+if __name__ == "__main__": main()
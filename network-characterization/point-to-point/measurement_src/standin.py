@@ -0,0 +1,181 @@
+"""
+Local stand-in for iperf3, netperf and netserver, to test the measurement scripts without real hosts.
+
+Implements the subset of options used by `pair_scheduler.py` over real TCP connections (usually on
+localhost) and prints output in the format of the real tools, so the visualisation scripts can read it.
+The measured numbers are meaningless, only the formats and the timing behaviour match.
+
+Usage:
+- `python standin.py iperf3 -s -1 -p PORT` / `python standin.py iperf3 -c HOST -p PORT --parallel N --time T --omit O --json`
+- `python standin.py netserver -p PORT -D` / `python standin.py netperf -H HOST -p PORT -t TCP_RR -l T -- -o FIELDS`
+"""
+import argparse
+import json
+import socket
+import socketserver
+import sys
+import threading
+import time
+
+import numpy as np
+
+BLOCK_SIZE = 1 << 17
+
+NETPERF_FIELDS = {
+	"min_latency": "Minimum Latency Microseconds",
+	"mean_latency": "Mean Latency Microseconds",
+	"max_latency": "Maximum Latency Microseconds",
+	"stddev_latency": "Stddev Latency Microseconds",
+	"p50_latency": "50th Percentile Latency Microseconds",
+	"p90_latency": "90th Percentile Latency Microseconds",
+	"p99_latency": "99th Percentile Latency Microseconds",
+	"transaction_rate": "Transaction Rate Tran/s",
+}
+HISTOGRAM_ROWS = ["UNIT_USEC", "TEN_USEC", "HUNDRED_USEC", "UNIT_MSEC", "TEN_MSEC", "HUNDRED_MSEC", "UNIT_SEC", "TEN_SEC"]
+
+
+def _drain(connection: socket.socket):
+	while connection.recv(BLOCK_SIZE):
+		pass
+
+def iperf_server(port: int, one_off: bool):
+	"""Control connection announces the number of streams, then the data connections are drained until closed"""
+	with socket.create_server(("", port)) as server:
+		while True:
+			control, _ = server.accept()
+			with control:
+				streams = json.loads(control.makefile().readline())["streams"]
+				connections = [server.accept()[0] for _ in range(streams)]
+				threads = [threading.Thread(target=_drain, args=(c,)) for c in connections]
+				for thread in threads: thread.start()
+				for thread in threads: thread.join()
+				for connection in connections: connection.close()
+			if one_off:
+				return
+
+def iperf_client(host: str, port: int, streams: int, duration: int, omit: int) -> dict:
+	control = socket.create_connection((host, port))
+	control.sendall((json.dumps({"streams": streams}) + "\n").encode())
+	connections = [socket.create_connection((host, port)) for _ in range(streams)]
+	sent = np.zeros(streams, dtype=np.int64)
+	stop = threading.Event()
+
+	def send(s: int):
+		block = bytes(BLOCK_SIZE)
+		while not stop.is_set():
+			connections[s].sendall(block)
+			sent[s] += BLOCK_SIZE
+
+	threads = [threading.Thread(target=send, args=(s,)) for s in range(streams)]
+	start = time.time()
+	for thread in threads: thread.start()
+	intervals, previous = [], np.zeros(streams, dtype=np.int64)
+	for i in range(omit + duration):
+		time.sleep(max(0, start + i + 1 - time.time()))
+		current = sent.copy()
+		delta, previous = current - previous, current
+		bps = [float(8 * d) for d in delta]
+		omitted = i < omit
+		intervals.append({
+			"streams": [{"socket": 5 + 2 * s, "start": i, "end": i + 1, "seconds": 1, "bytes": int(delta[s]),
+			             "bits_per_second": bps[s], "retransmits": 0, "omitted": omitted, "sender": True}
+			            for s in range(streams)],
+			"sum": {"start": i, "end": i + 1, "seconds": 1, "bytes": int(delta.sum()), "bits_per_second": sum(bps),
+			        "retransmits": 0, "omitted": omitted, "sender": True}})
+	stop.set()
+	for thread in threads: thread.join()
+	for connection in connections: connection.close()
+	control.close()
+
+	measured = sum(interval["sum"]["bytes"] for interval in intervals[omit:])
+	total = {"start": 0, "end": duration, "seconds": duration, "bytes": measured,
+	         "bits_per_second": 8 * measured / max(duration, 1), "sender": True}
+	return {
+		"start": {"version": "standin", "connecting_to": {"host": host, "port": port},
+		          "timestamp": {"time": time.strftime("%a, %d %b %Y %H:%M:%S GMT", time.gmtime(start)),
+		                        "timesecs": int(start), "timemillis": int(start * 1e3)},
+		          "test_start": {"protocol": "TCP", "num_streams": streams, "blksize": BLOCK_SIZE,
+		                         "omit": omit, "duration": duration, "bytes": 0, "blocks": 0}},
+		"intervals": intervals,
+		"end": {"sum_sent": {**total, "retransmits": 0}, "sum_received": total},
+	}
+
+
+class _Echo(socketserver.BaseRequestHandler):
+	def handle(self):
+		while data := self.request.recv(1):
+			self.request.sendall(data)
+
+def netserver(port: int):
+	with socketserver.ThreadingTCPServer(("", port), _Echo) as server:
+		server.daemon_threads = True
+		server.serve_forever()
+
+def netperf_rr(host: str, port: int, duration: float) -> np.ndarray:
+	"""Latencies [µs] of one-byte request/response transactions for `duration` seconds"""
+	latencies = []
+	with socket.create_connection((host, port)) as connection:
+		connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+		end = time.perf_counter() + duration
+		while (now := time.perf_counter()) < end:
+			connection.sendall(b"x")
+			connection.recv(1)
+			latencies.append(time.perf_counter() - now)
+	return np.array(latencies) * 1e6
+
+def netperf_histogram(latencies: np.ndarray) -> list[str]:
+	"""netperf `-v 2` histogram: rows of 10 buckets, each row 10 times wider than the one before"""
+	lines = ["", "Histogram of request/response times"]
+	for row, name in enumerate(HISTOGRAM_ROWS):
+		lower, width = (10 ** row if row else 0), 10 ** row
+		buckets = np.where(latencies < 10 ** (row + 1), np.floor(latencies / width), -1).astype(int)
+		counts = np.bincount(buckets[(buckets >= 0) & (latencies >= lower)], minlength=10)[:10]
+		lines.append(f"{name:<14}: " + ": ".join(f"{c:4d}" for c in counts))
+	lines += [f">100_SECS: {(latencies >= 1e8).sum()}", f"HIST_TOTAL:      {len(latencies)}"]
+	return lines
+
+def netperf_output(host: str, latencies: np.ndarray, duration: float, fields: list[str], histogram: bool) -> str:
+	p50, p90, p99 = np.percentile(latencies, [50, 90, 99])
+	values = {"min_latency": latencies.min(), "mean_latency": latencies.mean(),
+	          "max_latency": latencies.max(), "stddev_latency": latencies.std(),
+	          "p50_latency": p50, "p90_latency": p90, "p99_latency": p99,
+	          "transaction_rate": len(latencies) / duration}
+	return "\n".join([
+		f"MIGRATED TCP REQUEST/RESPONSE TEST from 0.0.0.0 (0.0.0.0) port 0 AF_INET to {host} () port 0 AF_INET : first burst 0",
+		",".join(NETPERF_FIELDS[f] for f in fields),
+		",".join(f"{values[f]:.2f}" for f in fields),
+		*(netperf_histogram(latencies) if histogram else [])])
+
+
+def main():
+	tool, argv = sys.argv[1], sys.argv[2:]
+	parser = argparse.ArgumentParser(prog=f"standin.py {tool}")
+	parser.add_argument("-p", "--port", type=int)
+	if tool == "iperf3":
+		parser.add_argument("-s", "--server", action="store_true")
+		parser.add_argument("-1", "--one-off", action="store_true")
+		parser.add_argument("-c", "--client")
+		parser.add_argument("-P", "--parallel", type=int, default=1)
+		parser.add_argument("-t", "--time", type=int, default=10)
+		parser.add_argument("-O", "--omit", type=int, default=0)
+		args, _ = parser.parse_known_args(argv) # --json, --zerocopy, ...
+		if args.server:
+			iperf_server(args.port or 5201, args.one_off)
+		else:
+			print(json.dumps(iperf_client(args.client, args.port or 5201, args.parallel, args.time, args.omit), indent="\t"))
+	elif tool == "netserver":
+		args, _ = parser.parse_known_args(argv)
+		netserver(args.port or 12865)
+	elif tool == "netperf":
+		test_args, _, option_args = " ".join(argv).partition(" -- ")
+		parser.add_argument("-H", "--host")
+		parser.add_argument("-l", "--length", type=float, default=10)
+		parser.add_argument("-v", "--verbosity", type=int, default=1)
+		args, _ = parser.parse_known_args(test_args.split())
+		fields = option_args.split("-o", 1)[1].split()[0].split(",") if "-o" in option_args else list(NETPERF_FIELDS)
+		latencies = netperf_rr(args.host, args.port or 12865, args.length)
+		print(netperf_output(args.host, latencies, args.length, fields, histogram=args.verbosity > 1))
+	else:
+		raise SystemExit(f"unknown tool {tool}")
+
+if __name__ == "__main__": main()
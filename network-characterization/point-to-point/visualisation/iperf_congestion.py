@@ -0,0 +1,134 @@
+"""
+Analysis of congestion campaigns (`measurement_src/congestion.py`): concurrent iperf3 flows in a traffic pattern.
+
+The intervals of all flows are placed on the shared clock of the campaign (seconds since the common start time,
+from `start_s` of the flows CSV, the start timestamp of every flow) and averaged into bins of `resolution` seconds,
+so flows starting a fraction of a second apart are aligned. Only the bins in which all flows of the pattern are
+measured (after `--omit`) count, so flows that start late or end early do not inflate the results. Per pattern:
+- aggregate throughput: sum of all flows per bin, its mean is the total (for `bisection`: the bisection bandwidth)
+- per-flow fairness: Jain's index (Σx)² / (n·Σx²) of the mean flow throughputs, 1 if all flows get the same share
+- slowdown: isolated throughput of the pair (pair campaign, see `main_iperf.load_heatmap`) / throughput under congestion
+
+Usage: `python iperf_congestion.py ../data/measurements_congestion_<timestamp> [--isolated ../data/measurements_iperf_<timestamp>]`
+"""
+import argparse
+from dataclasses import dataclass
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+import iperf_ingest
+
+@dataclass
+class Congestion:
+	pattern: str
+	flows: pd.DataFrame     # one row per flow, see `analyse`
+	throughput: np.ndarray  # flow × bin of the shared clock [Gbit/s], NaN where a flow was not measured throughout
+	concurrent: np.ndarray  # bin, bool: all flows measured
+	clock: np.ndarray       # start of every bin [s] since the common start
+	resolution: float       # width of the bins [s]
+
+	@property
+	def aggregate(self) -> np.ndarray:
+		"""Total throughput of all flows per bin [Gbit/s], NaN where not all flows were measured"""
+		return np.where(self.concurrent, np.nansum(self.throughput, axis=0), np.nan)
+
+	@property
+	def total_gbps(self) -> float:
+		return float(np.nanmean(self.aggregate)) if self.concurrent.any() else np.nan
+
+	@property
+	def fairness(self) -> float:
+		return float(jain(self.flows["mean_gbps"].to_numpy()))
+
+
+def jain(x: np.ndarray, axis: int = None) -> np.ndarray:
+	"""Jain's fairness index, NaN ignored"""
+	return np.nansum(x, axis=axis) ** 2 / (np.sum(~np.isnan(x), axis=axis) * np.nansum(x ** 2, axis=axis))
+
+def load_flows(pattern_dir: Path) -> pd.DataFrame:
+	return pd.read_csv(next(pattern_dir.glob("*_flows.csv")), sep=";")
+
+def on_clock(start: np.ndarray, end: np.ndarray, values: np.ndarray, edges: np.ndarray) -> np.ndarray:
+	"""
+	Time average of one flow's intervals (contiguous, `start`/`end` on the shared clock [s]) in the bins between
+	`edges`, NaN in bins not measured throughout (omitted or missing intervals, before/after the flow)
+	"""
+	valid = np.isfinite(values)
+	duration = np.where(valid, end - start, 0.)
+	knots = np.concatenate([start[:1], end])
+	integral = np.interp(edges, knots, np.concatenate([[0.], np.cumsum(np.where(valid, values, 0.) * duration)]))
+	covered = np.interp(edges, knots, np.concatenate([[0.], np.cumsum(duration)]))
+	width = np.diff(edges)
+	with np.errstate(divide="ignore", invalid="ignore"):
+		return np.where(np.diff(covered) >= width * (1 - 1e-9), np.diff(integral) / width, np.nan)
+
+def analyse(campaign: iperf_ingest.IperfCampaign, flows: pd.DataFrame, isolated: pd.DataFrame = None,
+			resolution: float = .1) -> Congestion:
+	"""
+	Flow table (server, client, start_s, mean_gbps over the concurrent bins, isolated_gbps and slowdown if
+	`isolated`, a server × client throughput matrix, is given) and the flows on the shared clock in bins of
+	`resolution` seconds
+	"""
+	start = flows.set_index(["server", "client"])["start_s"]
+	offsets = np.array([start.get((s, c), 0.) for s, c in zip(campaign.servers, campaign.clients)], dtype=float)
+	gbps = campaign.sum_metric("bits_per_second") / 1e9 # flow × interval, omitted intervals NaN
+	begin = offsets[:, None] + campaign.sum_metric("start", omitted=True)
+	end = offsets[:, None] + campaign.sum_metric("end", omitted=True)
+	first, last = np.nanmin(begin), np.nanmax(end)
+	edges = np.floor(first / resolution) * resolution + resolution * np.arange(int(np.ceil((last - first) / resolution)) + 2)
+	throughput = np.array([on_clock(b[np.isfinite(b)], e[np.isfinite(b)], g[np.isfinite(b)], edges)
+	                       for b, e, g in zip(begin, end, gbps)])
+	concurrent = ~np.isnan(throughput).any(axis=0)
+
+	window = throughput[:, concurrent] if concurrent.any() else throughput
+	df = pd.DataFrame({"server": campaign.servers, "client": campaign.clients, "start_s": offsets,
+	                   "mean_gbps": np.nanmean(window, axis=1)})
+	if isolated is not None:
+		df["isolated_gbps"] = [isolated.at[s, c] if s in isolated.index and c in isolated.columns else np.nan
+		                       for s, c in zip(df["server"], df["client"])]
+		df["slowdown"] = df["isolated_gbps"] / df["mean_gbps"]
+	return Congestion(pattern=campaign.name, flows=df, throughput=throughput, concurrent=concurrent,
+	                  clock=edges[:-1], resolution=resolution)
+
+def load(measurement_dir: Path, isolated: pd.DataFrame = None, resolution: float = .1) -> dict[str, Congestion]:
+	"""All patterns of a congestion campaign folder, by pattern"""
+	return {pattern_dir.name: analyse(iperf_ingest.load_campaign(pattern_dir), load_flows(pattern_dir), isolated, resolution)
+	        for pattern_dir in sorted(measurement_dir.iterdir()) if pattern_dir.is_dir()}
+
+def summary(congestion: dict[str, Congestion]) -> pd.DataFrame:
+	"""One row per pattern: flows, concurrent seconds, total throughput, fairness and slowdown"""
+	rows = []
+	for pattern, c in congestion.items():
+		rows.append({"pattern": pattern, "flows": len(c.flows), "concurrent_s": c.concurrent.sum() * c.resolution,
+		             "total_gbps": c.total_gbps, "mean_flow_gbps": c.flows["mean_gbps"].mean(),
+		             "min_flow_gbps": c.flows["mean_gbps"].min(), "fairness": c.fairness,
+		             **({"median_slowdown": c.flows["slowdown"].median(), "max_slowdown": c.flows["slowdown"].max()}
+		                if "slowdown" in c.flows else {})})
+	return pd.DataFrame(rows)
+
+
+def main():
+	parser = argparse.ArgumentParser(description="Aggregate throughput, fairness and slowdown of a congestion campaign")
+	parser.add_argument("campaign", type=Path, help="folder written by `congestion.py`")
+	parser.add_argument("--isolated", type=Path, default=None, help="pair campaign folder of the same hosts, for the slowdown")
+	parser.add_argument("--flows", action="store_true", help="also list all flows")
+	parser.add_argument("--resolution", type=float, default=.1, help="[s] bins of the shared clock")
+	args = parser.parse_args()
+
+	isolated = None
+	if args.isolated:
+		campaign = iperf_ingest.load_campaign(args.isolated)
+		isolated = pd.DataFrame({"server": campaign.servers, "client": campaign.clients,
+		                         "gbps": np.nanmean(campaign.sum_metric("bits_per_second") / 1e9, axis=1)}
+		                        ).pivot(index="server", columns="client", values="gbps")
+	congestion = load(args.campaign, isolated, args.resolution)
+	with pd.option_context("display.max_rows", None, "display.width", 200, "display.precision", 3):
+		print(summary(congestion).to_string(index=False))
+		if args.flows:
+			for pattern, c in congestion.items():
+				print(f"\n== {pattern}")
+				print(c.flows.to_string(index=False))
+
+if __name__ == "__main__": main()
@@ -0,0 +1,222 @@
+"""
+Streaming, parallel ingestion of iperf3 JSON results.
+
+Every `*_<server>_<client>.json` file of a campaign is streamed interval by interval
+into preallocated arrays of shape pair × interval (× stream) × metric. The arrays are
+`.npy` files in the measurement cache, so the memory footprint is independent of the
+number of pairs, and later loads of an unchanged campaign are memory-mapped reads.
+"""
+import hashlib
+import json
+import math
+import multiprocessing
+import os
+import shutil
+import sys
+import tempfile
+import warnings
+from dataclasses import dataclass
+from pathlib import Path
+
+import numpy as np
+
+sys.path.append(str(Path(__file__).resolve().parents[3] / "common"))
+import measurement_cache
+import profiling
+
+PARSER_VERSION = 2
+CHUNK_SIZE = 1 << 16
+
+SUM_METRICS = ("bits_per_second", "bytes", "retransmits", "omitted", "start", "end") # start/end: [s] since the flow start
+STREAM_METRICS = ("bits_per_second", "bytes", "retransmits", "snd_cwnd", "rtt", "rttvar")
+
+@dataclass
+class IperfCampaign:
+	name: str
+	servers: np.ndarray # per pair
+	clients: np.ndarray # per pair
+	sum: np.ndarray     # pair × interval × SUM_METRICS
+	streams: np.ndarray # pair × interval × stream × STREAM_METRICS
+	omit: int
+
+	def sum_metric(self, metric: str, omitted: bool = False) -> np.ndarray:
+		"""pair × interval array of an `intervals[].sum` metric, omitted intervals are NaN unless `omitted`"""
+		values = np.array(self.sum[:, :, SUM_METRICS.index(metric)])
+		if not omitted:
+			values[self.sum[:, :, SUM_METRICS.index("omitted")] != 0] = np.nan
+		return values
+
+	def stream_metric(self, metric: str, omitted: bool = False) -> np.ndarray:
+		"""pair × interval × stream array of an `intervals[].streams[]` metric"""
+		values = np.array(self.streams[:, :, :, STREAM_METRICS.index(metric)])
+		if not omitted:
+			values[self.sum[:, :, SUM_METRICS.index("omitted")] != 0] = np.nan
+		return values
+
+
+def _stream(infile):
+	"""
+	Read the `start` object of an iperf3 JSON document and return it together with
+	a generator over the `intervals` array, which decodes one interval at a time.
+	"""
+	buf = ""
+	while (pos := buf.find('"intervals":')) < 0:
+		chunk = infile.read(CHUNK_SIZE)
+		if not chunk: raise ValueError(f"{infile.name}: no intervals found")
+		buf += chunk
+	start = json.loads(buf[:pos].rstrip().rstrip(",") + "}")["start"]
+
+	def intervals(buf: str, idx: int):
+		decoder = json.JSONDecoder()
+		while True:
+			while idx < len(buf) and buf[idx] in " \t\r\n,": idx += 1
+			if buf.startswith("]", idx): return
+			try:
+				interval, idx = decoder.raw_decode(buf, idx)
+			except json.JSONDecodeError: # interval crosses the chunk boundary
+				chunk = infile.read(CHUNK_SIZE)
+				if not chunk: raise
+				buf, idx = buf[idx:] + chunk, 0
+				continue
+			yield interval
+
+	return start, intervals(buf, buf.index("[", pos) + 1)
+
+def read_start(path: Path) -> dict:
+	with open(path, "r") as infile:
+		return _stream(infile)[0]
+
+
+def _shape(path: Path) -> tuple[int, int, int]:
+	"""Number of intervals, number of streams and omitted seconds announced by the `start` object of `path`"""
+	start = read_start(path)["test_start"]
+	return math.ceil(start["omit"] + start["duration"]), start["num_streams"], start["omit"]
+
+
+_outdir: Path = None
+_sum: np.ndarray = None
+_streams: np.ndarray = None
+
+def _init_worker(outdir: Path):
+	global _outdir, _sum, _streams
+	_outdir, _sum, _streams = outdir, None, None
+
+def _ingest_file(task: tuple[int, Path]) -> int:
+	global _sum, _streams
+	if _sum is None: # opened on first use, the arrays are allocated after the workers start
+		_sum = np.load(_outdir / "sum.npy", mmap_mode="r+")
+		_streams = np.load(_outdir / "streams.npy", mmap_mode="r+")
+	pair, path = task
+	count = 0
+	with open(path, "r") as infile:
+		for count, interval in enumerate(_stream(infile)[1], start=1):
+			if count > _sum.shape[1]: break
+			_sum[pair, count-1] = [float(interval["sum"].get(m, np.nan)) for m in SUM_METRICS]
+			for s, stream in enumerate(interval["streams"][:_streams.shape[2]]):
+				_streams[pair, count-1, s] = [float(stream.get(m, np.nan)) for m in STREAM_METRICS]
+	return count
+
+
+def _campaign_key(files: list[Path]) -> str:
+	"""
+	Key of a campaign: the parser version and the names and content hashes of all its files.
+	The content hashes are only computed if a file's path, size or mtime changed since the last load,
+	a `stat/` alias in the cache maps those to the key.
+	"""
+	h = hashlib.sha256(f"iperf:{PARSER_VERSION}".encode())
+	for file in files:
+		stat = file.stat()
+		h.update(f"{file.resolve()}:{stat.st_size}:{stat.st_mtime_ns}".encode())
+	alias = measurement_cache.CACHE_DIR / "iperf" / "stat" / h.hexdigest()
+	if alias.is_file():
+		return alias.read_text()
+
+	h = hashlib.sha256(f"iperf:{PARSER_VERSION}".encode())
+	for file in files:
+		h.update(f"{file.name}:{measurement_cache.content_hash(file)}".encode())
+	alias.parent.mkdir(parents=True, exist_ok=True)
+	tmp = alias.with_suffix(f".{os.getpid()}.tmp")
+	tmp.write_text(h.hexdigest())
+	os.replace(tmp, alias)
+	return h.hexdigest()
+
+def _ingest(files: list[Path], outdir: Path, processes: int):
+	"""Parse `files` into the `.npy` arrays and `meta.json` of `outdir`"""
+	pool = multiprocessing.Pool(processes, initializer=_init_worker, initargs=(outdir,)) if processes != 1 else None
+	chunksize = max(1, len(files) // (4 * (processes or os.cpu_count())))
+	try:
+		shapes = pool.map(_shape, files, chunksize=chunksize) if pool else list(map(_shape, files))
+		# arrays fit the largest test of the campaign, shorter ones are NaN-padded
+		num_intervals = max(shape[0] for shape in shapes)
+		num_streams = max(shape[1] for shape in shapes)
+		omit = shapes[0][2]
+		if any(shape[2] != omit for shape in shapes):
+			warnings.warn(f"{files[0].parent.name}: files differ in omitted seconds, using the {omit} s of {files[0].name}")
+
+		outdir.mkdir(parents=True, exist_ok=True)
+		for fn, shape in [("sum.npy", (len(files), num_intervals, len(SUM_METRICS))),
+		                  ("streams.npy", (len(files), num_intervals, num_streams, len(STREAM_METRICS)))]:
+			array = np.lib.format.open_memmap(outdir / fn, mode="w+", dtype=np.float64, shape=shape)
+			array[:] = np.nan
+			array.flush()
+			del array
+
+		tasks = list(enumerate(files))
+		if pool:
+			counts = pool.map(_ingest_file, tasks, chunksize=chunksize)
+		else:
+			_init_worker(outdir)
+			counts = list(map(_ingest_file, tasks))
+			_init_worker(None)
+	finally:
+		if pool:
+			pool.terminate()
+	for file, count in zip(files, counts):
+		if count > num_intervals:
+			warnings.warn(f"{file.name}: more than {num_intervals} intervals, ignoring the remaining ones")
+
+	# written last, marks a complete ingest
+	tmp = outdir / f"meta.{os.getpid()}.tmp"
+	tmp.write_text(json.dumps({"pairs": [file.stem.split("_")[-2:] for file in files], "omit": omit}))
+	os.replace(tmp, outdir / "meta.json")
+
+def _open(name: str, outdir: Path, mmap_mode: str = "r") -> IperfCampaign:
+	meta = json.loads((outdir / "meta.json").read_text())
+	return IperfCampaign(name=name,
+		servers=np.array([p[0] for p in meta["pairs"]]),
+		clients=np.array([p[1] for p in meta["pairs"]]),
+		sum=np.load(outdir / "sum.npy", mmap_mode=mmap_mode),
+		streams=np.load(outdir / "streams.npy", mmap_mode=mmap_mode),
+		omit=meta["omit"])
+
+@profiling.timed("parse", parser="iperf")
+def load_campaign(measurement_dir: Path, processes: int = None) -> IperfCampaign:
+	"""
+	Ingest all iperf3 JSON files of `measurement_dir` (or load them from the cache).
+	`processes` worker processes parse the files, default: all cores.
+	Without the cache the arrays are ingested into a temporary directory and read into memory.
+	"""
+	files = sorted(filter(lambda x: x.suffix == ".json" and not x.stem.endswith("_manifest"), measurement_dir.iterdir()))
+	if not files:
+		raise ValueError(f"{measurement_dir}: no iperf3 JSON files")
+	if not measurement_cache.enabled():
+		with tempfile.TemporaryDirectory(prefix="iperf_") as tmpdir:
+			_ingest(files, Path(tmpdir), processes)
+			return _open(measurement_dir.name, Path(tmpdir), mmap_mode=None)
+
+	outdir = measurement_cache.CACHE_DIR / "iperf" / _campaign_key(files)
+	if not (outdir / "meta.json").is_file():
+		# ingested next to the cache entry and renamed into place, concurrent loaders never see partial arrays
+		outdir.parent.mkdir(parents=True, exist_ok=True)
+		tmpdir = Path(tempfile.mkdtemp(prefix=f"{outdir.name}.", dir=outdir.parent))
+		try:
+			_ingest(files, tmpdir, processes)
+			if outdir.is_dir() and not (outdir / "meta.json").is_file():
+				shutil.rmtree(outdir, ignore_errors=True) # left behind by an interrupted ingest
+			try:
+				os.replace(tmpdir, outdir)
+			except OSError:
+				pass # ingested concurrently by another loader, keep theirs
+		finally:
+			shutil.rmtree(tmpdir, ignore_errors=True)
+	return _open(measurement_dir.name, outdir)
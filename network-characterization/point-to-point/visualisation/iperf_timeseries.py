@@ -0,0 +1,123 @@
+"""
+Time-series analysis of iperf3 campaigns on the pair × interval (× stream) arrays of `iperf_ingest`.
+
+Per server/client pair:
+- warm-up: measured intervals (after `--omit`) until the throughput first stays within
+  `tolerance` of the steady state (median of the second half) for three intervals
+- periodic dips: dominant frequency and its harmonics in the throughput spectrum (FFT), reported if
+  they hold `dip_power` more of the non-DC power than noise would and the dips exceed `tolerance`
+- straggler streams: streams below `straggler_ratio` × the median stream throughput,
+  and Jain's fairness index over the streams
+- outlier intervals: robust z-score (median/MAD) above `outlier_z`
+- retransmits and RTT variation (mean rttvar / mean rtt)
+- stability score in [0, 1]: fairness × (1 - outlier fraction) × max(0, 1 - CV / `cv_limit`)
+
+Usage: `python iperf_timeseries.py ../data/<campaign>`
+"""
+import argparse
+from dataclasses import dataclass
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+import iperf_ingest
+
+@dataclass
+class Analysis:
+	pairs: pd.DataFrame     # one row per pair, see `analyse`
+	throughput: np.ndarray  # pair × measured interval [Gbit/s]
+	outliers: np.ndarray    # pair × measured interval, bool
+	steady: np.ndarray      # pair [Gbit/s]
+
+
+def steady_state(gbps: np.ndarray) -> np.ndarray:
+	return np.nanmedian(gbps[:, gbps.shape[1] // 2:], axis=1)
+
+def warmup_intervals(gbps_all: np.ndarray, omit: int, steady: np.ndarray, tolerance: float, run: int = 3) -> np.ndarray:
+	"""Measured intervals before the throughput stays within `tolerance` of `steady` for `run` intervals"""
+	ok = gbps_all >= (1 - tolerance) * steady[:, None]
+	window = np.all(np.lib.stride_tricks.sliding_window_view(ok, run, axis=1), axis=2)
+	first = np.where(window.any(axis=1), np.argmax(window, axis=1), ok.shape[1])
+	return np.maximum(0, first - omit)
+
+def periodic_dips(gbps: np.ndarray, steady: np.ndarray, dip_power: float, tolerance: float) -> tuple[np.ndarray, np.ndarray]:
+	"""
+	Period [intervals] of the dominant throughput oscillation (NaN if none) and its share of the non-DC power.
+	Short dips are not sinusoidal, so each candidate frequency collects the power of its harmonics and
+	is scored by its share above the share white noise would give the same number of frequencies.
+	"""
+	n = gbps.shape[1]
+	x = np.where(np.isnan(gbps), np.nanmedian(gbps, axis=1, keepdims=True), gbps)
+	x = x - x.mean(axis=1, keepdims=True)
+	power = np.abs(np.fft.rfft(x, axis=1)[:, 1:]) ** 2 # frequencies 1 .. n/2 [1/measurement]
+	frequencies = np.arange(1, power.shape[1] + 1)
+	candidates = frequencies[frequencies >= 2] # at least two periods
+	harmonics = (frequencies[None, :] % candidates[:, None]) == 0 # candidate × frequency
+	share = power @ harmonics.T / np.maximum(power.sum(axis=1, keepdims=True), np.finfo(float).tiny)
+	best = np.argmax(share - harmonics.mean(axis=1), axis=1)
+	share = np.take_along_axis(share, best[:, None], axis=1)[:, 0]
+	excess = share - harmonics.mean(axis=1)[best]
+	rms = np.sqrt(2 * share * power.sum(axis=1)) / n # of the periodic component
+	periodic = (excess >= dip_power) & (2 * rms >= tolerance * steady)
+	return np.where(periodic, n / candidates[best], np.nan), share
+
+def stream_balance(stream_gbps: np.ndarray, straggler_ratio: float) -> tuple[np.ndarray, np.ndarray]:
+	"""Number of straggler streams and Jain's fairness index per pair, from pair × interval × stream throughput"""
+	mean = np.nanmean(stream_gbps, axis=1) # pair × stream
+	stragglers = (mean < straggler_ratio * np.nanmedian(mean, axis=1, keepdims=True)).sum(axis=1)
+	fairness = np.nansum(mean, axis=1) ** 2 / (np.sum(~np.isnan(mean), axis=1) * np.nansum(mean ** 2, axis=1))
+	return stragglers, fairness
+
+def outlier_intervals(gbps: np.ndarray, outlier_z: float) -> np.ndarray:
+	median = np.nanmedian(gbps, axis=1, keepdims=True)
+	mad = np.nanmedian(np.abs(gbps - median), axis=1, keepdims=True)
+	z = .6745 * (gbps - median) / np.maximum(mad, 1e-9 * np.abs(median))
+	return np.abs(z) > outlier_z
+
+
+def analyse(campaign: iperf_ingest.IperfCampaign, tolerance: float = .05, dip_power: float = .25,
+			straggler_ratio: float = .8, outlier_z: float = 3.5, cv_limit: float = .1) -> Analysis:
+	measured = campaign.sum[0, :, iperf_ingest.SUM_METRICS.index("omitted")] == 0
+	gbps_all = campaign.sum_metric("bits_per_second", omitted=True) / 1e9
+	gbps = gbps_all[:, measured]
+	steady = steady_state(gbps)
+
+	period, share = periodic_dips(gbps, steady, dip_power, tolerance)
+	stragglers, fairness = stream_balance(campaign.stream_metric("bits_per_second")[:, measured] / 1e9, straggler_ratio)
+	outliers = outlier_intervals(gbps, outlier_z)
+	mean, std = np.nanmean(gbps, axis=1), np.nanstd(gbps, axis=1, ddof=1)
+	cv = std / mean
+
+	pairs = pd.DataFrame({
+		"server": campaign.servers, "client": campaign.clients,
+		"mean_gbps": mean, "cv": cv, "steady_gbps": steady,
+		"warmup_intervals": warmup_intervals(gbps_all, int(np.argmax(measured)), steady, tolerance),
+		"dip_period": period, "dip_power": share,
+		"stragglers": stragglers, "fairness": fairness,
+		"outliers": outliers.sum(axis=1),
+		"retransmits": np.nansum(campaign.stream_metric("retransmits")[:, measured], axis=(1, 2)),
+		"rtt_variation": np.nanmean(campaign.stream_metric("rttvar")[:, measured], axis=(1, 2))
+		                 / np.nanmean(campaign.stream_metric("rtt")[:, measured], axis=(1, 2)),
+	})
+	pairs["stability"] = fairness * (1 - outliers.mean(axis=1)) * np.clip(1 - cv / cv_limit, 0, 1)
+	return Analysis(pairs=pairs, throughput=gbps, outliers=outliers, steady=steady)
+
+def anomalies(analysis: Analysis) -> pd.DataFrame:
+	"""Pairs with slow warm-up, periodic dips, straggler streams or outlier intervals, least stable first"""
+	p = analysis.pairs
+	flagged = (p["warmup_intervals"] > 0) | p["dip_period"].notna() | (p["stragglers"] > 0) | (p["outliers"] > 0)
+	return p[flagged].sort_values("stability")
+
+
+def main():
+	parser = argparse.ArgumentParser(description="Per-interval and per-stream analysis of an iperf3 campaign")
+	parser.add_argument("campaign", type=Path, help="folder with the iperf3 JSON files")
+	parser.add_argument("--all", action="store_true", help="list all pairs, not only anomalous ones")
+	args = parser.parse_args()
+
+	analysis = analyse(iperf_ingest.load_campaign(args.campaign))
+	with pd.option_context("display.max_rows", None, "display.width", 200, "display.precision", 3):
+		print(analysis.pairs.sort_values("stability") if args.all else anomalies(analysis))
+
+if __name__ == "__main__": main()
@@ -1,13 +1,24 @@
-import json
+import sys
 
 import pandas as pd
 import numpy as np
 import matplotlib
 import matplotlib.pyplot as plt
 from pathlib import Path
+from functools import partial
+from typing import Callable
 
 from mpl_toolkits import axes_grid1
 
+sys.path.append(str(Path(__file__).resolve().parents[3] / "common"))
+import bootstrap
+import heatmap
+import profiling
+
+import iperf_congestion
+import iperf_ingest
+import iperf_timeseries
+
 pd.options.display.width = 1920
 pd.options.display.max_columns = 99
 
@@ -26,70 +37,168 @@ def add_colorbar(im, aspect=20, pad_fraction=0.5, **kwargs):
 	plt.sca(current_ax)
 	return im.axes.figure.colorbar(im, cax=cax, **kwargs)
 
-def main():
-	file_path = Path(__file__).parent
-	basepath = file_path.parent / "data"
+file_path = Path(__file__).parent
 
-	date = "23-11-03T1352"
-	measurement_dir = f"measurements_iperf_{date}"
-
-	data = []
-	for file in filter(lambda x: x.suffix == ".json",
-					   (basepath/measurement_dir).iterdir()):
-		file_parts = file.stem.split("_")
-		with open(file, "r") as infile:
-			content = json.load(infile)
-			intervals = content["intervals"]
-			data += [
-				{**interval["sum"],
-				 "server": file_parts[3],
-				 "client": file_parts[4],
-				 "rtt_mean": np.mean(list(map(lambda x: x["rtt"], interval["streams"])))
-				 }
-				for interval in intervals
-				if not interval["sum"]["omitted"]
-			]
-	df = pd.DataFrame(data)
-	df["gbits_per_second"] = df.bits_per_second / 1e9
-
-	metric = "gbits_per_second"
-
-	ct = pd.crosstab(index=df["server"], columns=df["client"],
-					 values=df[metric], aggfunc="mean")
-	ct_std = pd.crosstab(index=df["server"], columns=df["client"],
-					 values=df[metric], aggfunc="std")
+@profiling.timed("aggregate")
+def load_heatmap(measurement_dir: str, spread: str = "std", level: float = .95, block: int = 5) -> tuple[pd.DataFrame, pd.DataFrame]:
+	"""
+	server × client mean throughput [Gbit/s] and its spread over the intervals of every pair:
+	the standard deviation (`spread="std"`), or the half width of a `level` bootstrap confidence interval of
+	the mean (`spread="ci"`). The intervals of one run are correlated, so blocks of `block` consecutive
+	intervals are resampled (moving block bootstrap).
+	"""
+	basepath = file_path.parent / "data"
 
+	campaign = iperf_ingest.load_campaign(basepath/measurement_dir)
+	gbits_per_second = campaign.sum_metric("bits_per_second") / 1e9
+
+	if spread not in ("std", "ci"):
+		raise ValueError(f"unknown spread {spread}, expected std or ci")
+	if spread == "ci":
+		ci = bootstrap.interval(gbits_per_second.T, level=level, block=block) # intervals as runs
+		mean, deviation = ci.estimate, ci.half_width
+	else:
+		mean, deviation = np.nanmean(gbits_per_second, axis=1), np.nanstd(gbits_per_second, axis=1, ddof=1)
+	df = pd.DataFrame({"server": campaign.servers, "client": campaign.clients, "mean": mean, "spread": deviation})
+	ct = df.pivot(index="server", columns="client", values="mean")
+	ct_spread = df.pivot(index="server", columns="client", values="spread")
+	return ct, ct_spread
+
+def plot_heatmap(ct: pd.DataFrame, ct_spread: pd.DataFrame, name: str, save: bool = False, spread_label: str = None):
+	"""Throughput heatmap, cells labelled with mean ± spread, `spread_label` names the spread on the colorbar"""
 	fig, ax = plt.subplots(figsize=(12,12))
 	fig: plt.Figure
 	ax: plt.Axes
 
-	im = ax.imshow(ct)
-
-	def _format(input: float) -> str:
-		if np.isnan(input): return ""
-		rounded = round(input, 2)
-		return str(rounded)
-
-	textcolors = ["white", "black"]
-	threshold = 0.5
-	for i in range(len(ct.columns)):
-		for j in range(len(ct.columns)):
-			try:
-				datum = ct.iloc[i,j]
-				color = textcolors[int(im.norm(datum) > threshold)]
-				ax.text(j,i, f"{_format(datum)}\n±{_format(ct_std.iloc[i,j])}", ha="center",va="center", color=color)
-			except: pass
+	im = heatmap.plot(ax, ct, ct_spread, ticks=True)
 	cbar = add_colorbar(im)
-	cbar.set_label("Throughput [Gbit/sec]")
+	cbar.set_label("Throughput [Gbit/sec]" + (f"\ncells: {spread_label}" if spread_label else ""))
 	plt.rcParams['axes.titley'] = 1.075  # y is in axes-relative coordinates.
 
-	ax.set_xticks(np.arange(len(ct.columns)), labels=ct.columns)
-	ax.set_yticks(np.arange(len(ct.columns)), labels=ct.columns)
 	ax.xaxis.tick_top()
 
 	fig.tight_layout()
+	if save:
+		plt.savefig(file_path / "figures" / f"{name}.pdf")
+	else: plt.show()
+	plt.close(fig)
+
+def plot_timeseries(measurement_dir: str, name: str, save: bool = False):
+	"""pair × interval throughput relative to each pair's steady state, outlier intervals marked"""
+	campaign = iperf_ingest.load_campaign(file_path.parent / "data" / measurement_dir)
+	with profiling.stage("aggregate", function="iperf_timeseries.analyse"):
+		analysis = iperf_timeseries.analyse(campaign)
+	pairs = analysis.pairs
+	relative = analysis.throughput / analysis.steady[:, None]
+
+	fig, ax = plt.subplots(figsize=(16,12))
+	fig: plt.Figure
+	ax: plt.Axes
+
+	im = ax.imshow(relative, aspect="auto", cmap="RdBu", vmin=.9, vmax=1.1, interpolation="none")
+	rows, columns = np.nonzero(analysis.outliers)
+	ax.scatter(columns, rows, marker="x", color="black", s=40)
+	cbar = add_colorbar(im)
+	cbar.set_label("Throughput / steady state")
+
+	ax.set_yticks(np.arange(len(pairs)), labels=[
+		f"{s}→{c} ({stability:.2f})" for s, c, stability in zip(pairs["server"], pairs["client"], pairs["stability"])],
+		fontsize=12)
+	ax.set_xlabel("Interval (after omitted)")
+
+	fig.tight_layout()
+	if save:
+		plt.savefig(file_path / "figures" / f"{name}.pdf")
+	else: plt.show()
+	plt.close(fig)
+
+@profiling.timed("aggregate")
+def load_congestion(measurement_dir: str, isolated_dir: str = None) -> dict[str, iperf_congestion.Congestion]:
+	"""All patterns of a congestion campaign, with the slowdown against the pair campaign `isolated_dir`"""
+	isolated = load_heatmap(isolated_dir)[0] if isolated_dir else None
+	return iperf_congestion.load(file_path.parent / "data" / measurement_dir, isolated)
+
+def plot_congestion(congestion: dict[str, iperf_congestion.Congestion], name: str, save: bool = False):
+	"""Aggregate throughput on the shared clock, per-flow throughput with Jain's index and slowdown, per pattern"""
+	fig, (ax_time, ax_flows, ax_slowdown) = plt.subplots(1, 3, figsize=(24,8))
+	fig: plt.Figure
+	patterns = list(congestion)
+	positions = np.arange(len(patterns))
+
+	for pattern, c in congestion.items():
+		ax_time.plot(c.clock, c.aggregate, drawstyle="steps-post", label=f"{pattern}: {c.total_gbps:.1f}")
+	ax_time.set_xlabel("Time since common start [s]")
+	ax_time.set_ylabel("Aggregate Throughput [Gbit/sec]")
+	ax_time.legend(title="Total [Gbit/sec]", fontsize=16, title_fontsize=16)
+	ax_time.grid()
+
+	ax_flows.boxplot([c.flows["mean_gbps"] for c in congestion.values()], positions=positions, widths=.5)
+	for position, c in zip(positions, congestion.values()):
+		ax_flows.scatter(np.full(len(c.flows), position), c.flows["mean_gbps"], s=12, alpha=.5)
+		ax_flows.annotate(f"J={c.fairness:.2f}", (position, 1), xycoords=("data", "axes fraction"),
+		                  xytext=(0, -8), textcoords="offset points", ha="center", va="top", fontsize=16)
+	ax_flows.set_ylabel("Flow Throughput [Gbit/sec]")
+	ax_flows.set_ylim(0, ax_flows.get_ylim()[1] * 1.15)
+
+	if all("slowdown" in c.flows for c in congestion.values()):
+		ax_slowdown.boxplot([c.flows["slowdown"].dropna() for c in congestion.values()], positions=positions, widths=.5)
+		ax_slowdown.axhline(1, color="grey", linestyle="--", linewidth=1)
+		ax_slowdown.set_ylabel("Slowdown vs. Isolated Pair")
+	else:
+		ax_slowdown.set_axis_off()
+	for ax in (ax_flows, ax_slowdown):
+		ax.set_xticks(positions, labels=patterns, rotation=30, ha="right")
+		ax.grid(axis="y")
+
+	fig.tight_layout()
+	if save:
+		plt.savefig(file_path / "figures" / f"{name}.pdf")
+	else: plt.show()
+	plt.close(fig)
+
+def plot_slowdown(c: iperf_congestion.Congestion, name: str, save: bool = False):
+	"""server × client slowdown of one pattern against the isolated pair heatmap"""
+	fig, ax = plt.subplots(figsize=(12,12))
+	fig: plt.Figure
+	ax: plt.Axes
+
+	ct = c.flows.pivot(index="server", columns="client", values="slowdown")
+	im = heatmap.plot(ax, ct, ticks=True, cmap="viridis")
+	cbar = add_colorbar(im)
+	cbar.set_label(f"Slowdown vs. Isolated Pair ({c.pattern})")
+	ax.xaxis.tick_top()
+
+	fig.tight_layout()
+	if save:
+		plt.savefig(file_path / "figures" / f"{name}.pdf")
+	else: plt.show()
+	plt.close(fig)
+
+def figures(save: bool = True) -> dict[str, Callable[[], None]]:
+	"""Figures of this script by output name, see `common/render.py`"""
 	if not (file_path / "figures").is_dir():
 		(file_path / "figures").mkdir(parents=True)
-	plt.savefig(file_path / "figures" / "iperf3_frontend.pdf")
+
+	date = "23-11-03T1352"
+	measurement_dir = f"measurements_iperf_{date}"
+
+	## Example for a congestion campaign (`measurement_src/congestion.py`), slowdown against the pair campaign
+	# congestion = load_congestion("measurements_congestion_<timestamp>", isolated_dir=measurement_dir)
+
+	return {
+		"iperf3_frontend": partial(plot_heatmap, *load_heatmap(measurement_dir),
+			name="iperf3_frontend", save=save),
+		"iperf3_frontend_ci": partial(plot_heatmap, *load_heatmap(measurement_dir, spread="ci"),
+			name="iperf3_frontend_ci", save=save, spread_label="mean ± 95% CI (5 s block bootstrap)"),
+		"iperf3_frontend_timeseries": partial(plot_timeseries, measurement_dir,
+			name="iperf3_frontend_timeseries", save=save),
+		# "iperf3_congestion": partial(plot_congestion, congestion, name="iperf3_congestion", save=save),
+		# "iperf3_congestion_slowdown": partial(plot_slowdown, congestion["all-to-all"],
+		# 	name="iperf3_congestion_slowdown", save=save),
+	}
+
+def main():
+	for render in figures(save=True).values():
+		render()
 
 if __name__ == "__main__": main()
\ No newline at end of file
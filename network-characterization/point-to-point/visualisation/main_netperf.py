@@ -1,11 +1,23 @@
+import argparse
+import sys
+
 import pandas as pd
 import numpy as np
 import matplotlib
 import matplotlib.pyplot as plt
 from pathlib import Path
+from functools import partial
+from typing import Callable
 
 from mpl_toolkits import axes_grid1
 
+sys.path.append(str(Path(__file__).resolve().parents[3] / "common"))
+import heatmap
+import measurement_cache
+import profiling
+
+import netperf_ingest
+
 pd.options.display.width = 1920
 pd.options.display.max_columns = 99
 
@@ -24,15 +36,16 @@ def add_colorbar(im, aspect=20, pad_fraction=0.5, **kwargs):
 	plt.sca(current_ax)
 	return im.axes.figure.colorbar(im, cax=cax, **kwargs)
 
-def main():
-	file_path = Path(__file__).parent
-	basepath = file_path.parent / "data"
+file_path = Path(__file__).parent
 
-	date = "23-11-03T1606"
-	measurement_dir = f"measurements_netperf_{date}"
+@profiling.timed("aggregate")
+def load_heatmap(measurement_dir: str) -> tuple[pd.DataFrame, pd.DataFrame]:
+	"""server × client mean and standard deviation of the TCP_RR latency [μs]"""
+	basepath = file_path.parent / "data"
 
 	measurement_file = list(filter(lambda x: x.suffix == ".csv", (basepath/measurement_dir).iterdir()))[0]
-	df = pd.read_csv(measurement_file, sep=";")
+	df = measurement_cache.load(measurement_file, lambda f: pd.read_csv(f, sep=";"),
+		parser="netperf", version=1, campaign=measurement_dir, benchmark="netperf")
 	df.rename(columns={"from":"server", "to":"client"}, inplace=True)
 	metric = "mean_latency"
 
@@ -40,37 +53,116 @@ def main():
 					 values=df[metric], aggfunc="first")
 	ct_std = pd.crosstab(index=df["server"], columns=df["client"],
 					 values=df["stddev_latency"], aggfunc="first")
+	return ct, ct_std
+
+def quantile_heatmap(df: pd.DataFrame, histograms: dict, q: float) -> pd.DataFrame:
+	"""server × client latency [μs] at quantile `q` of a campaign loaded by `netperf_ingest.load_campaign`"""
+	return pd.crosstab(index=df["server"], columns=df["client"],
+	                   values=netperf_ingest.quantiles(df, histograms, q), aggfunc="first")
+
+def load_quantile_heatmap(measurement_dir: str, q: float) -> pd.DataFrame:
+	"""server × client latency [μs] at quantile `q`, from the per-pair netperf outputs"""
+	return quantile_heatmap(*netperf_ingest.load_campaign(file_path.parent / "data" / measurement_dir), q)
+
+def plot_heatmap(ct: pd.DataFrame, ct_std: pd.DataFrame, name: str, save: bool = False, label: str = "Latency [μs]"):
 	fig, ax = plt.subplots(figsize=(12,12))
 	fig: plt.Figure
 	ax: plt.Axes
 
-	im = ax.imshow(ct)
-
-	def _format(input: float) -> str:
-		if np.isnan(input): return ""
-		rounded = round(input, 2)
-		return str(rounded)
-
-	textcolors = ["white", "black"]
-	threshold = 0.5
-	for i in range(len(ct.columns)):
-		for j in range(len(ct.columns)):
-			try:
-				datum = ct.iloc[i,j]
-				color = textcolors[int(im.norm(datum) > threshold)]
-				ax.text(j,i, f"{_format(datum)}\n±{_format(ct_std.iloc[i,j])}", 
-					ha="center",va="center", color=color)
-			except Exception as e: print(e)
+	im = heatmap.plot(ax, ct, ct_std, ticks=True)
 	cbar = add_colorbar(im)
-	cbar.set_label("Latency [μs]")
+	cbar.set_label(label)
 	plt.rcParams['axes.titley'] = 1.075  # y is in axes-relative coordinates.
-	ax.set_xticks(np.arange(len(ct.columns)), labels=ct.columns)
-	ax.set_yticks(np.arange(len(ct.columns)), labels=ct.columns)
 	ax.xaxis.tick_top()
 
 	fig.tight_layout()
+	if save:
+		plt.savefig(file_path / "figures" / f"{name}.pdf")
+	else: plt.show()
+	plt.close(fig)
+
+def plot_cdf(measurement_dir: str, name: str, save: bool = False, pairs: list[tuple[str, str]] = None, campaign: tuple = None):
+	"""
+	Latency CDF per server/client pair (default: all), from the netperf histograms.
+	Pairs without a histogram show their measured quantiles (min, P50, P90, P99, max) as markers.
+	`campaign`: the result of `netperf_ingest.load_campaign` if already loaded.
+	"""
+	df, histograms = campaign or netperf_ingest.load_campaign(file_path.parent / "data" / measurement_dir)
+	fig, ax = plt.subplots(figsize=(16,10))
+	fig: plt.Figure
+	ax: plt.Axes
+
+	points = {"min_latency": 0., "p50_latency": .5, "p90_latency": .9, "p99_latency": .99, "max_latency": 1.}
+	for _, row in df.iterrows():
+		pair = (row["server"], row["client"])
+		if pairs and pair not in pairs: continue
+		if pair in histograms:
+			latency, cdf = histograms[pair].cdf()
+			ax.step(latency, cdf, where="post", label=f"{pair[0]}→{pair[1]}")
+		elif "p50_latency" in row:
+			measured = [f for f in points if f in row and not np.isnan(row[f])]
+			ax.plot([row[f] for f in measured], [points[f] for f in measured], marker="o", label=f"{pair[0]}→{pair[1]}")
+
+	ax.set_xscale("log")
+	ax.set_xlabel("Latency [μs]")
+	ax.set_ylabel("Fraction of transactions")
+	ax.grid(True, which="both", alpha=.3)
+	ax.legend(fontsize=12, ncols=2)
+
+	fig.tight_layout()
+	if save:
+		plt.savefig(file_path / "figures" / f"{name}.pdf")
+	else: plt.show()
+	plt.close(fig)
+
+def percentile_figures(measurement_dir: str, prefix: str, quantiles: list[float], save: bool = True) -> dict[str, Callable[[], None]]:
+	"""Quantile heatmaps and latency CDF of a campaign measured with percentile fields or histograms"""
+	df, histograms = netperf_ingest.load_campaign(file_path.parent / "data" / measurement_dir)
+	if not histograms and netperf_ingest.quantile_field(.5) not in df.columns:
+		return {}
+	renders = {}
+	for q in quantiles:
+		name = f"{prefix}_{netperf_ingest.quantile_field(q).removesuffix('_latency')}"
+		renders[name] = partial(plot_heatmap, quantile_heatmap(df, histograms, q), None,
+			name=name, save=save, label=f"P{100 * q:g} Latency [μs]")
+	renders[f"{prefix}_cdf"] = partial(plot_cdf, measurement_dir, name=f"{prefix}_cdf", save=save, campaign=(df, histograms))
+	return renders
+
+def figures(save: bool = True) -> dict[str, Callable[[], None]]:
+	"""Figures of this script by output name, see `common/render.py`"""
 	if not (file_path / "figures").is_dir():
 		(file_path / "figures").mkdir(parents=True)
-	plt.savefig("figures/netperf_frontend.pdf")
+
+	date = "23-11-03T1606"
+	measurement_dir = f"measurements_netperf_{date}"
+
+	return {
+		"netperf_frontend": partial(plot_heatmap, *load_heatmap(measurement_dir),
+			name="netperf_frontend", save=save),
+		**percentile_figures(measurement_dir, prefix="netperf_frontend", quantiles=[.5, .99, .999], save=save),
+	}
+
+def main():
+	parser = argparse.ArgumentParser(description="netperf TCP_RR latency heatmaps, all figures if no view is selected")
+	parser.add_argument("--campaign", default=None, help="measurement folder in data/, e.g. measurements_netperf_23-11-03T1606")
+	parser.add_argument("--quantile", type=float, default=None, help="heatmap of this latency quantile, e.g. 0.99")
+	parser.add_argument("--cdf", nargs="*", metavar="SERVER_CLIENT", default=None, help="latency CDF of these pairs (default: all)")
+	parser.add_argument("--save", action="store_true", help="save into figures/ instead of showing")
+	args = parser.parse_args()
+
+	if args.quantile is None and args.cdf is None:
+		for render in figures(save=True).values():
+			render()
+		return
+	if args.campaign is None:
+		parser.error("--quantile and --cdf require --campaign")
+	prefix = args.campaign.removeprefix("measurements_")
+	if args.quantile is not None:
+		name = f"{prefix}_{netperf_ingest.quantile_field(args.quantile).removesuffix('_latency')}"
+		plot_heatmap(load_quantile_heatmap(args.campaign, args.quantile), None, name=name,
+			save=args.save, label=f"P{100 * args.quantile:g} Latency [μs]")
+	if args.cdf is not None:
+		plot_cdf(args.campaign, name=f"{prefix}_cdf", save=args.save,
+			pairs=[tuple(pair.split("_")) for pair in args.cdf] or None)
 
 if __name__ == "__main__": main()
\ No newline at end of file
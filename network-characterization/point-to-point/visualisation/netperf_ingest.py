@@ -0,0 +1,102 @@
+"""
+Parser for the per-pair netperf TCP_RR outputs (`*_<server>_<client>.txt`).
+
+A netperf output is the test banner, one line of omni output selector headers, one line of values
+and, with `-v 2` and a netperf built with `--enable-histogram`, the histogram of the transaction times.
+Latency quantiles not measured by netperf (e.g. P99.9) are interpolated from the histogram.
+"""
+import re
+from dataclasses import dataclass
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+# omni output selector -> header printed by netperf
+FIELDS = {
+	"min_latency": "Minimum Latency Microseconds",
+	"mean_latency": "Mean Latency Microseconds",
+	"max_latency": "Maximum Latency Microseconds",
+	"stddev_latency": "Stddev Latency Microseconds",
+	"p50_latency": "50th Percentile Latency Microseconds",
+	"p90_latency": "90th Percentile Latency Microseconds",
+	"p99_latency": "99th Percentile Latency Microseconds",
+	"transaction_rate": "Transaction Rate Tran/s",
+}
+
+# histogram row -> bucket width [μs], every row has 10 buckets
+HISTOGRAM_ROWS = {
+	"UNIT_USEC": 1, "TEN_USEC": 10, "HUNDRED_USEC": 100,
+	"UNIT_MSEC": 1e3, "TEN_MSEC": 1e4, "HUNDRED_MSEC": 1e5,
+	"UNIT_SEC": 1e6, "TEN_SEC": 1e7,
+}
+
+@dataclass
+class Histogram:
+	lower: np.ndarray  # bucket bounds [μs], sorted
+	upper: np.ndarray
+	counts: np.ndarray
+
+	def cdf(self) -> tuple[np.ndarray, np.ndarray]:
+		"""Upper bucket bounds [μs] and the fraction of transactions at or below them"""
+		return self.upper, np.cumsum(self.counts) / self.counts.sum()
+
+	def quantile(self, q: float) -> float:
+		"""Latency [μs] at quantile `q`, linear within the bucket"""
+		upper, cdf = self.cdf()
+		i = min(np.searchsorted(cdf, q), len(cdf) - 1)
+		below = cdf[i-1] if i > 0 else 0.
+		return self.lower[i] + (upper[i] - self.lower[i]) * (q - below) / max(cdf[i] - below, 1e-12)
+
+@dataclass
+class NetperfResult:
+	values: dict[str, float] # by output selector, unknown headers by the header
+	histogram: Histogram = None
+
+
+def parse(text: str) -> NetperfResult:
+	lines = [line.strip() for line in text.strip().splitlines()]
+	banner = next((i for i, line in enumerate(lines) if "TEST" in line and " from " in line), None)
+	if banner is None or banner + 2 >= len(lines):
+		raise ValueError("no netperf test banner followed by headers and values")
+	headers, values = lines[banner + 1].split(","), lines[banner + 2].split(",")
+	if len(headers) != len(values):
+		raise ValueError(f"{len(headers)} headers but {len(values)} values")
+	names = {header: name for name, header in FIELDS.items()}
+	result = NetperfResult({names.get(h, h): float(v) for h, v in zip(headers, values)})
+
+	buckets = []
+	for line in lines:
+		row, _, counts = line.partition(":")
+		if row.strip() in HISTOGRAM_ROWS:
+			width = HISTOGRAM_ROWS[row.strip()]
+			buckets += [(i * width, (i + 1) * width, int(c)) for i, c in enumerate(counts.split(":"))]
+		elif row.strip() == ">100_SECS":
+			buckets.append((1e8, np.inf, int(counts)))
+	if buckets:
+		# the first bucket of a row overlaps the row before and is always empty
+		lower, upper, counts = np.array(sorted(b for b in buckets if b[2] > 0), dtype=float).reshape(-1, 3).T
+		result.histogram = Histogram(lower=lower, upper=upper, counts=counts)
+	return result
+
+def load_campaign(measurement_dir: Path) -> tuple[pd.DataFrame, dict[tuple[str, str], Histogram]]:
+	"""Values per (server, client) pair and the histograms of the pairs that have one"""
+	rows, histograms = [], {}
+	for file in sorted(measurement_dir.glob("*.txt")):
+		server, client = file.stem.split("_")[-2:]
+		result = parse(file.read_text())
+		rows.append({"server": server, "client": client, **result.values})
+		if result.histogram is not None and result.histogram.counts.sum() > 0:
+			histograms[(server, client)] = result.histogram
+	return pd.DataFrame(rows), histograms
+
+def quantile_field(q: float) -> str:
+	"""Output selector of a quantile, e.g. .99 -> `p99_latency`"""
+	return f"p{100 * q:g}".replace(".", "_") + "_latency"
+
+def quantiles(df: pd.DataFrame, histograms: dict[tuple[str, str], Histogram], q: float) -> pd.Series:
+	"""Latency [μs] at quantile `q` per pair: measured by netperf if selected, else from the histogram"""
+	if quantile_field(q) in df.columns:
+		return df[quantile_field(q)]
+	return pd.Series([histograms[(s, c)].quantile(q) if (s, c) in histograms else np.nan
+	                  for s, c in zip(df["server"], df["client"])], index=df.index)
@@ -0,0 +1,223 @@
+"""
+Parameter sweeps of the raw CXI benchmarks, the multi-dimensional counterpart of `benchmark_cxi.sh`.
+
+`benchmark_cxi.sh` runs every test once with its default configuration. The tests print their configuration in
+the parameter block of their output (`List Size`, `IDC`, `Rendezvous PUTs`, `Hugepages`, ...), and this driver runs
+every test for all combinations of the swept parameters that the test has (`APPLIES`), e.g. `cxi_send_bw` with and
+without hugepages and rendezvous PUTs. Parameters that a test does not have are left out of its grid.
+
+Every run is a unit of a campaign manifest (see `common/campaign.py`), so `--resume <campaign folder>` reruns only
+missing or failed runs. Runs are sequential, like in `benchmark_cxi.sh`: the server is started on the first node,
+the client on the second node connects to the Slingshot address of the server.
+
+Output: `measurements_<timestamp>/` with one `<stem>_<test>_c<k>.dat` per configuration `k` of a test and
+`<stem>_sweep.csv` (`test;config;<parameter>...`) for reference. The parameter block of every output is what the
+analysis reads (`visualisation/cxi_cube.py`), so a configuration the installed libcxi ignores shows up as such.
+
+The command line options of the parameters are in `OPTIONS`, check them against `<test> --help` of the installed
+libcxi version.
+
+Usage: `python cxi_sweep.py [--tests cxi_send_bw ...] [--sweep "Hugepages=Disabled,2M" "List Size=64,256" ...] [--resume DIR]`
+"""
+import argparse
+import asyncio
+import itertools
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parents[3] / "common"))
+import campaign
+import remote
+
+# nodes/hosts differentiation is a workaround for pending DNS/hosts entries
+NODES = ["10.97.3.1", "10.97.3.2"]
+NODES_SL = ["10.115.3.1", "10.115.3.2"]
+
+CXI_BASEPATH = "/opt/libcxi/bin"
+CXI_TESTS = ["cxi_read_bw", "cxi_write_bw", "cxi_send_bw", "cxi_read_lat", "cxi_write_lat", "cxi_send_lat"]
+CXI_CLIENT_ARGS = "--size=1:4194304"
+
+# parameter (as printed in the parameter block) -> option: a format string for numeric values,
+# or the option of every value, "" for the default
+OPTIONS = {
+	"List Size": "--list-size={}",
+	"RDMA Buf Align": "--buf-align={}",
+	"IDC": {"Enabled": "", "Disabled": "--no-idc"},
+	"HRP": {"Enabled": "", "Disabled": "--no-hrp"},
+	"Bidirectional": {"Disabled": "", "Enabled": "--bidirectional"},
+	"Rendezvous PUTs": {"Disabled": "", "Enabled": "--use-rdzv"},
+	"Restricted": {"Enabled": "", "Disabled": "--unrestricted"},
+	"LL Cmd Launch": {"Enabled": "", "Disabled": "--no-ll"},
+	"Hugepages": {"Disabled": "", "2M": "--use-hp=2M", "1G": "--use-hp=1G"},
+}
+
+# parameters in the parameter block of every test (libcxi 2.0.0)
+APPLIES = {
+	"cxi_read_bw": ["List Size", "Restricted", "Bidirectional", "RDMA Buf Align", "Hugepages"],
+	"cxi_write_bw": ["List Size", "HRP", "IDC", "Restricted", "Bidirectional", "RDMA Buf Align", "Hugepages"],
+	"cxi_send_bw": ["List Size", "IDC", "Bidirectional", "Rendezvous PUTs", "RDMA Buf Align", "Hugepages"],
+	"cxi_read_lat": ["Restricted", "LL Cmd Launch", "Hugepages"],
+	"cxi_write_lat": ["IDC", "Restricted", "LL Cmd Launch", "Hugepages"],
+	"cxi_send_lat": ["IDC", "LL Cmd Launch", "Rendezvous PUTs", "Hugepages"],
+}
+
+SWEEP = {"Hugepages": ["Disabled", "2M"], "Rendezvous PUTs": ["Disabled", "Enabled"], "IDC": ["Enabled", "Disabled"]}
+
+
+def parse_sweep(specs: list[str]) -> dict[str, list[str]]:
+	"""`NAME=V1,V2` per parameter"""
+	sweep = {}
+	for spec in specs:
+		name, _, values = spec.partition("=")
+		if name not in OPTIONS or not values:
+			raise ValueError(f"invalid sweep {spec!r}, expected NAME=V1,V2 with NAME one of {', '.join(OPTIONS)}")
+		sweep[name] = values.split(",")
+	return sweep
+
+def describe(sweep: dict[str, list[str]]) -> str:
+	return " ".join(f"{name}={','.join(values)}" for name, values in sweep.items())
+
+def configurations(test: str, sweep: dict[str, list[str]]) -> list[dict[str, str]]:
+	"""All combinations of the swept parameters of `test`, in a fixed order (the `k` of the output files)"""
+	names = [name for name in sweep if name in APPLIES[test]]
+	return [dict(zip(names, values)) for values in itertools.product(*(sweep[name] for name in names))]
+
+def options(config: dict[str, str]) -> str:
+	args = []
+	for name, value in config.items():
+		option = OPTIONS[name]
+		if isinstance(option, str):
+			args.append(option.format(value))
+		elif value not in option:
+			raise ValueError(f"no option for {name}: {value}, known: {', '.join(option)}")
+		elif option[value]:
+			args.append(option[value])
+	return " ".join(args)
+
+def valid(output: str) -> bool:
+	"""Parameter block, result header and at least one result line, each delimited by `---` lines"""
+	lines = output.splitlines()
+	return sum(line.startswith("---") for line in lines) >= 3 and any(line.strip()[:1].isdigit() for line in lines)
+
+
+class CXISweep:
+	def __init__(self, tests: list[str], sweep: dict[str, list[str]], outdir: Path, runner: remote.Runner,
+				 nodes: list[str], nodes_sl: list[str], cxi_basepath: str = CXI_BASEPATH,
+				 client_args: str = CXI_CLIENT_ARGS, cpu: int = 4, timeout: float = 180, startup: float = 1, resume: Path = None):
+		self.tests, self.sweep, self.runner, self.timeout, self.startup = tests, sweep, runner, timeout, startup
+		self.cpu = cpu
+		self.nodes, self.nodes_sl, self.cxi_basepath, self.client_args = nodes, nodes_sl, cxi_basepath, client_args
+		self.stem = resume.name if resume else f"measurements_{datetime.now().strftime('%y-%m-%dT%H%M')}"
+		self.outdir = resume or outdir / self.stem
+		self.manifest = campaign.Manifest(self.outdir / f"{self.stem}_manifest.json")
+
+	def commands(self, test: str, config: dict[str, str]) -> tuple[str, str]:
+		"""Server and client command of one run"""
+		executable = f"taskset -c {self.cpu} {self.cxi_basepath}/{test} {options(config)}".rstrip()
+		return executable, f"{executable} {self.client_args} {self.nodes_sl[0]}"
+
+	def plan(self) -> list[tuple[str, dict[str, str], campaign.Unit]]:
+		runs = []
+		for test in self.tests:
+			for k, config in enumerate(configurations(test, self.sweep)):
+				runs.append((test, config, campaign.Unit(id=f"{test}_c{k}", benchmark=test, host_set="infra",
+				                                         output=f"{self.stem}_{test}_c{k}.dat",
+				                                         pair=[self.nodes[0], self.nodes[1]])))
+		return runs
+
+	async def write_meta(self, runs: list[tuple[str, dict[str, str], campaign.Unit]]):
+		meta = self.outdir / f"{self.stem}_meta.md"
+		if meta.is_file(): # resumed campaign
+			with open(meta, "a") as outfile:
+				outfile.write(f"Resumed: `{datetime.now().strftime('%c')} ({int(time.time())})`\n")
+			return
+		version = await self.runner.run(self.nodes[0], f"{self.cxi_basepath}/{self.tests[0]} --version", timeout=30)
+		meta.write_text("\n".join([
+			f"Measurement Start Timestamp: `{datetime.now().strftime('%c')} ({int(time.time())})`",
+			f"Client Arguments: `{self.client_args}`",
+			f"Nodes: {','.join(self.nodes)},",
+			f"Measurement tools: {','.join(self.tests)}, (Version: `{version.stdout.strip()}`)",
+			f"Sweep: `{describe(self.sweep)}`",
+		]) + "\n")
+		with open(self.outdir / f"{self.stem}_sweep.csv", "w") as outfile:
+			outfile.write(";".join(["test", "config", *self.sweep]) + "\n")
+			for test, config, unit in runs:
+				outfile.write(";".join([test, unit.id.rsplit("_", 1)[1], *(config.get(name, "") for name in self.sweep)]) + "\n")
+
+	async def run_one(self, test: str, config: dict[str, str], unit: campaign.Unit):
+		server_command, client_command = self.commands(test, config)
+		server = asyncio.create_task(self.runner.run(self.nodes[0], server_command, timeout=self.timeout + 2 * self.startup))
+		try:
+			await asyncio.sleep(self.startup)
+			result = await self.runner.run(self.nodes[1], client_command, timeout=self.timeout,
+			                               stdout=self.manifest.start(unit))
+			await asyncio.wait([server], timeout=5)
+		finally:
+			server.cancel()
+			await asyncio.gather(server, return_exceptions=True)
+		if result.timed_out:
+			self.manifest.fail(unit, f"timeout after {self.timeout}s")
+		elif not valid(self.manifest.partial(unit).read_text()):
+			self.manifest.fail(unit, f"exit code {result.returncode}: {result.stderr.strip()}")
+		else:
+			self.manifest.complete(unit)
+
+	async def run(self):
+		self.outdir.mkdir(parents=True, exist_ok=True)
+		runs = self.plan()
+		self.manifest.plan([unit for _, _, unit in runs])
+		todo = [(test, config, self.manifest.units[unit.id]) for test, config, unit in runs
+		        if not self.manifest.is_done(self.manifest.units[unit.id])]
+		await self.write_meta(runs)
+
+		# one run at a time, they share the NICs
+		for i, (test, config, unit) in enumerate(todo):
+			print(f"[{i+1}/{len(todo)}] {test} {options(config) or '(defaults)'}")
+			await self.run_one(test, config, unit)
+			if unit.status == campaign.FAILED:
+				print(f"{unit.id}: {unit.error}")
+		print(self.manifest.summary())
+
+
+def main():
+	parser = argparse.ArgumentParser(description="Run the CXI benchmarks for all combinations of swept parameters")
+	parser.add_argument("--tests", nargs="+", choices=CXI_TESTS, default=CXI_TESTS)
+	parser.add_argument("--sweep", nargs="+", default=None,
+	                    help=f"NAME=V1,V2 per parameter (default: {describe(SWEEP)})")
+	parser.add_argument("--nodes", nargs=2, default=NODES, help="server and client node")
+	parser.add_argument("--nodes-sl", nargs=2, default=NODES_SL, help="their Slingshot addresses")
+	parser.add_argument("--cxi-basepath", default=CXI_BASEPATH)
+	parser.add_argument("--client-args", default=CXI_CLIENT_ARGS)
+	parser.add_argument("--cpu", type=int, default=4, help="core the benchmarks are pinned to")
+	parser.add_argument("--timeout", type=float, default=180, help="[s] per run")
+	parser.add_argument("--dry-run", action="store_true", help="print the commands of all runs")
+	parser.add_argument("--local", action="store_true", help="run all commands as local subprocesses instead of via ssh")
+	parser.add_argument("--outdir", type=Path, default=Path.cwd())
+	parser.add_argument("--resume", type=Path, default=None, help="campaign folder of an interrupted sweep, runs its missing and failed runs")
+	args = parser.parse_args()
+
+	try:
+		sweep = parse_sweep(args.sweep) if args.sweep else SWEEP
+		for test in args.tests:
+			for config in configurations(test, sweep):
+				options(config)
+	except ValueError as e:
+		parser.error(str(e))
+
+	if args.dry_run:
+		sweep_ = CXISweep(args.tests, sweep, args.outdir, None, args.nodes, args.nodes_sl, args.cxi_basepath, args.client_args, args.cpu)
+		for test, config, unit in sweep_.plan():
+			server_command, client_command = sweep_.commands(test, config)
+			print(f"{unit.output}\n  {args.nodes[0]}: {server_command}\n  {args.nodes[1]}: {client_command}")
+		return
+
+	async def run():
+		backend = remote.LocalBackend() if args.local else remote.SSHBackend()
+		async with remote.Runner(backend) as runner:
+			await CXISweep(args.tests, sweep, args.outdir, runner, args.nodes, args.nodes_sl, args.cxi_basepath,
+			               args.client_args, cpu=args.cpu, timeout=args.timeout, resume=args.resume).run()
+	campaign.run(run)
+
+if __name__ == "__main__": main()
@@ -5,9 +5,18 @@ import matplotlib.ticker
 import matplotlib.patheffects
 import matplotlib.pyplot as plt
 from dataclasses import dataclass
+from functools import partial
+from typing import Callable
 
-import re 
-import io 
+import argparse
+import sys
+
+sys.path.append(str(Path(__file__).resolve().parents[3] / "common"))
+import alpha_beta
+import bootstrap
+import result_blocks
+
+import cxi_cube
 
 matplotlib.rc('font', **{
 	'family' : 'sans',
@@ -20,6 +29,15 @@ class Measurement:
 	name: str
 	df: pd.DataFrame
 	mtype: str
+	ci: bootstrap.Interval = None # of all columns, see `merge_repeats`
+	blocks: result_blocks.Blocks = None # repeat × size × metric of the raw file
+
+COLUMNS = {"latency": "Mean[us]", "bandwidth": "BW[MB/s]"}
+
+def merge_repeats(repeats: [Measurement], level: float = .95) -> Measurement:
+	"""Mean of repeated runs of one benchmark, with the bootstrap confidence interval of every column"""
+	ci = bootstrap.interval([m.df for m in repeats], level=level)
+	return Measurement(name=repeats[0].name, df=ci.estimate, mtype=repeats[0].mtype, ci=ci)
 
 def plot_multiple(measurements: [Measurement], 
 	ylabel: str, 
@@ -30,14 +48,18 @@ def plot_multiple(measurements: [Measurement],
 	plt.rcParams['axes.titley'] = 1.075 
 
 	for measurement in measurements:
-		if measurement.mtype == "latency":
-			ax.errorbar(measurement.df.index, measurement.df["Mean[us]"],
-				yerr=measurement.df["StdDev[us]"], label=measurement.name)
-		elif measurement.mtype == "bandwidth":
-			ax.plot(measurement.df.index, measurement.df["BW[MB/s]"], label=measurement.name)
-		else:
+		if measurement.mtype not in COLUMNS:
 			print("Measurement Type not recognised!")
 			return
+		column = COLUMNS[measurement.mtype]
+		if measurement.ci is not None: # repeated runs: confidence band of the mean
+			lines = ax.plot(measurement.df.index, measurement.df[column], label=measurement.name)
+			bootstrap.band(ax, measurement.df.index, measurement.ci.column(column), color=lines[0].get_color())
+		elif measurement.mtype == "latency":
+			ax.errorbar(measurement.df.index, measurement.df[column],
+				yerr=measurement.df["StdDev[us]"], label=measurement.name)
+		else:
+			ax.plot(measurement.df.index, measurement.df[column], label=measurement.name)
 
 	ax.set_xlabel("Size [B]")
 	ax.set_ylabel(ylabel)
@@ -68,39 +90,65 @@ def plot_multiple(measurements: [Measurement],
 	if save:
 		plt.savefig(basepath / "figures" / f"{name}.pdf")
 	else: plt.show()
+	plt.close(fig)
+
+def plot_gain(cube: cxi_cube.ResultCube, dim: str, baseline: str, metric: str, name: str = "", save: bool = False):
+	"""Gain of the values of `dim` over `baseline` per message size (see `ResultCube.gain`), one line per configuration"""
+	gain = cube.gain(dim, baseline, metric)
+	fig, ax = plt.subplots(figsize=(9, 9))
+	for value in gain.columns:
+		curves = gain[value].unstack("Size[B]").dropna(how="all")
+		for labels, curve in curves.iterrows():
+			labels = labels if isinstance(labels, tuple) else (labels,)
+			ax.plot(curve.index, curve, marker=".", label=", ".join([f"{cube.level(dim)} {value}",
+				*(str(l) if n in ("operation", "kind") else f"{n} {l}" for n, l in zip(curves.index.names, labels))]))
+	ax.axhline(1, color="black", lw=1)
 
-def load_measurements(basepath_measurements: Path, ts: str) -> dict[str,Measurement]:
-	pattern_header_split = re.compile(r"(.*?)(?>  +|$)")
-	pattern_remove_first_prefix = re.compile(r"^\s+", flags=re.MULTILINE)
-	pattern_to_csv = re.compile(" +", flags=re.MULTILINE)
+	ax.set_xlabel("Size [B]")
+	ax.set_ylabel(f"Gain over {baseline} ({metric})")
+	ax.set_xscale("log", base=2)
+	ax.grid("x")
+	ax.grid("y")
+	ax.xaxis.set_major_formatter(matplotlib.ticker.StrMethodFormatter(r"{x:.0f}"))
+	ax.xaxis.set_major_locator(matplotlib.ticker.LogLocator(base=2, numticks=len(cube.coords("Size[B]"))))
+	plt.setp(ax.get_xticklabels(), rotation=45, ha="right", size=18)
+	plt.legend(fontsize=14)
+	fig.tight_layout()
+	if save:
+		plt.savefig(basepath / "figures" / f"{name}.pdf")
+	else: plt.show()
+	plt.close(fig)
+
+def from_blocks(blocks: result_blocks.Blocks, name: str, mtype: str) -> Measurement:
+	"""Measurement of a result file, repeated runs appended to it (several blocks) merged"""
+	repeats = [Measurement(name=name, df=df, mtype=mtype) for df in blocks.frames()]
+	measurement = repeats[0] if len(repeats) == 1 else merge_repeats(repeats)
+	measurement.blocks = blocks
+	return measurement
 
+def load_measurements(basepath_measurements: Path, ts: str) -> dict[str,Measurement]:
 	measurements = {}
 	for file in list(filter(lambda x: x.suffix == ".dat", (basepath_measurements / ts).iterdir())):
-		with open(file, "r") as infile:
-			lines = infile.read()
-
-			# get lines starting with '--- [...]' and their index
-			#  data lies between second and third '---' line
-			_lines = lines.split("\n")
-			enumerated = list(enumerate(_lines))
-			enumerated = list(filter(lambda t: t[1].startswith("---"), enumerated))
-			lines = '\n'.join([_lines[i] for i in range(enumerated[1][0]+2, enumerated[2][0])])
-			headers = pattern_header_split.findall(_lines[enumerated[1][0]+1])
-			lines_without_header = pattern_remove_first_prefix.sub("", lines)
-			
-			data = pattern_to_csv.sub(";", lines_without_header)
-			data_buf = io.StringIO()
-			data_buf.write(data + "\n")
-			data_buf.seek(0)
-			df = pd.read_csv(data_buf, sep=";", names=headers, index_col=headers[0])
-			name = "_".join(file.stem.split("_")[2:])
-			mtype = "bandwidth" if "_bw" in file.stem else "latency"
-			measurements[name] = Measurement(df=df, name=name, mtype=mtype)	
-			
+		name = "_".join(file.stem.split("_")[2:])
+		blocks = result_blocks.load(file, "cxi", campaign=ts, benchmark=name)
+		mtype = "bandwidth" if "_bw" in file.stem else "latency"
+		measurements[name] = from_blocks(blocks, name, mtype)
 	return measurements
 
-
-def main():
+def models(basepath_measurements: Path) -> pd.DataFrame:
+	"""Piecewise α–β models of the latency and bandwidth curves of all campaigns in `basepath_measurements`, fitted together"""
+	times = {}
+	for ts in sorted(d.name for d in basepath_measurements.iterdir() if d.name.startswith("measurements_")):
+		for name, measurement in load_measurements(basepath_measurements, ts).items():
+			times[(ts, name)] = measurement.df["Mean[us]"] if measurement.mtype == "latency" \
+				else alpha_beta.bandwidth_to_time(measurement.df["BW[MB/s]"])
+	df = alpha_beta.to_frame(alpha_beta.fit(pd.DataFrame(times).sort_index(axis=1)))
+	df.insert(0, "campaign", df["curve"].map(lambda c: c[0]))
+	df.insert(1, "benchmark", df.pop("curve").map(lambda c: c[1]))
+	return df
+
+def figures(save: bool = True) -> dict[str, Callable[[], None]]:
+	"""Figures of this script by output name, see `common/render.py`"""
 	basepath_data = basepath.parent / "data"
 	ts = "measurements_23-11-30T1546"
 	measurements = load_measurements(basepath_data, ts)
@@ -108,8 +156,8 @@ def main():
 	if not (basepath / "figures").is_dir():
 		(basepath / "figures").mkdir(parents=True)
 
-	save = True
-	plot_multiple([
+	return {
+		"cxi_latency": partial(plot_multiple, [
 		measurements["cxi_write_lat"],		
 		measurements["cxi_read_lat"],
 		measurements["cxi_send_lat"],
@@ -122,9 +170,9 @@ def main():
 			(2,"Mean[us]", 4,1.75,1.5),
 			],
 		name="cxi_latency",
-		save=save)
+		save=save),
 
-	plot_multiple([
+		"cxi_bandwidth": partial(plot_multiple, [
 		measurements["cxi_write_bw"],		
 		measurements["cxi_read_bw"],
 		measurements["cxi_send_bw"],
@@ -135,5 +183,27 @@ def main():
 			(2,"BW[MB/s]", 4194304,1,.3),
 			],
 		name="cxi_bandwidth",
-		save=save)
+		save=save),
+
+		# parameter sweep of `measurement_src/cxi_sweep.py`, adapt the folder name:
+		# "cxi_hugepages_gain": partial(plot_gain, cxi_cube.load([basepath_data / "measurements_<timestamp>"]).sel(kind="bw"),
+		# 	"Hugepages", "Disabled", "BW[MB/s]", name="cxi_hugepages_gain", save=save),
+		# "cxi_rendezvous_gain": partial(plot_gain, cxi_cube.load([basepath_data / "measurements_<timestamp>"]).sel(operation="send", kind="lat"),
+		# 	"Rendezvous PUTs", "Disabled", "Mean[us]", name="cxi_rendezvous_gain", save=save),
+	}
+
+def main():
+	parser = argparse.ArgumentParser(description="CXI figures, or α–β models of the latency and bandwidth curves")
+	parser.add_argument("--models", action="store_true", help="fit and print the α–β models of all campaigns in data/ instead of rendering")
+	parser.add_argument("--out", type=Path, default=None, help="also write the models to this CSV")
+	args = parser.parse_args()
+
+	if args.models:
+		df = models(basepath.parent / "data")
+		print(df.to_string(index=False))
+		if args.out: df.to_csv(args.out, index=False)
+		return
+	for render in figures(save=True).values():
+		render()
+
 if __name__ == "__main__": main()
\ No newline at end of file
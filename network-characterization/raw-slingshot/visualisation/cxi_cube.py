@@ -0,0 +1,152 @@
+"""
+CXI results as an N-dimensional cube: configuration × operation × size × metric.
+
+Every CXI output starts with a parameter block (`List Size`, `IDC`, `Rendezvous PUTs`, `Hugepages`, ...), which
+`analyse_raw_cxi.load_measurements` keys away by file name. Here the parameter block of every file becomes the
+coordinates of its results, so the runs of a sweep (`measurement_src/cxi_sweep.py`), repeated campaigns and the
+single runs of `benchmark_cxi.sh` all end up in one table:
+
+- index: the parameters in `DIMENSIONS`, `operation` (`read`, `write`, `send`), `kind` (`lat`, `bw`) and `Size[B]`;
+  parameters a test does not print are `n/a`, e.g. `Rendezvous PUTs` of `cxi_write_bw`
+- columns: the metrics of the tests (`Mean[us]`, `BW[MB/s]`, ...), NaN where a test does not measure them
+
+Runs with the same coordinates (repeats, also several blocks of one file) are averaged. `sel` slices, `gain` compares the values of one parameter
+per message size, e.g. the bandwidth gain of hugepages or the latency gain of rendezvous PUTs.
+
+Usage: `python cxi_cube.py ../data/measurements_<timestamp> ... [--gain Hugepages Disabled --metric BW[MB/s]]`
+"""
+import argparse
+import re
+import sys
+from dataclasses import dataclass
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+sys.path.append(str(Path(__file__).resolve().parents[3] / "common"))
+import result_blocks
+
+# parameters of the parameter blocks that are configurations rather than fixed properties of the test
+DIMENSIONS = ["Client TX Mem", "Server RX Mem", "List Size", "IDC", "HRP", "Restricted", "Bidirectional",
+              "Rendezvous PUTs", "LL Cmd Launch", "RDMA Buf Align", "Hugepages"]
+NOT_APPLICABLE = "n/a"
+LEVELS = [*DIMENSIONS, "operation", "kind", "Size[B]"]
+HIGHER_IS_BETTER = {"BW[MB/s]", "PktRate[Mpkt/s]"}
+
+
+def operation(title: str) -> tuple[str, str]:
+	"""`CXI RDMA Send Bandwidth Test` -> (`send`, `bw`)"""
+	match = re.fullmatch(r"CXI (?:RDMA )?(\w+) (Latency|Bandwidth) Test", title)
+	if not match:
+		raise ValueError(f"unknown CXI test {title!r}")
+	return match[1].lower(), "lat" if match[2] == "Latency" else "bw"
+
+def run_frame(blocks: result_blocks.Blocks) -> pd.DataFrame:
+	"""Results of one CXI output with the parameters of their block as columns, one row per block and size"""
+	frames = []
+	for df, meta in zip(blocks.frames(), blocks.meta):
+		df = df.drop(columns=blocks.metrics[0]).rename_axis("Size[B]").reset_index() # count of operations per size
+		df["operation"], df["kind"] = operation(meta["title"])
+		for dim in DIMENSIONS:
+			df[dim] = meta.get(dim, NOT_APPLICABLE)
+		frames.append(df)
+	return pd.concat(frames, ignore_index=True)
+
+
+@dataclass
+class ResultCube:
+	data: pd.DataFrame # index: `LEVELS`, columns: metrics
+
+	@classmethod
+	def from_runs(cls, runs: list[pd.DataFrame]) -> "ResultCube":
+		"""Runs of `run_frame`, repeats averaged"""
+		df = pd.concat(runs, ignore_index=True)
+		return cls(df.groupby(LEVELS, sort=True).mean())
+
+	def coords(self, level: str) -> list:
+		return list(self.data.index.unique(level))
+
+	@property
+	def dims(self) -> list[str]:
+		"""Levels with more than one value, not counting `n/a`"""
+		return [level for level in LEVELS
+		        if self.data.index.get_level_values(level).drop(NOT_APPLICABLE, errors="ignore").nunique() > 1]
+
+	@staticmethod
+	def level(name: str) -> str:
+		"""Level of a keyword, `rendezvous_puts` -> `Rendezvous PUTs`"""
+		for level in LEVELS:
+			if name.replace("_", " ").lower() == level.lower():
+				return level
+		raise KeyError(f"unknown dimension {name!r}, known: {', '.join(LEVELS)}")
+
+	def sel(self, **coords) -> "ResultCube":
+		"""Slice by value (or list of values) of dimensions, e.g. `sel(operation="send", hugepages="2M")`"""
+		mask = np.ones(len(self.data), dtype=bool)
+		for name, value in coords.items():
+			values = self.data.index.get_level_values(self.level(name))
+			mask &= values.isin(value if isinstance(value, (list, tuple)) else [value])
+		return ResultCube(self.data[mask])
+
+	def metric(self, name: str) -> pd.Series:
+		"""One metric, rows where the test does not measure it dropped"""
+		return self.data[name].dropna()
+
+	def to_array(self, metric: str) -> tuple[np.ndarray, dict[str, list]]:
+		"""Dense array over the varying dimensions and their coordinates, NaN where no run has a combination"""
+		series = self.metric(metric)
+		dims = ResultCube(series.to_frame()).dims or ["Size[B]"]
+		series = series.groupby(dims).mean()
+		if len(dims) == 1:
+			series.index = pd.MultiIndex.from_arrays([series.index])
+		coords = {dim: list(series.index.unique(dim)) for dim in dims}
+		full = series.reindex(pd.MultiIndex.from_product(coords.values(), names=dims))
+		return full.to_numpy().reshape([len(c) for c in coords.values()]), coords
+
+	def gain(self, dim: str, baseline: str, metric: str) -> pd.DataFrame:
+		"""
+		Ratio of every other value of `dim` to `baseline` per remaining coordinate (rows) and value (columns),
+		> 1 is better: higher for bandwidth metrics, lower for latency metrics
+		"""
+		level = self.level(dim)
+		series = self.metric(metric)
+		others = [l for l in LEVELS if l != level]
+		table = series.unstack(level)
+		if baseline not in table:
+			raise KeyError(f"no runs with {level} {baseline}, only {', '.join(map(str, table.columns))}")
+		ratio = table.div(table[baseline], axis=0) if metric in HIGHER_IS_BETTER else table.rdiv(table[baseline], axis=0)
+		ratio = ratio.drop(columns=baseline).dropna(how="all")
+		# keep only the dimensions that vary between the compared rows
+		varying = [l for l in others if ratio.index.get_level_values(l).nunique() > 1 or l == "Size[B]"]
+		return ratio.droplevel([l for l in others if l not in varying])
+
+
+def load_runs(campaign: Path) -> list[pd.DataFrame]:
+	return [run_frame(result_blocks.load(file, "cxi", campaign=campaign.name, benchmark=file.stem.split("_", 2)[-1]))
+	        for file in sorted(campaign.glob("*.dat"))]
+
+def load(campaigns: list[Path]) -> ResultCube:
+	"""All CXI outputs of the campaign folders as one cube"""
+	return ResultCube.from_runs([run for campaign in campaigns for run in load_runs(campaign)])
+
+
+def main():
+	parser = argparse.ArgumentParser(description="Dimensions of CXI campaigns and the gain of a parameter per message size")
+	parser.add_argument("campaigns", nargs="+", type=Path, help="folders written by `cxi_sweep.py` or `benchmark_cxi.sh`")
+	parser.add_argument("--gain", nargs=2, metavar=("DIMENSION", "BASELINE"), default=None,
+	                    help="e.g. `Hugepages Disabled`: ratio of the other values to the baseline")
+	parser.add_argument("--metric", default="BW[MB/s]", help="metric of --gain (default: BW[MB/s])")
+	parser.add_argument("--where", nargs="+", default=[], metavar="DIMENSION=VALUE", help="slice before --gain")
+	args = parser.parse_args()
+
+	cube = load(args.campaigns)
+	cube = cube.sel(**dict(w.split("=", 1) for w in args.where))
+	with pd.option_context("display.max_rows", None, "display.width", 200, "display.precision", 3):
+		for dim in cube.dims:
+			if dim != "Size[B]":
+				print(f"{dim}: {', '.join(map(str, cube.coords(dim)))}")
+		if args.gain:
+			print(cube.gain(*args.gain, metric=args.metric).to_string())
+
+if __name__ == "__main__": main()